@@ -0,0 +1,102 @@
+"""
+throughput of escalation webhooks against a local stand-in for slack.
+
+    python benchmarks/escalation_bench.py [--messages 500] [--threads 10] [--latency-ms 0]
+
+posts the same message the way slack.Escalation used to (a bare
+requests.post, so a new connection every time) and over the shared pooled
+session, both from a pool of threads like the escalation dispatcher, and
+counts the connections the server had to accept. The stand-in is plain
+http, so the difference against slack, which adds a TLS handshake to each
+new connection, is bigger than shown here.
+"""
+
+import sys
+import json
+import argparse
+import threading
+from time import perf_counter, sleep
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, ".")
+
+from mozalert.utils import http
+
+
+class Webhook(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # the headers and body are written separately; without this, delayed
+    # acks stall every response on a kept-alive connection
+    disable_nagle_algorithm = True
+    latency = 0
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with Webhook.lock:
+            Webhook.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        sleep(Webhook.latency)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+
+def run(name, post, url, messages, threads):
+    Webhook.connections = 0
+    body = json.dumps({"channel": "#bench", "text": "x" * 512})
+    headers = {"Content-Type": "application/json"}
+
+    def send(_):
+        post(url, data=body, headers=headers).raise_for_status()
+
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(send, range(messages)))
+    elapsed = perf_counter() - start
+    print(
+        f"{name:<16} {messages / elapsed:8.0f} msg/s"
+        f" {elapsed * 1000 / messages:6.2f} ms/msg"
+        f" {Webhook.connections:6d} connections"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    Webhook.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Webhook)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/webhook"
+
+    http.configure(pool_size=args.threads)
+    run("requests.post", requests.post, url, args.messages, args.threads)
+    run(
+        "pooled session",
+        lambda *a, **kw: http.post("slack", *a, **kw),
+        url,
+        args.messages,
+        args.threads,
+    )
+
+    http.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
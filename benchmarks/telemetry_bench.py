@@ -0,0 +1,86 @@
+"""
+throughput of telemetry parsing on a large check log.
+
+    python benchmarks/telemetry_bench.py [--size-mb 10]
+
+compares the original line-by-line parser (regex compiled per line, log
+rebuilt with +=) with the single pass parser, and with streaming the log
+through a LogCapture the way the controller reads pod logs.
+"""
+
+import re
+import sys
+import argparse
+from time import perf_counter
+
+sys.path.insert(0, ".")
+
+from mozalert.checks.logs import LogCapture, CHUNK_SIZE
+from mozalert.metrics import telemetry
+
+
+def legacy_extract(logs):
+    _logs = ""
+    _telemetry = {}
+    for line in logs.split("\n"):
+        pattern = re.compile(r"TELEMETRY:\s*(?P<key>\w+)\s*(?P<val>\d+)[^0-9]?")
+        match = pattern.match(line)
+        if not match:
+            _logs += line + "\n"
+            continue
+        m = match.groupdict()
+        _telemetry[m.get("key")] = m.get("val")
+    return _logs, _telemetry
+
+
+def make_log(size):
+    """
+    a chatty browser check: mostly console and request logs with a
+    handful of telemetry lines mixed in
+    """
+    lines = []
+    for i in range(40):
+        lines += [
+            f"console.log: loaded https://example.com/static/chunk-{i}.js in {i * 7}ms",
+            f"GET https://example.com/api/v1/items/{i} 200 0.0{i}",
+            '{"level": "info", "msg": "page rendered", "elapsed": 0.12}',
+        ]
+    lines += [
+        "TELEMETRY: total_time 1.25",
+        'TELEMETRY: latency{region="us-west1"} 0.031',
+        '{"telemetry": {"get_time": 0.4, "node_time": 0.9}}',
+    ]
+    block = "\n".join(lines) + "\n"
+    return block * (size // len(block) + 1)
+
+
+def run(name, func, logs):
+    start = perf_counter()
+    func(logs)
+    elapsed = perf_counter() - start
+    mb = len(logs) / 1024 / 1024
+    print(f"{name:<12} {mb:6.1f} MB in {elapsed:7.3f}s  {mb / elapsed:8.1f} MB/s")
+
+
+def stream(logs):
+    data = logs.encode()
+    capture = LogCapture()
+    for i in range(0, len(data), CHUNK_SIZE):
+        capture.feed(data[i : i + CHUNK_SIZE])
+    capture.flush()
+    return capture.logs, capture.telemetry
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=10)
+    args = parser.parse_args()
+
+    logs = make_log(int(args.size_mb * 1024 * 1024))
+    run("legacy", legacy_extract, logs)
+    run("single-pass", telemetry.parse_logs, logs)
+    run("streaming", stream, logs)
+
+
+if __name__ == "__main__":
+    main()
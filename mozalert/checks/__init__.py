@@ -1 +1,15 @@
-from mozalert.checks import config, monitor, check, base, handler
+from mozalert.checks import (
+    config,
+    scheduler,
+    engine,
+    jobwatch,
+    statuswriter,
+    logs,
+    logstore,
+    statestore,
+    history,
+    monitor,
+    check,
+    base,
+    handler,
+)
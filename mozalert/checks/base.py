@@ -1,20 +1,22 @@
 import sys
+import hashlib
 import logging
-import threading
-
-import importlib
 
 from types import SimpleNamespace
 import datetime
 
+import pytz
+
 from mozalert import status, metrics, checks
+from mozalert.escalations import registry
 from mozalert.utils.dt import now
 
 
 class BaseCheck:
     """
-    BaseCheck implements the thread/interval logic of a check without any
-    actual execution.
+    BaseCheck implements the interval logic of a check without any
+    actual execution. Runs are put on a shared Scheduler rather than
+    each check owning its own timer thread.
 
     To use this class as your base class, you should implement the
     job-related methods:
@@ -23,6 +25,9 @@ class BaseCheck:
         * get_job_status (SimpleNamespace)
         * set_crd_status
         * run_job
+
+    and optionally run_job_async, a coroutine which runs the whole job
+    lifecycle (including deleting the job) on an AsyncJobEngine.
     """
 
     def __init__(self, **kwargs):
@@ -43,14 +48,51 @@ class BaseCheck:
         else:
             self.config = checks.config.CheckConfig(**kwargs)
 
+        self._scheduler = kwargs.get("scheduler", None)
+        if not self._scheduler:
+            self._scheduler = checks.scheduler.default_scheduler()
+
+        # when an engine is given the job runs on its event loop rather
+        # than blocking a scheduler worker
+        self._engine = kwargs.get("engine", None)
+        self._job = None
+
+        # overdue checks found at startup are spread over this many seconds
+        # instead of all firing at once
+        self._startup_window = float(kwargs.get("startup_window", 60))
+
         self.shutdown = False
         self._runtime = datetime.timedelta(seconds=0)
+        # how late the last run started compared to when it was planned
+        self._schedule_drift = None
+
+        # the most recent results of this check
+        self._history = kwargs.get("history", None) or checks.history.ResultHistory(
+            depth=kwargs.get("history_depth", 1000)
+        )
         self._thread = None
         self.escalated = False
         self._next_interval = self.config.check_interval
 
         self._status = status.Status()
 
+        # the metadata.uid of the check object and the metadata.generation
+        # of the spec this check was built from
+        self._uid = kwargs.get("uid", None)
+        self._generation = kwargs.get("generation", None)
+
+        # escalations are handed to the dispatcher rather than sent from
+        # this check's thread, if there is one. This is a function returning
+        # the dispatcher, so we pick up a restarted one.
+        self._escalation_dispatcher = kwargs.get("escalation_dispatcher", lambda: None)
+        self._escalation_registry = kwargs.get("escalation_registry", None)
+
+        # the state saved by a previous controller, read back in bulk
+        self._state_store = kwargs.get("state_store", None)
+        saved_state = kwargs.get("saved_state", None)
+        if saved_state:
+            self.restore_state(saved_state, history=kwargs.get("history") is None)
+
         if self._pre_status:
             self._status.parse_pre_status(**self._pre_status)
             if self._next_interval < self.status.next_interval:
@@ -64,8 +106,16 @@ class BaseCheck:
             else:
                 self._next_interval = self.status.next_interval
 
+            if self._next_interval <= 1 and self._startup_window:
+                # we're overdue, most likely because the controller was
+                # restarted, so wait a bit to avoid a thundering herd
+                self._next_interval = self.startup_jitter()
+                logging.info(f"{self} is overdue, starting in {self._next_interval}s")
+
             self._pre_status = {}
 
+        self.status.observed_generation = self.generation
+
         self.start_thread()
         self.set_crd_status()
 
@@ -79,8 +129,26 @@ class BaseCheck:
 
     @property
     def thread(self):
+        """
+        the ScheduledRun handle for the next (or currently executing) run
+        """
         return self._thread
 
+    @property
+    def scheduler(self):
+        return self._scheduler
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @property
+    def job(self):
+        """
+        the future of the job running on the engine, if there is one
+        """
+        return self._job
+
     @property
     def shutdown(self):
         return self._shutdown
@@ -93,6 +161,37 @@ class BaseCheck:
     def next_interval(self):
         return self._next_interval
 
+    @property
+    def generation(self):
+        return self._generation
+
+    @property
+    def uid(self):
+        return self._uid
+
+    @property
+    def history(self):
+        return self._history
+
+    @property
+    def state_store(self):
+        return self._state_store
+
+    @property
+    def escalation_dispatcher(self):
+        return self._escalation_dispatcher()
+
+    @property
+    def escalation_registry(self):
+        if not self._escalation_registry:
+            self._escalation_registry = registry.default_registry()
+        return self._escalation_registry
+
+    @generation.setter
+    def generation(self, generation):
+        self._generation = generation
+        self.status.observed_generation = generation
+
     @escalated.setter
     def escalated(self, escalated):
         self._escalated = escalated
@@ -105,32 +204,121 @@ class BaseCheck:
     def config(self, config):
         self._config = config
 
+    def startup_jitter(self):
+        """
+        a delay in [0, startup_window) seconds which is the same every time
+        for a given check, capped at the check_interval
+        """
+        window = min(self._startup_window, self.config.check_interval)
+        digest = hashlib.md5(f"{self}".encode()).digest()
+        return window * int.from_bytes(digest[:4], "big") / 2**32
+
+    def restore_state(self, saved, history=True):
+        """
+        pick up from the state a previous controller saved for this check.
+        The check object stays the source of truth: nothing is used if the
+        object was recreated since, and the escalation state and status are
+        only used if they were saved for the same spec generation, the status
+        only if it's newer than the one on the object (which may lag behind
+        our writes).
+        """
+        if self.uid and saved.uid and saved.uid != self.uid:
+            logging.info(f"{self} was recreated since its state was saved")
+            if self.state_store:
+                self.state_store.forget(f"{self}")
+            return
+        if history:
+            for result in saved.results:
+                self.history.record(
+                    datetime.datetime.fromtimestamp(result.timestamp, pytz.utc),
+                    status.EnumStatus(result.status),
+                    result.runtime,
+                    telemetry=result.telemetry,
+                )
+
+        if self.generation is not None and saved.generation != self.generation:
+            logging.info(f"{self} changed since its state was saved")
+            return
+        self.escalated = saved.escalated
+        saved_check = str(saved.status.get("last_check", "None"))[:19]
+        pre_check = str(self._pre_status.get("last_check", "None"))[:19]
+        if saved_check == "None" or (pre_check != "None" and pre_check >= saved_check):
+            return
+        self._pre_status = {**self._pre_status, **saved.status}
+
+    def save_state(self):
+        """
+        save the status and escalation state of the check to the state store
+        """
+        if not self.state_store:
+            return
+        try:
+            self.state_store.save(
+                f"{self}",
+                self.generation,
+                self.status.crd_status["status"],
+                self.escalated,
+                uid=self.uid,
+            )
+        except Exception as e:
+            logging.error(f"Failed to save the state of {self}")
+            logging.error(sys.exc_info()[0])
+            logging.error(e)
+
     def __repr__(self):
         return f"{self.config.namespace}/{self.config.name}"
 
     def terminate(self, join=False):
         """
-        stop the thread and cleanup any leftover jobs
+        cancel the scheduled run and cleanup any leftover jobs
         """
         self.shutdown = True
         logging.info(f"Terminating {self}")
         if self._thread:
             try:
-                self._thread.cancel()
+                self.scheduler.cancel(self._thread)
             except Exception as e:
                 logging.info(sys.exc_info()[0])
                 logging.info(e)
 
         if join:
-            self._thread.join()
+            self.join()
+
+    def join(self, timeout=None):
+        """
+        wait for an in-flight job and the current run to finish
+        """
+        if self._job:
+            try:
+                self._job.result(timeout)
+            except Exception:
+                pass
+        if self._thread:
+            self._thread.join(timeout)
 
     def check(self, shutdown=lambda: False):
         """
-        main thread for creating then watching a check job; this is called as
-        the Timer thread target.
+        main routine for creating then watching a check job; this is run by
+        one of the scheduler's worker threads when the check is due.
         """
+        if self.status.next_check:
+            try:
+                drift = (now() - self.status.next_check).total_seconds()
+                self._schedule_drift = max(drift, 0)
+            except TypeError:
+                # a next_check read back without a timezone
+                self._schedule_drift = None
+
         self.status.attempt += 1
         logging.info(f"Starting check attempt {self.status.attempt}")
+
+        if self.engine and hasattr(self, "run_job_async"):
+            # hand the job to the engine and free up this worker; the rest
+            # of the check is finished on a worker once the job is done
+            self._job = self.engine.submit(self.run_job_async(shutdown))
+            self._job.add_done_callback(lambda job: self.job_done(job, shutdown))
+            return
+
         # run the job; this blocks until completion
         try:
             self.run_job(shutdown)
@@ -140,6 +328,31 @@ class BaseCheck:
 
         self.delete_job()
 
+        self.finish_check(shutdown)
+
+    def job_done(self, job, shutdown=lambda: False):
+        """
+        called on the engine's thread when an async job completes. Escalations
+        and the status patch are blocking so the rest of the check is put
+        back on the scheduler to run right away.
+        """
+        e = job.exception()
+        if e:
+            logging.info(f"Job for {self} failed")
+            logging.info(e)
+
+        self._thread = self.scheduler.schedule(
+            0,
+            self.finish_check,
+            name=f"{self}",
+            kwargs={"shutdown": shutdown},
+        )
+
+    def finish_check(self, shutdown=lambda: False):
+        """
+        handle the result of a job: escalate or recover, record metrics,
+        then schedule the next run.
+        """
         if self.status.OK and self.escalated:
             # recovery!
             self.escalate(recovery=True)
@@ -158,6 +371,25 @@ class BaseCheck:
             # not state OK and not enough failures to escalate
             self._next_interval = self.config.retry_interval
 
+        finished = now()
+        self.history.record(
+            finished,
+            self.status.status,
+            self._runtime.seconds,
+            telemetry=self.status.telemetry,
+        )
+        if self.state_store:
+            try:
+                self.state_store.record(
+                    f"{self}",
+                    finished,
+                    self.status.status,
+                    self._runtime.seconds,
+                    telemetry=self.status.telemetry,
+                )
+            except Exception as e:
+                logging.error(f"Failed to save the result of {self}: {e}")
+
         if hasattr(self, "metrics_queue"):
             self.metrics_queue.put_many(
                 self.config.name,
@@ -165,6 +397,14 @@ class BaseCheck:
                 labels=self.metric_labels,
                 metrics=self.metric_values,
             )
+            for key, labels, value in self.labeled_metric_values:
+                self.metrics_queue.put(
+                    key,
+                    self.config.name,
+                    self.config.namespace,
+                    labels={**self.metric_labels, **labels},
+                    value=value,
+                )
 
         # set the next_check for the CRD status
         self.status.next_check = now() + datetime.timedelta(seconds=self.next_interval)
@@ -174,18 +414,34 @@ class BaseCheck:
             self.start_thread()
             # update the CRD status subresource
             self.set_crd_status()
+        self.save_state()
 
     def escalate(self, recovery=False):
+        """
+        send the check's escalations; with a running dispatcher they're
+        queued and sent in the background, otherwise (or if it's draining and
+        won't take them) they're sent right here
+        """
         self.escalated = not recovery
+        dispatcher = self.escalation_dispatcher
         for esc in self.config.escalations:
             escalation_type = esc.get("type", "email")
             logging.info(f"Escalating {self} via {escalation_type}")
             args = esc.get("args", {})
-            try:
-                module = importlib.import_module(
-                    f".escalations.{escalation_type}", "mozalert"
+            if (
+                dispatcher
+                and dispatcher.is_alive()
+                and dispatcher.submit(
+                    f"{self}",
+                    escalation_type,
+                    args,
+                    config=self.config,
+                    status=self.status,
                 )
-                Escalation = getattr(module, "Escalation")
+            ):
+                continue
+            try:
+                Escalation = self.escalation_registry.get(escalation_type)
                 e = Escalation(
                     f"{self}",
                     args=args,
@@ -202,16 +458,17 @@ class BaseCheck:
 
     def start_thread(self):
         """
-        starts the thread and updates the next_check time in the object.
+        schedules the next run and updates the next_check time in the object.
 
         For this to work you must have a self.check and a self._next_interval >=0 seconds
         """
         logging.info(f"Starting {self} at interval {self.next_interval} seconds")
 
-        self._thread = threading.Timer(
-            self.next_interval, self.check, kwargs={"shutdown": lambda: self.shutdown}
+        self._thread = self.scheduler.schedule(
+            self.next_interval,
+            self.check,
+            name=f"{self}",
+            kwargs={"shutdown": lambda: self.shutdown},
         )
-        self._thread.setName(f"{self}")
-        self._thread.start()
 
         self.status.next_check = now() + datetime.timedelta(seconds=self.next_interval)
@@ -1,14 +1,15 @@
 import sys
+import asyncio
 import logging
 from time import sleep
 
 from types import SimpleNamespace
 
 from mozalert import status, metrics
-from mozalert.checks import base
+from mozalert.checks import base, jobwatch, logs
 from mozalert.utils.dt import now
 
-from mozalert.kubeclient import ApiException
+from mozalert.kubeclient import ApiException, AsyncApiException
 
 from datetime import timedelta
 
@@ -16,8 +17,9 @@ from datetime import timedelta
 class Check(base.BaseCheck, metrics.mixin.MetricsMixin):
     """
     the Check object handles the entire lifecycle of a check:
-    * maintains the check interval using threading.Timer (BaseCheck)
-    * manages the resources for running the check itself
+    * maintains the check interval using the shared Scheduler (BaseCheck)
+    * manages the resources for running the check itself, either blocking a
+      worker (run_job) or on the AsyncJobEngine (run_job_async)
     * reports status to the CRD object
     * handles escalation
     """
@@ -27,6 +29,27 @@ class Check(base.BaseCheck, metrics.mixin.MetricsMixin):
         self._job_poll_interval = float(kwargs.get("job_poll_interval", 3))
         self._shutdown_max_wait_sec = float(kwargs.get("shutdown_max_wait_sec", 10))
 
+        # when a healthy JobWatcher is available we wait on it for the job
+        # to finish instead of polling the job status. This is a function
+        # returning the watcher, so we pick up a restarted one.
+        self._job_watcher = kwargs.get("job_watcher", lambda: None)
+        self._job_uid = None
+        self._job_watched = False
+
+        # status patches go through the StatusWriter when there is one
+        self.status_writer = kwargs.get("status_writer", None)
+
+        # a TokenBucket shared by all checks to limit how fast jobs are created
+        self.job_rate_limit = kwargs.get("job_rate_limit", None)
+
+        # the most pod log we keep from each run
+        self._log_max_bytes = int(kwargs.get("log_max_bytes", 32768))
+
+        # with a LogStore the full logs are stored there, and the status
+        # only gets the last log_excerpt_bytes of them
+        self.log_store = kwargs.get("log_store", None)
+        self._log_excerpt_bytes = int(kwargs.get("log_excerpt_bytes", 1024))
+
         super().__init__(**kwargs)
 
     def run_job(self, shutdown=lambda: False):
@@ -40,11 +63,17 @@ class Check(base.BaseCheck, metrics.mixin.MetricsMixin):
         """
         logging.debug(f"Running job")
         job = self.kube.make_job(self.config.name, **self.config.pod_spec)
+        if self.job_rate_limit:
+            self.job_rate_limit.acquire()
+        self._job_uid = None
+        self._job_watched = False
         try:
-            res = self.kube.BatchV1Api.create_namespaced_job(
-                body=job, namespace=self.config.namespace
-            )
+            with self.kube_call("create", "jobs", ok_reasons=("Conflict",)):
+                res = self.kube.BatchV1Api.create_namespaced_job(
+                    body=job, namespace=self.config.namespace
+                )
             logging.debug(f"Job created")
+            self.job_created(res)
         except ApiException as e:
             logging.debug(e)
             logging.debug(sys.exc_info()[0])
@@ -59,32 +88,12 @@ class Check(base.BaseCheck, metrics.mixin.MetricsMixin):
         # wait for the job to finish
         shutdown_timer = 0
         while True:
-            sleep(self._job_poll_interval)
-            st = self.get_job_status()
+            st = self.wait_job_status()
 
             if shutdown():
                 shutdown_timer += self._job_poll_interval
 
-            if st.start_time:
-                self._runtime = now() - st.start_time
-            else:
-                self._runtime += timedelta(seconds=self._job_poll_interval)
-
-            if st.succeeded:
-                self.status.status = status.EnumStatus.OK
-                self.status.state = status.EnumState.IDLE
-            elif st.failed:
-                self.status.status = status.EnumStatus.CRITICAL
-                self.status.state = status.EnumState.IDLE
-
-            if (
-                self.config.timeout and self._runtime.seconds > self.config.timeout
-            ) or shutdown_timer >= self._shutdown_max_wait_sec:
-                logging.error("Job Timeout triggered")
-                self.status.state = status.EnumState.IDLE
-                self.status.status = status.EnumStatus.CRITICAL
-
-            if not self.status.PENDING and not self.status.RUNNING:
+            if self.update_job_state(st, shutdown_timer):
                 break
 
         logging.info(
@@ -97,66 +106,282 @@ class Check(base.BaseCheck, metrics.mixin.MetricsMixin):
         self.status.last_check = now()
         self.set_crd_status()
 
+    async def run_job_async(self, shutdown=lambda: False):
+        """
+        the same lifecycle as run_job followed by delete_job, but every kube
+        call goes through the engine's async client and waiting between polls
+        doesn't hold a thread.
+        """
+        kube = self.engine.kube
+        logging.debug(f"Running job for {self} on the job engine")
+        job = self.kube.make_job(self.config.name, **self.config.pod_spec)
+        if self.job_rate_limit:
+            wait = self.job_rate_limit.try_acquire()
+            while wait:
+                await asyncio.sleep(wait)
+                wait = self.job_rate_limit.try_acquire()
+        self._job_uid = None
+        self._job_watched = False
+        try:
+            with self.kube_call("create", "jobs", ok_reasons=("Conflict",)):
+                res = await kube.BatchV1Api.create_namespaced_job(
+                    body=job, namespace=self.config.namespace
+                )
+            logging.debug(f"Job created")
+            self.job_created(res)
+        except AsyncApiException as e:
+            logging.debug(e)
+            # if the job is already there we just
+            # move on.
+            if e.reason != "Conflict":
+                await self.delete_job_async()
+                raise
+
+        self.status.state = status.EnumState.RUNNING
+        await self.set_crd_status_async()
+
+        shutdown_timer = 0
+        while True:
+            st = await self.wait_job_status_async()
+
+            if shutdown():
+                shutdown_timer += self._job_poll_interval
+
+            if self.update_job_state(st, shutdown_timer):
+                break
+
+        logging.info(
+            f"Job for {self} finished in {self._runtime.seconds} seconds with status {self.status.status.name}"
+        )
+
+        await self.get_job_logs_async()
+
+        self.status.state = status.EnumState.IDLE
+        self.status.last_check = now()
+        await self.set_crd_status_async()
+
+        await self.delete_job_async()
+
+    @property
+    def job_watcher(self):
+        return self._job_watcher()
+
+    @property
+    def job_key(self):
+        return f"{self.config.namespace}/{self.config.name}"
+
+    def job_created(self, res):
+        """
+        remember the uid of the job we just created so the JobWatcher can tell
+        it apart from an older job with the same name. A job we didn't create
+        (e.g. left over from before a restart) may not carry our labels, so
+        those are always polled.
+        """
+        metadata = getattr(res, "metadata", None)
+        self._job_uid = getattr(metadata, "uid", None)
+        self._job_watched = bool(self.job_watcher)
+
+    def wait_job_status(self):
+        """
+        wait up to one poll interval for the job status, using the JobWatcher
+        when it's healthy and falling back to polling the api otherwise
+        """
+        job_watcher = self.job_watcher
+        if self._job_watched and job_watcher and job_watcher.healthy:
+            st = job_watcher.wait(
+                self.job_key, uid=self._job_uid, timeout=self._job_poll_interval
+            )
+            if st:
+                return st
+        sleep(self._job_poll_interval)
+        return self.get_job_status()
+
+    async def wait_job_status_async(self):
+        job_watcher = self.job_watcher
+        if self._job_watched and job_watcher and job_watcher.healthy:
+            st = await job_watcher.wait_async(
+                self.job_key, uid=self._job_uid, timeout=self._job_poll_interval
+            )
+            if st:
+                return st
+        await asyncio.sleep(self._job_poll_interval)
+        return await self.get_job_status_async()
+
+    def update_job_state(self, st, shutdown_timer=0):
+        """
+        apply a job status from get_job_status to the check status and
+        return True once the job is finished
+        """
+        if st.start_time:
+            self._runtime = now() - st.start_time
+        else:
+            self._runtime += timedelta(seconds=self._job_poll_interval)
+
+        if st.succeeded:
+            self.status.status = status.EnumStatus.OK
+            self.status.state = status.EnumState.IDLE
+        elif st.failed:
+            self.status.status = status.EnumStatus.CRITICAL
+            self.status.state = status.EnumState.IDLE
+
+        if (
+            self.config.timeout and self._runtime.seconds > self.config.timeout
+        ) or shutdown_timer >= self._shutdown_max_wait_sec:
+            logging.error(f"Job Timeout triggered for {self}")
+            self.status.state = status.EnumState.IDLE
+            self.status.status = status.EnumStatus.CRITICAL
+
+        return not self.status.PENDING and not self.status.RUNNING
+
     def get_job_logs(self):
         """
         since the CRD deletes the pod after its done running, it is nice
         to have a way to save the logs before deleting it. this retrieves
         the pod logs so they can be blasted into the controller logs.
+
+        the logs are streamed through a LogCapture so we only ever hold
+        log_max_bytes of them, however much the check prints.
         """
         try:
-            res = self.kube.CoreV1Api.list_namespaced_pod(
-                namespace=self.config.namespace,
-                label_selector=f"app={self.config.name}",
-            )
+            with self.kube_call("list", "pods"):
+                res = self.kube.CoreV1Api.list_namespaced_pod(
+                    namespace=self.config.namespace,
+                    label_selector=f"app={self.config.name}",
+                )
         except Exception as e:
             logging.debug(sys.exc_info()[0])
             logging.debug(e)
             self.status.logs = ""
             return
 
-        logs = ""
+        capture = self.log_capture()
         for pod in res.items:
-            logs += self.kube.CoreV1Api.read_namespaced_pod_log(
-                pod.metadata.name, self.config.namespace
-            )
-        logs, telemetry = self.extract_telemetry_from_logs(logs)
-        if telemetry:
-            logging.debug(f"Found telemetry: {telemetry}")
-            self.status.telemetry = telemetry
-        self.status.logs = logs
+            stream = None
+            try:
+                with self.kube_call("get", "pods/log"):
+                    stream = self.kube.CoreV1Api.read_namespaced_pod_log(
+                        pod.metadata.name, self.config.namespace, _preload_content=False
+                    )
+                for chunk in stream.stream(logs.CHUNK_SIZE):
+                    capture.feed(chunk)
+            except Exception as e:
+                logging.debug(sys.exc_info()[0])
+                logging.debug(e)
+            finally:
+                # hand the connection back to the pool however the read went
+                if stream is not None:
+                    stream.release_conn()
+            capture.flush()
+        self.set_job_logs(capture)
+
+    async def get_job_logs_async(self):
+        kube = self.engine.kube
+        try:
+            with self.kube_call("list", "pods"):
+                res = await kube.CoreV1Api.list_namespaced_pod(
+                    namespace=self.config.namespace,
+                    label_selector=f"app={self.config.name}",
+                )
+        except Exception as e:
+            logging.debug(sys.exc_info()[0])
+            logging.debug(e)
+            self.status.logs = ""
+            return
+
+        capture = self.log_capture()
+        for pod in res.items:
+            stream = None
+            try:
+                with self.kube_call("get", "pods/log"):
+                    stream = await kube.CoreV1Api.read_namespaced_pod_log(
+                        pod.metadata.name, self.config.namespace, _preload_content=False
+                    )
+                async for chunk in stream.content.iter_chunked(logs.CHUNK_SIZE):
+                    capture.feed(chunk)
+            except Exception as e:
+                logging.debug(sys.exc_info()[0])
+                logging.debug(e)
+            finally:
+                if stream is not None:
+                    stream.release()
+            capture.flush()
+        self.set_job_logs(capture)
+
+    def log_capture(self):
+        return logs.LogCapture(max_bytes=self._log_max_bytes)
+
+    def set_job_logs(self, capture):
+        """
+        store the captured logs and the telemetry found in them in the status.
+        capture is a LogCapture, or the logs as a string
+        """
+        if isinstance(capture, str):
+            job_logs = capture
+            capture = self.log_capture()
+            capture.feed(job_logs)
+            capture.flush()
+        if capture.truncated:
+            logging.debug(f"Dropped {capture.truncated} bytes of logs from {self}")
+        if capture.telemetry:
+            logging.debug(f"Found telemetry: {capture.telemetry}")
+            self.status.telemetry = capture.telemetry
+
+        job_logs = capture.logs
+        if not self.log_store:
+            self.status.logs = job_logs
+            return
+        try:
+            self.status.logs_ref = self.log_store.put(str(self), job_logs)
+        except Exception as e:
+            logging.error(f"Failed to store the logs of {self}: {e}")
+            self.status.logs_ref = None
+        self.status.logs_size = len(job_logs)
+        self.status.logs = self.excerpt(job_logs)
+
+    def excerpt(self, job_logs):
+        """
+        the end of the logs, starting at a line, which is usually where
+        the reason a check failed is
+        """
+        if len(job_logs) <= self._log_excerpt_bytes:
+            return job_logs
+        excerpt = job_logs[-self._log_excerpt_bytes :]
+        start = excerpt.find("\n") + 1
+        return excerpt[start:] if 0 < start < len(excerpt) else excerpt
 
     def get_job_status(self):
         """
         read the status of the job object and return a SimpleNamespace
         """
 
-        status = SimpleNamespace(
-            active=False, succeeded=False, failed=False, start_time=None
-        )
-
         try:
-            res = self.kube.BatchV1Api.read_namespaced_job_status(
-                self.config.name, self.config.namespace
-            )
+            with self.kube_call("get", "jobs/status"):
+                res = self.kube.BatchV1Api.read_namespaced_job_status(
+                    self.config.name, self.config.namespace
+                )
         except Exception as e:
             logging.debug(sys.exc_info()[0])
             logging.info(e.reason)
-            status.failed = True
-            return status
-
-        if res.status.active == 1:
-            status.active = True
-
-        if res.status.succeeded:
-            status.succeeded = True
+            return SimpleNamespace(
+                active=False, succeeded=False, failed=True, start_time=None
+            )
 
-        if res.status.failed:
-            status.failed = True
+        return jobwatch.job_status(res)
 
-        if res.status.start_time:
-            status.start_time = res.status.start_time
+    async def get_job_status_async(self):
+        try:
+            with self.kube_call("get", "jobs/status"):
+                res = await self.engine.kube.BatchV1Api.read_namespaced_job_status(
+                    self.config.name, self.config.namespace
+                )
+        except Exception as e:
+            logging.debug(sys.exc_info()[0])
+            logging.info(getattr(e, "reason", e))
+            return SimpleNamespace(
+                active=False, succeeded=False, failed=True, start_time=None
+            )
 
-        return status
+        return jobwatch.job_status(res)
 
     def set_crd_status(self):
         """
@@ -167,34 +392,79 @@ class Check(base.BaseCheck, metrics.mixin.MetricsMixin):
         """
         logging.debug(f"Setting CRD status")
 
-        try:
-            res = self.kube.CustomObjectsApi.patch_namespaced_custom_object_status(
-                self.kube.domain,
-                self.kube.version,
-                self.config.namespace,
-                self.kube.plural,
-                self.config.name,
-                body=self.status.crd_status,
+        if self.status_writer and self.status_writer.is_alive():
+            self.status_writer.write(
+                self.config.namespace, self.config.name, self.status.crd_status
             )
+            return
+
+        try:
+            with self.kube_call("patch", "checks/status"):
+                res = self.kube.CustomObjectsApi.patch_namespaced_custom_object_status(
+                    self.kube.domain,
+                    self.kube.version,
+                    self.config.namespace,
+                    self.kube.plural,
+                    self.config.name,
+                    body=self.status.crd_status,
+                )
         except Exception as e:
             # failed to set the status
             # TODO should take more action here
             logging.debug(sys.exc_info()[0])
             logging.debug(e)
 
+    async def set_crd_status_async(self):
+        if self.status_writer and self.status_writer.is_alive():
+            # queueing the write doesn't block so it's safe on the event loop
+            self.status_writer.write(
+                self.config.namespace, self.config.name, self.status.crd_status
+            )
+            return
+
+        kube = self.engine.kube
+        try:
+            with self.kube_call("patch", "checks/status"):
+                await kube.CustomObjectsApi.patch_namespaced_custom_object_status(
+                    kube.domain,
+                    kube.version,
+                    self.config.namespace,
+                    kube.plural,
+                    self.config.name,
+                    body=self.status.crd_status,
+                )
+        except Exception as e:
+            logging.debug(sys.exc_info()[0])
+            logging.debug(e)
+
     def delete_job(self):
         """
         after a check is complete delete the job which executed it
         """
         logging.debug(f"deleting job")
         try:
-            res = self.kube.BatchV1Api.delete_namespaced_job(
-                self.config.name,
-                self.config.namespace,
-                propagation_policy="Foreground",
-                grace_period_seconds=0,
-            )
+            with self.kube_call("delete", "jobs", ok_reasons=("Not Found",)):
+                res = self.kube.BatchV1Api.delete_namespaced_job(
+                    self.config.name,
+                    self.config.namespace,
+                    propagation_policy="Foreground",
+                    grace_period_seconds=0,
+                )
         except Exception as e:
             # failure is probably ok here, if the job doesn't exist
             logging.debug(sys.exc_info()[0])
             logging.debug(e)
+
+    async def delete_job_async(self):
+        logging.debug(f"deleting job")
+        try:
+            with self.kube_call("delete", "jobs", ok_reasons=("Not Found",)):
+                await self.engine.kube.BatchV1Api.delete_namespaced_job(
+                    self.config.name,
+                    self.config.namespace,
+                    propagation_policy="Foreground",
+                    grace_period_seconds=0,
+                )
+        except Exception as e:
+            logging.debug(sys.exc_info()[0])
+            logging.debug(e)
@@ -1,6 +1,10 @@
 import os
 from collections import namedtuple
 
+# parse_to_object reuses one namedtuple class per set of fields; making a
+# new class for every config leaks memory over a long uptime
+_object_types = {}
+
 
 class CheckConfig:
     """
@@ -140,7 +144,11 @@ class CheckConfig:
         Given a = {'test': 'testval'}, a.test == 'testval' after being passed to this function.
         """
         tmp_dict = tmp_dict or {}
-        objNamedTuple = namedtuple("objNamedTuple", sorted(tmp_dict))
+        fields = tuple(sorted(tmp_dict))
+        objNamedTuple = _object_types.get(fields)
+        if not objNamedTuple:
+            objNamedTuple = namedtuple("objNamedTuple", fields)
+            _object_types[fields] = objNamedTuple
         return objNamedTuple(**tmp_dict)
 
     def build_pod_spec(self, **kwargs):
@@ -0,0 +1,124 @@
+import sys
+import asyncio
+import logging
+import threading
+
+from mozalert import kubeclient
+
+
+class AsyncJobEngine:
+    """
+    the AsyncJobEngine runs an asyncio event loop in a single thread and drives
+    check jobs on it: create, wait, log fetch, status patch and delete. A check
+    waiting on its pod costs a suspended coroutine instead of a blocked thread,
+    so one engine can carry thousands of jobs at once.
+
+    Checks hand their job coroutine to submit() from a scheduler worker and get
+    a concurrent.futures.Future back; the worker is free as soon as the job is
+    submitted.
+    """
+
+    def __init__(self, **kwargs):
+        self._domain = kwargs.get("domain", "")
+        self._version = kwargs.get("version", "")
+        self._plural = kwargs.get("plural", "")
+        self._max_jobs = int(kwargs.get("max_jobs", 1000))
+
+        self._kube = kwargs.get("kube", None)
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._semaphore = None
+        self._error = None
+
+    @property
+    def kube(self):
+        return self._kube
+
+    @property
+    def loop(self):
+        return self._loop
+
+    @property
+    def max_jobs(self):
+        return self._max_jobs
+
+    @staticmethod
+    def available():
+        """
+        the engine needs the optional kubernetes_asyncio package
+        """
+        return kubeclient.async_client is not None
+
+    def is_alive(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self, timeout=30):
+        """
+        start the event loop thread and wait for the async client to load
+        """
+        if self.is_alive():
+            return
+        self._ready.clear()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="job-engine")
+        self._thread.daemon = True
+        self._thread.start()
+        self._ready.wait(timeout)
+        if self._error:
+            raise self._error
+
+    def stop(self):
+        if not self.is_alive():
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+        self._thread.join()
+
+    def submit(self, coro):
+        """
+        schedule a coroutine on the engine and return a concurrent.futures.Future
+        """
+        return asyncio.run_coroutine_threadsafe(self._bounded(coro), self._loop)
+
+    async def _bounded(self, coro):
+        async with self._semaphore:
+            return await coro
+
+    async def _setup(self):
+        self._semaphore = asyncio.Semaphore(self.max_jobs)
+        if not self._kube:
+            self._kube = kubeclient.AsyncKubeClient(
+                self._domain, self._version, self._plural
+            )
+            await self._kube.load()
+
+    async def _shutdown(self):
+        tasks = [
+            t for t in asyncio.all_tasks(self._loop) if t is not asyncio.current_task()
+        ]
+        if tasks:
+            logging.info(f"Waiting for {len(tasks)} jobs to finish")
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if hasattr(self._kube, "close"):
+            await self._kube.close()
+        self._loop.stop()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._setup())
+        except Exception as e:
+            logging.error("Failed to start the job engine")
+            logging.error(sys.exc_info()[0])
+            logging.error(e)
+            self._error = e
+            self._ready.set()
+            self._loop.close()
+            return
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+        logging.info("Job Engine Shutdown")
@@ -1,6 +1,10 @@
 import logging
 import threading
 from mozalert import checks
+from mozalert.escalations import registry
+
+# the start of the status message for a check with escalations we can't send
+UNKNOWN_ESCALATIONS = "Unknown escalation types"
 
 
 class CheckHandler(threading.Thread):
@@ -9,7 +13,7 @@ class CheckHandler(threading.Thread):
     they come in. Each event has an associated operation:
 
     ADDED: a new check has been created. the main thread creates a new check object which
-           creates a threading.Timer set to the check_interval.
+           schedules its first run on the shared scheduler at the check_interval.
 
     DELETED: a check has been removed. Cancel/resolve any running threads and delete the
              check object.
@@ -24,12 +28,45 @@ class CheckHandler(threading.Thread):
 
     """
 
-    def __init__(self, q, kube, metrics_queue, shutdown=lambda: False):
+    def __init__(
+        self,
+        q,
+        kube,
+        metrics_queue,
+        scheduler=None,
+        engine=None,
+        job_watcher=lambda: None,
+        status_writer=None,
+        log_store=None,
+        state_store=None,
+        escalation_dispatcher=lambda: None,
+        escalation_registry=None,
+        shard=None,
+        check_args=None,
+        shutdown=lambda: False,
+    ):
         super().__init__()
         self.q = q
         self.shutdown = shutdown
         self.kube = kube
         self.metrics_queue = metrics_queue
+        self.scheduler = scheduler
+        self.engine = engine
+        # a function returning the current JobWatcher
+        self.job_watcher = job_watcher
+        self.status_writer = status_writer
+        self.log_store = log_store
+        self.state_store = state_store
+        # a function returning the current EscalationDispatcher
+        self.escalation_dispatcher = escalation_dispatcher
+        self.escalation_registry = escalation_registry or registry.default_registry()
+        # check key -> state saved by a previous controller, until the check
+        # is created
+        self._saved = {}
+        self.shard = shard
+        # any other arguments to pass through to each Check
+        self.check_args = check_args or {}
+        self._shard_generation = None
 
         self._checks = {}
 
@@ -46,9 +83,56 @@ class CheckHandler(threading.Thread):
         for c in self.checks.keys():
             self._checks[c].terminate()
         for c in self.checks.keys():
-            self._checks[c].thread.join()
+            self._checks[c].join()
         logging.info("Finished shutting down checks")
 
+    def new_check(self, evt, history=None):
+        """
+        create a check from an ADDED or MODIFIED event, reading any
+        status found on the object back into the check. A check replacing
+        one whose config changed keeps the old check's result history.
+        Otherwise the check picks up any state saved by a previous controller.
+        """
+        if self.status_writer:
+            self.status_writer.seed(str(evt), evt.status)
+        check = checks.check.Check(
+            kube=self.kube,
+            config=evt.config,
+            metrics_queue=self.metrics_queue,
+            scheduler=self.scheduler,
+            engine=self.engine,
+            job_watcher=self.job_watcher,
+            status_writer=self.status_writer,
+            log_store=self.log_store,
+            state_store=self.state_store,
+            escalation_dispatcher=self.escalation_dispatcher,
+            escalation_registry=self.escalation_registry,
+            saved_state=self._saved.pop(str(evt), None),
+            pre_status=evt.status,
+            uid=evt.uid,
+            generation=evt.generation,
+            history=history,
+            **self.check_args,
+        )
+        self.validate(check)
+        return check
+
+    def validate(self, check):
+        """
+        flag a check whose escalations name a type we don't have in its
+        status message, so it's seen now rather than when the check fails
+        """
+        unknown = self.escalation_registry.validate(check.config.escalations)
+        message = check.status.message or ""
+        if unknown:
+            logging.error(f"{check} has unknown escalation types: {', '.join(unknown)}")
+            check.status.message = f"{UNKNOWN_ESCALATIONS}: {', '.join(unknown)}"
+        elif message.startswith(UNKNOWN_ESCALATIONS):
+            check.status.message = ""
+        else:
+            return
+        check.set_crd_status()
+
     def kill_check(self, check_name):
         if check_name not in self.checks:
             logging.warning(f"{check_name} not found in checks`")
@@ -57,8 +141,37 @@ class CheckHandler(threading.Thread):
         self._checks[check_name].terminate()
         del self._checks[check_name]
 
+    def rebalance(self):
+        """
+        stop any checks which are no longer in our shard. Checks which moved
+        into our shard arrive as ADDED events when the event handler re-lists.
+        """
+        self._shard_generation = self.shard.generation
+        for check_name in list(self.checks.keys()):
+            check = self.checks[check_name]
+            if not self.shard.owns(check.config.namespace, check.config.name):
+                logging.info(f"{check_name} moved to another shard")
+                self.kill_check(check_name)
+
+    def load_state(self):
+        """
+        read the saved state of every check in one go, before the first
+        events come in
+        """
+        if not self.state_store:
+            return
+        try:
+            self._saved = self.state_store.load()
+        except Exception as e:
+            logging.error(f"Failed to load the saved check state: {e}")
+            self._saved = {}
+
     def run(self):
+        self.load_state()
         while not self.shutdown():
+            if self.shard and self.shard.generation != self._shard_generation:
+                self.rebalance()
+
             evt = self.q.get()
             if not evt:
                 continue
@@ -77,35 +190,70 @@ class CheckHandler(threading.Thread):
             check_name = str(evt)
             resource_version = evt.resource_version
 
-            if evt.ADDED:
+            if (
+                (evt.MODIFIED or evt.ADDED)
+                and evt.generation is not None
+                and check_name in self.checks
+                and self.checks[check_name].generation == evt.generation
+                and self.checks[check_name].config.labels == evt.labels
+            ):
+                # the spec and labels haven't changed since we applied them,
+                # so this is most likely one of our own status patches coming
+                # back (label changes don't bump the generation)
+                logging.debug(f"Ignoring status change to {evt}")
+                continue
+
+            try:
+                config = evt.config
+            except Exception as e:
+                logging.error(f"Failed to parse the config of {evt}: {e}")
+                continue
+
+            if self.shard and not self.shard.owns(config.namespace, config.name):
+                # left over from before a rebalance
+                if check_name in self.checks:
+                    self.kill_check(check_name)
+                continue
+
+            if evt.ADDED and check_name not in self.checks:
                 # create a new check and read any
                 # found status back into the check
-                self._checks[check_name] = checks.check.Check(
-                    kube=self.kube,
-                    config=evt.config,
-                    metrics_queue=self.metrics_queue,
-                    pre_status=evt.status,
-                )
+                self._checks[check_name] = self.new_check(evt)
+                continue
 
             if evt.DELETED:
                 self.kill_check(check_name)
+                if self.status_writer:
+                    self.status_writer.forget(check_name)
+                if self.log_store:
+                    self.log_store.forget(check_name)
+                if self.state_store:
+                    self.state_store.forget(check_name)
+                continue
+
+            if evt.MODIFIED and check_name not in self.checks:
+                # a check we weren't running, e.g. one which just moved into
+                # our shard
+                self._checks[check_name] = self.new_check(evt)
+                continue
 
-            if evt.MODIFIED:
+            if evt.MODIFIED or evt.ADDED:
                 # a MODIFIED event could either be a config change or a status
-                # change, so we need to detect which it is
+                # change, so we need to detect which it is. An ADDED for a check
+                # we already have comes from the event handler re-listing.
                 if dict(self.checks[check_name].config) == dict(evt.config):
-                    logging.debug("Detected a status change")
+                    logging.debug("Detected a status or label change")
+                    # remember the generation so we don't parse this spec
+                    # again, and pick up any new labels without restarting
+                    self.checks[check_name].generation = evt.generation
+                    self.checks[check_name].config = evt.config
                     continue
 
                 logging.info(f"Detected a config change to {evt}")
 
+                history = self.checks[check_name].history
                 self.kill_check(check_name)
 
-                self._checks[check_name] = checks.check.Check(
-                    kube=self.kube,
-                    config=evt.config,
-                    metrics_queue=self.metrics_queue,
-                    pre_status=evt.status,
-                )
+                self._checks[check_name] = self.new_check(evt, history=history)
         self.terminate()
         logging.info("Check Handler Shutdown")
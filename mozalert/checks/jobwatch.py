@@ -0,0 +1,221 @@
+import sys
+import asyncio
+import logging
+import threading
+from time import sleep
+
+from types import SimpleNamespace
+
+from mozalert import kubeclient
+
+
+def job_status(res):
+    """
+    turn a V1Job from the api into a SimpleNamespace with the
+    fields the checks care about
+    """
+    status = SimpleNamespace(
+        active=False, succeeded=False, failed=False, start_time=None
+    )
+
+    if res.status.active == 1:
+        status.active = True
+
+    if res.status.succeeded:
+        status.succeeded = True
+
+    if res.status.failed:
+        status.failed = True
+
+    if res.status.start_time:
+        status.start_time = res.status.start_time
+
+    return status
+
+
+class JobWatcher(threading.Thread):
+    """
+    the JobWatcher keeps one cluster-wide watch open on the Jobs mozalert
+    creates and caches the latest status of each one. A running check waits
+    on the watcher instead of polling read_namespaced_job_status, and is woken
+    as soon as its job finishes.
+
+    If the watch breaks the watcher is marked unhealthy and waiting checks
+    are woken so they can fall back to polling until it reconnects.
+    """
+
+    # we may be blocked reading the watch, so don't hold up shutdown for it
+    shutdown_timeout = 5
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        self.daemon = True
+        self.kube = kwargs.get("kube")
+        self.shutdown = kwargs.get("shutdown", lambda: False)
+        self._stream_watch_timeout = kwargs.get("stream_watch_timeout", 300)
+        self._retry_backoff_max = kwargs.get("retry_backoff_max", 30)
+
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._subscribers = {}
+        self._healthy = False
+
+    @property
+    def healthy(self):
+        return self._healthy and self.is_alive()
+
+    @healthy.setter
+    def healthy(self, healthy):
+        changed = healthy != self._healthy
+        self._healthy = healthy
+        if changed and not healthy:
+            # wake everyone up so they can go back to polling
+            self._notify_all()
+
+    def get(self, key, uid=None):
+        """
+        return the cached status for the job namespace/name. If a uid is
+        given, a cached status from an older job with the same name is ignored.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+        if not job or (uid and job.uid != uid):
+            return SimpleNamespace(
+                active=False, succeeded=False, failed=False, start_time=None
+            )
+        return job.status
+
+    def subscribe(self, key, callback):
+        with self._lock:
+            self._subscribers.setdefault(key, set()).add(callback)
+
+    def unsubscribe(self, key, callback):
+        with self._lock:
+            callbacks = self._subscribers.get(key, set())
+            callbacks.discard(callback)
+            if not callbacks:
+                self._subscribers.pop(key, None)
+
+    def wait(self, key, uid=None, timeout=3):
+        """
+        block until the job is finished or timeout seconds have passed,
+        then return its status. Returns None if the watcher isn't healthy,
+        in which case the caller should poll the api itself.
+        """
+        if not self.healthy:
+            return
+        done = threading.Event()
+        self.subscribe(key, done.set)
+        try:
+            st = self.get(key, uid)
+            if not st.succeeded and not st.failed:
+                done.wait(timeout)
+        finally:
+            self.unsubscribe(key, done.set)
+        if not self.healthy:
+            return
+        return self.get(key, uid)
+
+    async def wait_async(self, key, uid=None, timeout=3):
+        """
+        the coroutine version of wait, for the AsyncJobEngine
+        """
+        if not self.healthy:
+            return
+        loop = asyncio.get_running_loop()
+        done = asyncio.Event()
+
+        def callback():
+            loop.call_soon_threadsafe(done.set)
+
+        self.subscribe(key, callback)
+        try:
+            st = self.get(key, uid)
+            if not st.succeeded and not st.failed:
+                try:
+                    await asyncio.wait_for(done.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.unsubscribe(key, callback)
+        if not self.healthy:
+            return
+        return self.get(key, uid)
+
+    def _notify(self, key):
+        with self._lock:
+            callbacks = list(self._subscribers.get(key, []))
+        for callback in callbacks:
+            callback()
+
+    def _notify_all(self):
+        with self._lock:
+            callbacks = [c for s in self._subscribers.values() for c in s]
+        for callback in callbacks:
+            callback()
+
+    def handle_event(self, evt):
+        """
+        update the cache from a single watch event
+        """
+        job = evt.get("object")
+        key = f"{job.metadata.namespace}/{job.metadata.name}"
+
+        if evt.get("type") == "DELETED":
+            with self._lock:
+                self._jobs.pop(key, None)
+            return
+
+        st = job_status(job)
+        with self._lock:
+            self._jobs[key] = SimpleNamespace(uid=job.metadata.uid, status=st)
+
+        if st.succeeded or st.failed:
+            self._notify(key)
+
+    def run(self):
+        resource_version = ""
+        backoff = 1
+        logging.info("Watching mozalert jobs...")
+        while not self.shutdown():
+            try:
+                stream = self.kube.Watch().stream(
+                    self.kube.BatchV1Api.list_job_for_all_namespaces,
+                    label_selector=kubeclient.JOB_LABEL_SELECTOR,
+                    resource_version=resource_version,
+                    timeout_seconds=self._stream_watch_timeout,
+                    allow_watch_bookmarks=True,
+                )
+                if not resource_version:
+                    # a fresh list replays every job as ADDED
+                    with self._lock:
+                        self._jobs = {}
+                self.healthy = True
+                for evt in stream:
+                    if evt.get("type") == "ERROR":
+                        # most likely our resource_version is too old,
+                        # start over with a fresh list
+                        resource_version = ""
+                        break
+                    if evt.get("type") == "BOOKMARK":
+                        resource_version = evt["raw_object"]["metadata"][
+                            "resourceVersion"
+                        ]
+                        continue
+                    try:
+                        self.handle_event(evt)
+                        resource_version = evt["object"].metadata.resource_version
+                    except Exception as e:
+                        logging.debug(f"Skipping unexpected job event: {e}")
+                    if self.shutdown():
+                        break
+                backoff = 1
+            except Exception as e:
+                logging.warning(f"Job watch failed, falling back to polling: {e}")
+                logging.debug(sys.exc_info()[0])
+                self.healthy = False
+                resource_version = ""
+                sleep(backoff)
+                backoff = min(backoff * 2, self._retry_backoff_max)
+        self.healthy = False
+        logging.info("Job Watcher Shutdown")
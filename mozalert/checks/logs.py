@@ -0,0 +1,134 @@
+import codecs
+
+from mozalert.metrics import telemetry
+
+# how much of a pod log we read off the wire at a time
+CHUNK_SIZE = 4096
+
+
+class LogCapture:
+    """
+    the LogCapture collects a job's logs as they stream in without ever
+    holding more than about max_bytes of them. The first part of the log
+    (head_ratio of the limit) is kept as it arrives; after that only the
+    most recent lines are kept, and a marker notes how much was dropped in
+    between. Sizes are counted in bytes of utf-8, which is what the logs
+    take up in the check's status.
+
+    telemetry lines are pulled out of each chunk as it passes, so they are
+    found no matter where in the log they are. extract takes a block of
+    complete lines and returns it without the telemetry lines, along with
+    a dict of the telemetry found; pass extract=None to keep every line.
+    """
+
+    def __init__(self, max_bytes=32768, head_ratio=0.25, extract=telemetry.extract):
+        self._head_bytes = int(max_bytes * head_ratio)
+        self._tail_bytes = int(max_bytes) - self._head_bytes
+        self._extract = extract
+
+        # what we keep is held encoded, so it's measured in bytes
+        self._head = b""
+        self._head_full = False
+        self._tail = b""
+        self._truncated = 0
+
+        self._partial = ""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+        self.telemetry = {}
+
+    @property
+    def max_bytes(self):
+        return self._head_bytes + self._tail_bytes
+
+    @property
+    def truncated(self):
+        """
+        the number of bytes dropped from the middle of the log
+        """
+        return self._truncated
+
+    @property
+    def size(self):
+        """
+        the number of bytes of log currently held
+        """
+        return len(self._head) + len(self._tail) + len(self._partial.encode())
+
+    @property
+    def logs(self):
+        # a line cut short may end part way through a character
+        head = self._head.decode(errors="ignore")
+        tail = self._tail.decode(errors="ignore")
+        if not self._truncated:
+            return head + tail
+        return f"{head}... {self._truncated} bytes truncated ...\n{tail}"
+
+    def feed(self, chunk):
+        """
+        add a chunk (bytes or str) of log, which may end mid-line
+        """
+        if isinstance(chunk, bytes):
+            chunk = self._decoder.decode(chunk)
+        text = self._partial + chunk
+        end = text.rfind("\n") + 1
+        self._partial = text[end:]
+        if end:
+            self.add_lines(text[:end])
+        # utf-8 takes at most 4 bytes a character, so only a partial line
+        # longer than this can be over the limit
+        if len(self._partial) > self.max_bytes / 4 and (
+            len(self._partial.encode()) > self.max_bytes
+        ):
+            # a single enormous line; it's too long to be telemetry so don't
+            # wait for the end of it
+            self.keep(self._partial + "\n")
+            self._partial = ""
+
+    def flush(self):
+        """
+        the end of a stream; whatever is left over is the last line
+        """
+        self._partial += self._decoder.decode(b"", final=True)
+        if self._partial:
+            self.add_lines(self._partial + "\n")
+        self._partial = ""
+        self._decoder.reset()
+
+    def add_lines(self, text):
+        if self._extract:
+            text, found = self._extract(text)
+            self.telemetry.update(found)
+        if text:
+            self.keep(text)
+
+    def keep(self, text):
+        """
+        add complete lines to the head while there's room, then to the tail,
+        dropping whole lines from the front of the tail to stay in budget
+        """
+        text = text.encode()
+        if not self._head_full:
+            room = self._head_bytes - len(self._head)
+            if len(text) <= room:
+                self._head += text
+                return
+            end = text.rfind(b"\n", 0, room) + 1
+            self._head += text[:end]
+            text = text[end:]
+            self._head_full = True
+
+        tail = self._tail + text
+        excess = len(tail) - self._tail_bytes
+        if excess > 0:
+            start = tail.find(b"\n", excess - 1) + 1
+            if start == len(tail):
+                # the last line alone doesn't fit; keep the start of it
+                start = tail.rfind(b"\n", 0, len(tail) - 1) + 1
+                line = tail[start : start + max(self._tail_bytes - 1, 0)] + b"\n"
+                self._truncated += len(tail) - len(line)
+                tail = line
+            else:
+                self._truncated += start
+                tail = tail[start:]
+        self._tail = tail
@@ -0,0 +1,184 @@
+import os
+import sys
+import zlib
+import logging
+import hashlib
+import threading
+from time import time
+from collections import OrderedDict, deque
+
+
+class LogStore:
+    """
+    the LogStore keeps the full logs of check runs off the Check object, so
+    the status subresource only carries an excerpt and a reference to them.
+
+    Logs are zlib compressed and stored by the sha256 of their content, so a
+    check which prints the same thing every run only stores it once. With a
+    path (e.g. a PVC) they're written to files under it, otherwise they're
+    kept in memory, up to max_bytes compressed.
+
+    The last `keep` logs of each check are kept; a log no check refers to
+    any more is removed. Files left behind by a previous run are removed once
+    they're older than max_age seconds.
+    """
+
+    def __init__(self, path=None, keep=5, max_bytes=64 * 1024 * 1024, max_age=86400):
+        self._path = path
+        self._keep = int(keep)
+        self._max_bytes = int(max_bytes)
+        self._max_age = max_age
+
+        self._lock = threading.Lock()
+        # digest -> compressed logs, when we aren't using a path
+        self._blobs = OrderedDict()
+        self._size = 0
+        # check key -> its most recent digests, and how many checks use each
+        self._history = {}
+        self._refs = {}
+
+        if self._path:
+            os.makedirs(self._path, exist_ok=True)
+            self.prune()
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def size(self):
+        """
+        the compressed bytes held in memory
+        """
+        return self._size
+
+    @staticmethod
+    def digest(logs):
+        return hashlib.sha256(logs.encode()).hexdigest()
+
+    @staticmethod
+    def ref(digest):
+        return f"sha256:{digest}"
+
+    def file(self, digest):
+        return os.path.join(self._path, digest[:2], f"{digest}.z")
+
+    def put(self, key, logs):
+        """
+        store the logs of a run of the check key and return their reference
+        """
+        digest = self.digest(logs)
+        with self._lock:
+            if not self.exists(digest):
+                self.write(digest, zlib.compress(logs.encode()))
+            self._refs[digest] = self._refs.get(digest, 0) + 1
+            history = self._history.setdefault(key, deque())
+            history.append(digest)
+            while len(history) > self._keep:
+                self.release(history.popleft())
+        return self.ref(digest)
+
+    def exists(self, digest):
+        if self._path:
+            return os.path.exists(self.file(digest))
+        if digest in self._blobs:
+            self._blobs.move_to_end(digest)
+            return True
+        return False
+
+    def get(self, ref):
+        """
+        the logs for a reference, or None if we don't have them
+        """
+        digest = ref.split(":", 1)[-1]
+        if self._path:
+            try:
+                with open(self.file(digest), "rb") as f:
+                    blob = f.read()
+            except OSError:
+                return
+        else:
+            with self._lock:
+                blob = self._blobs.get(digest)
+            if not blob:
+                return
+        return zlib.decompress(blob).decode()
+
+    def forget(self, key):
+        """
+        drop the logs of a check which has been deleted
+        """
+        with self._lock:
+            for digest in self._history.pop(key, []):
+                self.release(digest)
+
+    def write(self, digest, blob):
+        if not self._path:
+            self._blobs[digest] = blob
+            self._size += len(blob)
+            while self._size > self._max_bytes and len(self._blobs) > 1:
+                # out of room; the oldest logs go first even if referenced
+                _, dropped = self._blobs.popitem(last=False)
+                self._size -= len(dropped)
+            return
+        filename = self.file(digest)
+        try:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(f"{filename}.tmp", "wb") as f:
+                f.write(blob)
+            os.replace(f"{filename}.tmp", filename)
+        except OSError as e:
+            logging.error(f"Failed to store logs {digest}: {e}")
+
+    def release(self, digest):
+        self._refs[digest] -= 1
+        if self._refs[digest] > 0:
+            return
+        del self._refs[digest]
+        if not self._path:
+            blob = self._blobs.pop(digest, None)
+            if blob:
+                self._size -= len(blob)
+            return
+        try:
+            os.remove(self.file(digest))
+        except OSError:
+            pass
+
+    def prune(self):
+        """
+        remove stored logs older than max_age which we don't refer to
+        """
+        if not self._path or not self._max_age:
+            return
+        cutoff = time() - self._max_age
+        for root, _, files in os.walk(self._path):
+            for name in files:
+                digest = name.split(".")[0]
+                filename = os.path.join(root, name)
+                try:
+                    if digest not in self._refs and os.path.getmtime(filename) < cutoff:
+                        os.remove(filename)
+                except OSError:
+                    pass
+
+
+def main():
+    """
+    print stored logs: mozalert-logs sha256:<digest>
+    """
+    if len(sys.argv) != 2:
+        print(f"usage: {sys.argv[0]} <logs_ref>", file=sys.stderr)
+        sys.exit(1)
+    store = LogStore(
+        path=os.environ.get("LOG_STORE_PATH", "/var/lib/mozalert/logs"), max_age=0
+    )
+    logs = store.get(sys.argv[1])
+    if logs is None:
+        print(f"{sys.argv[1]} not found in {store.path}", file=sys.stderr)
+        sys.exit(1)
+    print(logs, end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,9 @@ class CheckMonitor(threading.Thread):
 
         self.shutdown = kwargs.get("shutdown", lambda: False)
 
+        # with a ShardManager only the checks in our shard are looked at
+        self.shard = kwargs.get("shard", None)
+
         # max failures before considering the check run a failure
         self.failed_threshold = kwargs.get("failed_threshold", 0)
 
@@ -62,9 +65,20 @@ class CheckMonitor(threading.Thread):
         logging.info("Running Check Monitor")
 
         checks = {}
+        list_args = {}
+        if self.shard:
+            if not self.shard.label_selector:
+                logging.info("No checks in our shard, Check Monitor finished")
+                return
+            list_args["label_selector"] = self.shard.label_selector
+
         try:
             check_list = self.kube.CustomObjectsApi.list_cluster_custom_object(
-                self.kube.domain, self.kube.version, self.kube.plural, watch=False
+                self.kube.domain,
+                self.kube.version,
+                self.kube.plural,
+                watch=False,
+                **list_args,
             )
         except Exception as e:
             logging.error(e)
@@ -0,0 +1,216 @@
+import sys
+import heapq
+import logging
+import threading
+import itertools
+from time import monotonic
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ScheduledRun:
+    """
+    a handle to a single scheduled run of a check. It stands in for the
+    threading.Timer each check used to own, so it keeps the parts of that
+    interface we rely on: cancel(), is_alive() and join().
+    """
+
+    def __init__(self, when, name, func, kwargs=None):
+        self.when = when
+        self.name = name
+        self.func = func
+        self.kwargs = kwargs or {}
+        self._cancelled = False
+        self._started = False
+        self._finished = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    @property
+    def started(self):
+        return self._started
+
+    def cancel(self):
+        """
+        stop the run from happening if it hasn't started yet. A run which
+        is already executing is left alone, same as threading.Timer.
+        """
+        self._cancelled = True
+        if not self._started:
+            self._finished.set()
+
+    def is_alive(self):
+        """
+        a run is alive while it is waiting to fire or is still executing
+        """
+        return not self._finished.is_set()
+
+    def join(self, timeout=None):
+        return self._finished.wait(timeout)
+
+    def run(self):
+        """
+        called from a worker thread. The worker is renamed after the check
+        while it runs so log lines keep the check name, like the old
+        per-check Timer threads did.
+        """
+        if self._cancelled:
+            self._finished.set()
+            return
+        self._started = True
+        worker = threading.current_thread()
+        worker_name = worker.name
+        worker.name = self.name
+        try:
+            self.func(**self.kwargs)
+        except Exception as e:
+            logging.error(f"Scheduled run for {self.name} failed")
+            logging.error(sys.exc_info()[0])
+            logging.error(e)
+        finally:
+            worker.name = worker_name
+            self._finished.set()
+
+
+class Scheduler:
+    """
+    the Scheduler replaces the threading.Timer each check used to start for
+    every run. All pending runs live in a single min-heap keyed on the time
+    they are due; one dispatcher thread sleeps until the earliest one is due
+    and hands it to a bounded pool of worker threads. The number of threads
+    stays the same no matter how many checks are defined.
+
+    Cancelled runs are left in the heap and skipped when they come up, the
+    heap is compacted if they start to pile up.
+    """
+
+    def __init__(self, **kwargs):
+        self._max_workers = int(kwargs.get("max_workers", 50))
+
+        self._heap = []
+        self._counter = itertools.count()
+        self._cancelled = 0
+        self._cond = threading.Condition()
+        self._shutdown = False
+
+        self._dispatcher = None
+        self._pool = None
+
+    @property
+    def max_workers(self):
+        return self._max_workers
+
+    @property
+    def pending(self):
+        """
+        the number of runs waiting in the heap which haven't been cancelled
+        """
+        with self._cond:
+            return len([e for _, _, e in self._heap if not e.cancelled])
+
+    def is_alive(self):
+        return bool(self._dispatcher and self._dispatcher.is_alive())
+
+    def start(self):
+        with self._cond:
+            if self.is_alive():
+                return
+            self._shutdown = False
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="check-worker"
+            )
+            self._dispatcher = threading.Thread(
+                target=self._run, name="check-scheduler", daemon=True
+            )
+            self._dispatcher.start()
+
+    def stop(self, wait=True):
+        """
+        stop dispatching new runs. Runs already handed to the pool are allowed
+        to finish if wait is True.
+        """
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify()
+        if self._dispatcher:
+            self._dispatcher.join()
+        if self._pool:
+            self._pool.shutdown(wait=wait)
+        with self._cond:
+            for _, _, run in self._heap:
+                run.cancel()
+            self._heap = []
+            self._cancelled = 0
+
+    def schedule(self, delay, func, name="", kwargs=None):
+        """
+        schedule func to run in delay seconds and return the ScheduledRun handle
+        """
+        run = ScheduledRun(monotonic() + max(delay, 0), name, func, kwargs)
+        with self._cond:
+            heapq.heappush(self._heap, (run.when, next(self._counter), run))
+            # only wake the dispatcher if this run is now the earliest
+            if self._heap[0][2] is run:
+                self._cond.notify()
+        return run
+
+    def cancel(self, run):
+        """
+        cancel a run and compact the heap if cancelled runs start to
+        outnumber live ones
+        """
+        if run.started or run.cancelled:
+            return
+        run.cancel()
+        with self._cond:
+            self._cancelled += 1
+            if self._cancelled > 64 and self._cancelled > len(self._heap) // 2:
+                self._heap = [x for x in self._heap if not x[2].cancelled]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def _run(self):
+        while True:
+            due = []
+            with self._cond:
+                while not self._shutdown:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    timeout = self._heap[0][0] - monotonic()
+                    if timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                if self._shutdown:
+                    return
+                now = monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, run = heapq.heappop(self._heap)
+                    if run.cancelled:
+                        self._cancelled = max(self._cancelled - 1, 0)
+                        continue
+                    due += [run]
+            for run in due:
+                try:
+                    self._pool.submit(run.run)
+                except Exception as e:
+                    logging.error(f"Failed to dispatch {run.name}")
+                    logging.error(e)
+                    run.cancel()
+
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler():
+    """
+    the scheduler used by checks which weren't given one explicitly
+    """
+    global _default_scheduler
+    with _default_lock:
+        if not _default_scheduler:
+            _default_scheduler = Scheduler()
+        _default_scheduler.start()
+        return _default_scheduler
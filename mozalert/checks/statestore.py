@@ -0,0 +1,174 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from time import time
+from types import SimpleNamespace
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checks (
+    key TEXT PRIMARY KEY,
+    uid TEXT,
+    generation INTEGER,
+    status TEXT NOT NULL,
+    escalated INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    runtime INTEGER NOT NULL,
+    telemetry TEXT
+);
+CREATE INDEX IF NOT EXISTS results_key_ts ON results (key, ts);
+"""
+
+
+class StateStore:
+    """
+    the StateStore keeps the state of every check in a local SQLite
+    database (on the StatefulSet's volume) so a restarted controller picks
+    up where it left off: the check status, whether the check is escalated,
+    and its recent results.
+
+    Everything is read back in bulk by load() when the controller starts.
+    The check objects are still the source of truth: a saved state is only
+    used for the same object (by uid) whose spec generation hasn't changed
+    since it was saved, and only if it's newer than the status on the check
+    object.
+
+    Results older than retention seconds, or beyond the newest `depth` of a
+    check, are removed by prune(), as are checks which haven't been updated
+    within the retention (e.g. deleted while the controller was down).
+    """
+
+    def __init__(self, path, retention=7 * 86400, depth=1000):
+        self._path = path
+        self._retention = retention
+        self._depth = int(depth)
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+            self._db.commit()
+
+    @property
+    def path(self):
+        return self._path
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def save(self, key, generation, status, escalated, uid=None):
+        """
+        save the state of a check; status takes the form of
+        Status.crd_status["status"]
+        """
+        with self._lock:
+            self._db.execute(
+                """
+                INSERT OR REPLACE INTO checks
+                (key, uid, generation, status, escalated, updated)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (key, uid, generation, json.dumps(status), int(escalated), time()),
+            )
+            self._db.commit()
+
+    def record(self, key, timestamp, status, runtime, telemetry=None):
+        """
+        save a result of a check, as recorded in its ResultHistory
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?)",
+                (
+                    key,
+                    int(timestamp.timestamp()),
+                    status.value,
+                    int(runtime),
+                    json.dumps(telemetry or {}),
+                ),
+            )
+            self._db.commit()
+
+    def forget(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM checks WHERE key = ?", (key,))
+            self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._db.commit()
+
+    def load(self):
+        """
+        read back the state of every check, keyed by namespace/name
+        """
+        states = {}
+        with self._lock:
+            for key, uid, generation, status, escalated, updated in self._db.execute(
+                "SELECT key, uid, generation, status, escalated, updated FROM checks"
+            ):
+                try:
+                    status = json.loads(status)
+                except ValueError:
+                    status = {}
+                states[key] = SimpleNamespace(
+                    uid=uid,
+                    generation=generation,
+                    status=status,
+                    escalated=bool(escalated),
+                    updated=updated,
+                    results=[],
+                )
+            rows = self._db.execute(
+                """
+                SELECT key, ts, status, runtime, telemetry FROM (
+                    SELECT rowid AS id, *, ROW_NUMBER() OVER (
+                        PARTITION BY key ORDER BY ts DESC, rowid DESC
+                    ) AS n FROM results
+                ) WHERE n <= ? ORDER BY key, ts, id
+                """,
+                (self._depth,),
+            ).fetchall()
+        for key, ts, status, runtime, telemetry in rows:
+            if key not in states:
+                continue
+            try:
+                telemetry = json.loads(telemetry or "{}")
+            except ValueError:
+                telemetry = {}
+            states[key].results += [
+                SimpleNamespace(
+                    timestamp=ts, status=status, runtime=runtime, telemetry=telemetry
+                )
+            ]
+        logging.info(f"Loaded the saved state of {len(states)} checks")
+        return states
+
+    def prune(self):
+        cutoff = time() - self._retention
+        with self._lock:
+            self._db.execute("DELETE FROM checks WHERE updated < ?", (cutoff,))
+            self._db.execute(
+                "DELETE FROM results WHERE ts < ? OR key NOT IN (SELECT key FROM checks)",
+                (int(cutoff),),
+            )
+            self._db.execute(
+                """
+                DELETE FROM results WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY key ORDER BY ts DESC, rowid DESC
+                        ) AS n FROM results
+                    ) WHERE n > ?
+                )
+                """,
+                (self._depth,),
+            )
+            self._db.commit()
@@ -0,0 +1,163 @@
+import sys
+import logging
+import threading
+from time import monotonic
+
+from types import SimpleNamespace
+
+from mozalert.metrics import instrument
+
+
+def diff_status(old, new):
+    """
+    return the fields in new which are different from old, as a json
+    merge patch: nested dicts are diffed too, and keys which were removed
+    from a nested dict are set to None so the apiserver drops them.
+    """
+    patch = {}
+    for key, val in new.items():
+        old_val = old.get(key)
+        if old_val == val:
+            continue
+        if isinstance(val, dict) and isinstance(old_val, dict):
+            nested = diff_status(old_val, val)
+            for removed in old_val.keys() - val.keys():
+                nested[removed] = None
+            patch[key] = nested
+        else:
+            patch[key] = val
+    return patch
+
+
+class StatusWriter(threading.Thread):
+    """
+    the StatusWriter takes CRD status updates from checks and writes them
+    behind, so a check never waits on the apiserver to record its status.
+
+    * writes for the same check within the coalesce window collapse into one
+    * only the fields which changed since the last successful write are sent
+    * a write with no changes is skipped entirely
+
+    the last status written for each check is kept so we can diff against it.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        self.kube = kwargs.get("kube")
+        self.shutdown = kwargs.get("shutdown", lambda: False)
+        self.metrics_queue = kwargs.get("metrics_queue", None)
+        self._window = float(kwargs.get("window", 2))
+
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._written = {}
+
+        self.stats = SimpleNamespace(submitted=0, written=0, skipped=0, failed=0)
+
+    @property
+    def window(self):
+        return self._window
+
+    def kube_call(self, verb, resource):
+        return instrument.kube_call(self.metrics_queue, verb, resource)
+
+    def seed(self, key, status):
+        """
+        record what the status already looks like in k8s, e.g. the status
+        read back on ADDED after a restart
+        """
+        with self._cond:
+            self._written[key] = dict(status or {})
+
+    def forget(self, key):
+        """
+        drop all state for a check which has been deleted
+        """
+        with self._cond:
+            self._pending.pop(key, None)
+            self._written.pop(key, None)
+
+    def write(self, namespace, name, crd_status):
+        """
+        queue the status to be written; crd_status takes the form
+        of Status.crd_status
+        """
+        key = f"{namespace}/{name}"
+        with self._cond:
+            self.stats.submitted += 1
+            pending = self._pending.get(key)
+            if pending:
+                # coalesce with the write which is already waiting
+                pending.status = crd_status.get("status", {})
+                return
+            self._pending[key] = SimpleNamespace(
+                namespace=namespace,
+                name=name,
+                status=crd_status.get("status", {}),
+                due=monotonic() + self.window,
+            )
+            self._cond.notify()
+
+    def flush(self):
+        """
+        write everything that's pending right away
+        """
+        with self._cond:
+            due = list(self._pending.items())
+            self._pending = {}
+        for key, pending in due:
+            self.send(key, pending)
+
+    def send(self, key, pending):
+        with self._cond:
+            written = self._written.get(key, {})
+        patch = diff_status(written, pending.status)
+        if not patch:
+            logging.debug(f"Status of {key} unchanged, skipping patch")
+            self.stats.skipped += 1
+            return
+
+        try:
+            with self.kube_call("patch", "checks/status"):
+                self.kube.CustomObjectsApi.patch_namespaced_custom_object_status(
+                    self.kube.domain,
+                    self.kube.version,
+                    pending.namespace,
+                    self.kube.plural,
+                    pending.name,
+                    body={"status": patch},
+                )
+        except Exception as e:
+            # leave _written alone so the next write for this check
+            # sends these fields again
+            logging.debug(sys.exc_info()[0])
+            logging.debug(e)
+            self.stats.failed += 1
+            return
+
+        self.stats.written += 1
+        with self._cond:
+            self._written[key] = {**written, **pending.status}
+
+    def run(self):
+        while not self.shutdown():
+            due = []
+            with self._cond:
+                if not self._pending:
+                    self._cond.wait(1)
+                    continue
+                # the window is the same for every write and coalescing doesn't
+                # move an entry, so _pending is already in due order
+                now = monotonic()
+                first = next(iter(self._pending.values())).due
+                if first > now:
+                    self._cond.wait(min(first - now, 1))
+                    continue
+                for key in list(self._pending.keys()):
+                    if self._pending[key].due > now:
+                        break
+                    due += [(key, self._pending.pop(key))]
+            for key, pending in due:
+                self.send(key, pending)
+        self.flush()
+        logging.info("Status Writer Shutdown")
@@ -3,9 +3,11 @@ import threading
 import queue
 import sys
 from types import SimpleNamespace
-from time import sleep
+from time import sleep, monotonic
 
-from mozalert import kubeclient, checks, metrics, events
+from mozalert import kubeclient, checks, metrics, events, shard
+from mozalert.escalations import dispatcher, registry
+from mozalert.utils import ratelimit, profiler, http
 
 
 class Controller(threading.Thread):
@@ -24,9 +26,112 @@ class Controller(threading.Thread):
         self.shutdown = kwargs.get("shutdown", lambda: False)
 
         self._check_monitor_interval = kwargs.get("check_monitor_interval", 60)
+        self._check_workers = kwargs.get("check_workers", 50)
+        self._async_jobs = kwargs.get("async_jobs", False)
+        self._job_watch = kwargs.get("job_watch", True)
+        self._status_write_window = kwargs.get("status_write_window", 2)
 
-        self.metrics_queue = metrics.queue.MetricsQueue()
+        self._startup_window = kwargs.get("startup_window", 60)
+        self._log_max_bytes = kwargs.get("log_max_bytes", 32768)
+        self._history_depth = kwargs.get("history_depth", 1000)
+
+        # with a log_store_path the full check logs are kept on disk there,
+        # and the check status only gets the end of them; otherwise the
+        # status keeps all log_max_bytes of them, as it always has
+        self.log_store = None
+        if kwargs.get("log_store_path", None):
+            self.log_store = checks.logstore.LogStore(path=kwargs.get("log_store_path"))
+
+        # check state is saved here so a restart can pick up where we left
+        # off without reading every check back from the API
+        self.state_store = None
+        if kwargs.get("state_path", None):
+            try:
+                self.state_store = checks.statestore.StateStore(
+                    kwargs.get("state_path"),
+                    retention=kwargs.get("state_retention", 7 * 86400),
+                    depth=self._history_depth,
+                )
+            except Exception as e:
+                logging.error(f"Failed to open the state store: {e}")
+        # how often old state is pruned from the state store
+        self._state_prune_interval = kwargs.get("state_prune_interval", 3600)
+        self._job_create_rate = kwargs.get("job_create_rate", 10)
+        self._metrics_flush_interval = kwargs.get("metrics_flush_interval", 15)
+        self._metrics_batch_size = kwargs.get("metrics_batch_size", 500)
+
+        # serve /metrics for scraping on this port
+        self.metrics_exporter = None
+        if kwargs.get("metrics_port", None):
+            self.metrics_exporter = metrics.exporter.MetricsExporter(
+                kwargs.get("metrics_port")
+            )
+
+        # the escalation types are found once, here
+        self.escalation_registry = registry.default_registry()
+
+        # escalations are sent from their own pool of workers
+        self._escalation_args = {
+            "max_workers": kwargs.get("escalation_workers", 10),
+            "type_limits": kwargs.get("escalation_type_limits", None),
+            "max_attempts": kwargs.get("escalation_max_attempts", 5),
+            "dead_letter_path": kwargs.get("escalation_dead_letter_path", None),
+            # combine escalations to the same destination within this many
+            # seconds into one message; 0 sends each one right away
+            "digest_window": kwargs.get("digest_window", 0),
+            "digest_max_checks": kwargs.get("digest_max_checks", 50),
+            # escalations per second to each destination and overall; 0 is
+            # unlimited
+            "destination_rate": kwargs.get("escalation_destination_rate", 0),
+            "destination_burst": kwargs.get("escalation_destination_burst", 1),
+            "global_rate": kwargs.get("escalation_global_rate", 0),
+            "global_burst": kwargs.get("escalation_global_burst", 1),
+            "overflow": kwargs.get("escalation_overflow", "queue"),
+            "max_queued": kwargs.get("escalation_max_queued", 20),
+            # how long to keep sending, within the limits, on shutdown
+            "drain_timeout": kwargs.get("escalation_drain_timeout", 10),
+        }
+
+        # escalation backends share pooled, keep-alive http sessions
+        http.configure(
+            connect_timeout=kwargs.get("escalation_connect_timeout", None),
+            read_timeout=kwargs.get("escalation_read_timeout", None),
+            pool_size=kwargs.get("escalation_pool_size", None),
+        )
+
+        # on-demand profiling of the running controller, off by default
+        self.debug_server = None
+        if kwargs.get("debug_port", None):
+            self.debug_server = profiler.DebugServer(kwargs.get("debug_port"))
+
+        # sharding is off unless a mode ("lease" or "ordinal") is given
+        self._sharding = kwargs.get("sharding", None)
+        self._shard_count = kwargs.get("shard_count", 1)
+        self._shard_namespace = kwargs.get("shard_namespace", "default")
+
+        self.metrics_queue = metrics.queue.MetricsQueue(namespace=self._shard_namespace)
+        # how often we record metrics about the controller itself
+        self._self_metrics_interval = kwargs.get("self_metrics_interval", 15)
         self.event_queue = events.queue.EventQueue()
+        self.scheduler = checks.scheduler.Scheduler(max_workers=self._check_workers)
+
+        self.job_rate_limit = None
+        if self._job_create_rate:
+            self.job_rate_limit = ratelimit.TokenBucket(self._job_create_rate)
+
+        self.engine = None
+        if self._async_jobs:
+            if checks.engine.AsyncJobEngine.available():
+                self.engine = checks.engine.AsyncJobEngine(
+                    domain=domain,
+                    version=version,
+                    plural=plural,
+                    max_jobs=kwargs.get("max_async_jobs", 1000),
+                )
+            else:
+                logging.warning(
+                    "kubernetes_asyncio is not installed, using threaded jobs"
+                )
 
         self.kube = kubeclient.KubeClient(domain, version, plural)
 
@@ -38,10 +143,71 @@ class Controller(threading.Thread):
     def clients(self):
         return self._clients
 
+    @property
+    def job_watcher(self):
+        """
+        the JobWatcher thread, if job watching is enabled. Checks look it up
+        through here each time so they pick up a restarted watcher.
+        """
+        if "job-watcher" not in self.threads:
+            return
+        return self.threads["job-watcher"].thread
+
+    @property
+    def status_writer(self):
+        return self.threads["status-writer"].thread
+
+    @property
+    def escalation_dispatcher(self):
+        return self.threads["escalation-dispatcher"].thread
+
+    @property
+    def shard(self):
+        if "shard-manager" not in self.threads:
+            return
+        return self.threads["shard-manager"].thread
+
     @property
     def checks(self):
         return self.threads["check-handler"].thread.checks
 
+    @property
+    def jobs_in_flight(self):
+        try:
+            return len([c for c in list(self.checks.values()) if c.status.RUNNING])
+        except Exception:
+            return 0
+
+    def report_metrics(self):
+        """
+        record how the controller itself is keeping up
+        """
+        q = self.metrics_queue
+        q.put_controller(
+            "mozalert_controller_queue_depth",
+            labels={"queue": "events"},
+            value=self.event_queue.depth,
+        )
+        q.put_controller(
+            "mozalert_controller_queue_depth",
+            labels={"queue": "metrics"},
+            value=q.depth,
+        )
+        q.put_controller(
+            "mozalert_controller_queue_depth",
+            labels={"queue": "checks"},
+            value=self.scheduler.pending,
+        )
+        q.put_controller(
+            "mozalert_controller_queue_depth",
+            labels={"queue": "escalations"},
+            value=self.escalation_dispatcher.depth,
+        )
+        q.put_controller("mozalert_controller_threads", value=threading.active_count())
+        q.put_controller(
+            "mozalert_controller_jobs_in_flight", value=self.jobs_in_flight
+        )
+
     def terminate(self):
         logging.info("Received SIGTERM request. Shutting down controller.")
         for t in self.threads.keys():
@@ -92,12 +258,32 @@ class Controller(threading.Thread):
     def run(self):
         """
         the controller runs various threads:
+           * check scheduler
+             a single dispatcher thread plus a bounded worker pool which runs every
+             check when it is due.
+           * job engine (optional)
+             an asyncio event loop which runs the check jobs so that waiting
+             on a pod doesn't hold a worker.
+           * job watcher (optional)
+             keeps a single watch on the jobs mozalert creates so running checks
+             are told when their job finishes instead of polling for it.
+           * status writer
+             writes check status to the CRD status subresource behind the checks,
+             coalescing and diffing the patches.
+           * escalation dispatcher
+             sends escalations for the checks from a pool of workers, retrying
+             them with backoff, so checks never wait on a notification provider.
+           * shard manager and labeler (optional)
+             works out which checks this replica owns when the checks are
+             split across several replicas, and labels new checks with their
+             shard.
            * healthcheck-thread
              this runs every check_monitor_interval seconds and checks the running check
              threads against what's defined in k8s.
            * metrics
              this thread consumes the metrics_queue and sends metrics to prometheus using
-             the push gateway.
+             the push gateway, in batches every metrics_flush_interval seconds,
+             and/or serves them on metrics_port for prometheus to scrape.
            * event handler
              this polls the event stream from k8s for changes to the CRD and sends new
              events to the check handler via the event queue
@@ -106,17 +292,89 @@ class Controller(threading.Thread):
 
         """
 
+        # start the scheduler which runs the checks
+        self.scheduler.start()
+
+        if self.debug_server:
+            try:
+                self.debug_server.start()
+            except Exception as e:
+                logging.error(f"Failed to start the debug server: {e}")
+                self.debug_server = None
+
+        if self.engine:
+            try:
+                self.engine.start()
+            except Exception as e:
+                logging.error(f"Falling back to threaded jobs: {e}")
+                self.engine = None
+
+        # start the shard manager
+        if self._sharding:
+            self.new_thread(
+                "shard-manager",
+                shard.ShardManager,
+                kube=self.kube,
+                mode=self._sharding,
+                shard_count=self._shard_count,
+                namespace=self._shard_namespace,
+            )
+            self.new_thread(
+                "shard-labeler",
+                shard.ShardLabeler,
+                kube=self.kube,
+                shard=self.shard,
+            )
+
         # start the check_monitor thread
         self.new_thread(
             "healthcheck-thread",
             checks.monitor.CheckMonitor,
             kube=self.kube,
             interval=self._check_monitor_interval,
+            shard=self.shard,
+        )
+
+        # start the job watcher
+        if self._job_watch:
+            self.new_thread(
+                "job-watcher",
+                checks.jobwatch.JobWatcher,
+                kube=self.kube,
+            )
+
+        # start the status writer
+        self.new_thread(
+            "status-writer",
+            checks.statuswriter.StatusWriter,
+            kube=self.kube,
+            window=self._status_write_window,
+            metrics_queue=self.metrics_queue,
+        )
+
+        # start the escalation dispatcher
+        self.new_thread(
+            "escalation-dispatcher",
+            dispatcher.EscalationDispatcher,
+            metrics_queue=self.metrics_queue,
+            registry=self.escalation_registry,
+            **self._escalation_args,
         )
 
         # start the metrics consumer
+        if self.metrics_exporter:
+            try:
+                self.metrics_exporter.start()
+            except Exception as e:
+                logging.error(f"Failed to start the metrics exporter: {e}")
+                self.metrics_exporter = None
         self.new_thread(
-            "metrics-handler", metrics.thread.MetricsThread, q=self.metrics_queue
+            "metrics-handler",
+            metrics.thread.MetricsThread,
+            q=self.metrics_queue,
+            flush_interval=self._metrics_flush_interval,
+            batch_size=self._metrics_batch_size,
+            exporter=self.metrics_exporter,
         )
 
         # start the event handler
@@ -125,6 +383,8 @@ class Controller(threading.Thread):
             events.handler.EventHandler,
             q=self.event_queue,
             kube=self.kube,
+            shard=self.shard,
+            metrics_queue=self.metrics_queue,
         )
 
         # start the check handler
@@ -134,19 +394,64 @@ class Controller(threading.Thread):
             q=self.event_queue,
             kube=self.kube,
             metrics_queue=self.metrics_queue,
+            scheduler=self.scheduler,
+            engine=self.engine,
+            job_watcher=lambda: self.job_watcher,
+            status_writer=self.status_writer,
+            log_store=self.log_store,
+            state_store=self.state_store,
+            escalation_dispatcher=lambda: self.escalation_dispatcher,
+            escalation_registry=self.escalation_registry,
+            shard=self.shard,
+            check_args={
+                "startup_window": self._startup_window,
+                "log_max_bytes": self._log_max_bytes,
+                "history_depth": self._history_depth,
+                "job_rate_limit": self.job_rate_limit,
+            },
         )
 
         # run the main execution loop
         # check to make sure each thread is alive, and restart it if not
+        last_report = 0
+        last_prune = monotonic()
         while not self.shutdown():
             for t in self.threads.keys():
                 if not self.shutdown() and not self.threads[t].thread.is_alive():
                     logging.error(f"Thread {t} was not running. Restarting.")
                     self.restart_thread(t)
+            if monotonic() - last_report >= self._self_metrics_interval:
+                last_report = monotonic()
+                try:
+                    self.report_metrics()
+                except Exception as e:
+                    logging.error(f"Failed to record controller metrics: {e}")
+            if (
+                self.state_store
+                and monotonic() - last_prune >= self._state_prune_interval
+            ):
+                last_prune = monotonic()
+                try:
+                    self.state_store.prune()
+                except Exception as e:
+                    logging.error(f"Failed to prune the state store: {e}")
             sleep(2)
 
         # main loop is broken so shut down
         for t in self.threads.keys():
             self.threads[t].shutdown = True
-            self.threads[t].thread.join()
+        for t in self.threads.keys():
+            # threads blocked on a watch can say how long they're worth waiting for
+            thread = self.threads[t].thread
+            thread.join(getattr(thread, "shutdown_timeout", None))
+        if self.engine:
+            self.engine.stop()
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+        if self.debug_server:
+            self.debug_server.stop()
+        self.scheduler.stop()
+        http.close()
+        if self.state_store:
+            self.state_store.close()
         logging.info("Controller shut down")
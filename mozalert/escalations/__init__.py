@@ -1,4 +1,9 @@
 class BaseEscalation:
+    # whether escalations of this type to the same destination can be
+    # combined into a digest; a backend which does implements destination
+    # and digest()
+    supports_batching = False
+
     def __init__(self, name, status, config, args):
         self.name = name
         self.status = status
@@ -7,5 +12,36 @@ class BaseEscalation:
 
         assert self.status and self.config, "Must specify status and config"
 
+        # the status the check escalated with; status changes under us
+        self.status_name = self.status.status.name
+
+    @property
+    def destination(self):
+        """
+        where the escalation is sent, e.g. an email address. Escalations to
+        the same destination can be combined into a digest.
+        """
+        return None
+
+    @classmethod
+    def digest(cls, escalations, max_checks=50):
+        """
+        a single escalation summarizing several escalations to the same
+        destination, listing at most max_checks of them
+        """
+        return None
+
+    @staticmethod
+    def summary(escalations, max_checks=50):
+        """
+        a line for each check in a digest, and a title
+        """
+        failing = len([e for e in escalations if e.status_name != "OK"])
+        title = f"{len(escalations)} checks escalated, {failing} failing"
+        lines = [f"{e.name}: {e.status_name}" for e in escalations[:max_checks]]
+        if len(escalations) > max_checks:
+            lines += [f"... and {len(escalations) - max_checks} more"]
+        return title, lines
+
     def run(self):
         pass
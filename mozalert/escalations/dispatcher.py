@@ -0,0 +1,537 @@
+import sys
+import json
+import heapq
+import logging
+import threading
+import itertools
+from time import monotonic, time
+from collections import deque
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+from mozalert.escalations import registry
+from mozalert.utils.ratelimit import TokenBucket
+
+# what to do with the escalations piling up for a rate limited destination
+OVERFLOW_POLICIES = ("queue", "drop-oldest", "summary")
+
+
+class EscalationDispatcher(threading.Thread):
+    """
+    the EscalationDispatcher sends escalations for the checks, so a check
+    never waits on a notification provider before it's rescheduled.
+
+    * escalations are sent from a bounded pool of max_workers threads
+    * at most type_limits[type] (or type_limit) of each type are sent at once
+    * a failed escalation is retried with exponential backoff, up to
+      max_attempts times
+    * one which still fails is dead-lettered: logged, kept in dead_letters,
+      and appended as a json line to dead_letter_path if it's set
+
+    the message is built when the escalation is submitted, so it describes
+    the check as it was when it escalated.
+
+    with a digest_window, escalations of a type which supports batching to
+    the same destination (a slack channel, an email address) are held for up
+    to digest_window seconds after the first one and sent as one summary
+    listing the checks (at most digest_max_checks of them), so a destination
+    gets at most one message per window however many checks escalate.
+
+    sends are also limited by token buckets: destination_rate per second to
+    each destination (with bursts of destination_burst) and global_rate per
+    second overall. A destination which answers 429 is paused for as long
+    as its Retry-After asks. Once more than max_queued escalations are
+    waiting on a destination's limit, the overflow policy decides what
+    happens to them:
+
+    * queue: they keep waiting their turn
+    * drop-oldest: the oldest are dropped down to max_queued
+    * summary: they're collapsed into one digest, if the type supports
+      batching, otherwise the oldest are dropped
+
+    on shutdown, whatever is waiting keeps going out within the same limits
+    for up to drain_timeout seconds; anything still waiting after that is
+    dead-lettered.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        self.shutdown = kwargs.get("shutdown", lambda: False)
+        self.metrics_queue = kwargs.get("metrics_queue", None)
+        self.registry = kwargs.get("registry", None) or registry.default_registry()
+        self._max_workers = int(kwargs.get("max_workers", 10))
+        self._type_limits = kwargs.get("type_limits", None) or {}
+        self._type_limit = int(kwargs.get("type_limit", 5))
+        self._max_attempts = int(kwargs.get("max_attempts", 5))
+        self._backoff = float(kwargs.get("backoff", 2))
+        self._backoff_max = float(kwargs.get("backoff_max", 300))
+        self._dead_letter_path = kwargs.get("dead_letter_path", None)
+        self._digest_window = float(kwargs.get("digest_window", 0))
+        self._digest_max_checks = int(kwargs.get("digest_max_checks", 50))
+        self._destination_rate = float(kwargs.get("destination_rate", 0))
+        self._destination_burst = max(float(kwargs.get("destination_burst", 1)), 1)
+        self._max_queued = int(kwargs.get("max_queued", 20))
+        self._drain_timeout = float(kwargs.get("drain_timeout", 10))
+        self._overflow = kwargs.get("overflow", "queue")
+        if self._overflow not in OVERFLOW_POLICIES:
+            logging.error(f"Unknown overflow policy {self._overflow}, using queue")
+            self._overflow = "queue"
+        self._global_bucket = None
+        if kwargs.get("global_rate", 0):
+            burst = max(float(kwargs.get("global_burst", 1)), 1)
+            self._global_bucket = TokenBucket(
+                kwargs.get("global_rate"), capacity=burst, tokens=burst
+            )
+
+        self._cond = threading.Condition()
+        # (due, seq, delivery) for every escalation waiting to be sent
+        self._queue = []
+        self._counter = itertools.count()
+        self._in_flight = {}
+        # (type, destination) -> escalations being collected into a digest
+        self._digests = {}
+        # (type, destination) -> its token bucket, and when a destination
+        # which told us to back off will take messages again
+        self._buckets = {}
+        self._paused = {}
+        self._draining = False
+        # once we start draining nothing new is taken
+        self._closed = False
+        self._pool = None
+
+        self.dead_letters = deque(maxlen=100)
+        self.stats = SimpleNamespace(
+            submitted=0,
+            delivered=0,
+            retried=0,
+            failed=0,
+            dead=0,
+            digested=0,
+            throttled=0,
+            dropped=0,
+        )
+
+    @property
+    def depth(self):
+        """
+        the number of escalations waiting to be sent
+        """
+        with self._cond:
+            return len(self._queue) + sum(
+                len(d.deliveries) for d in self._digests.values()
+            )
+
+    @property
+    def in_flight(self):
+        with self._cond:
+            return sum(self._in_flight.values())
+
+    def idle(self):
+        """
+        True if nothing is waiting to be sent or being sent
+        """
+        with self._cond:
+            return not (self._queue or self._digests or any(self._in_flight.values()))
+
+    def type_limit(self, escalation_type):
+        return int(self._type_limits.get(escalation_type, self._type_limit))
+
+    def submit(self, check, escalation_type, args, config, status):
+        """
+        queue an escalation of check (namespace/name) to be sent. Returns
+        False if the dispatcher is draining and won't take it, in which case
+        it's up to the caller to send it.
+        """
+        with self._cond:
+            if self._closed:
+                return False
+        delivery = SimpleNamespace(
+            check=check,
+            type=escalation_type,
+            status=status.status.name,
+            attempt=0,
+            submitted=monotonic(),
+            escalation=None,
+            destination=None,
+            throttled=False,
+        )
+        try:
+            delivery.escalation = self.registry.get(escalation_type)(
+                check, args=args, config=config, status=status
+            )
+        except Exception as e:
+            self.stats.submitted += 1
+            self.dead_letter(delivery, e)
+            return True
+        delivery.destination = getattr(delivery.escalation, "destination", None)
+        with self._cond:
+            # we may have started draining while the message was built
+            if self._closed:
+                return False
+            self.stats.submitted += 1
+            if (
+                self._digest_window
+                and self.registry.supports_batching(escalation_type)
+                and delivery.destination
+            ):
+                self.collect(delivery)
+            else:
+                self.enqueue(delivery, 0)
+        return True
+
+    def collect(self, delivery):
+        """
+        hold an escalation to be sent in its destination's next digest
+        """
+        key = (delivery.type, delivery.destination)
+        with self._cond:
+            digest = self._digests.get(key)
+            if not digest:
+                digest = SimpleNamespace(
+                    due=monotonic() + self._digest_window, deliveries=[]
+                )
+                self._digests[key] = digest
+                self._cond.notify()
+            digest.deliveries += [delivery]
+
+    def flush_digests(self, force=False):
+        """
+        queue the digests whose window has closed
+        """
+        now = monotonic()
+        with self._cond:
+            due = [k for k, d in self._digests.items() if force or d.due <= now]
+            digests = [self._digests.pop(k) for k in due]
+        for digest in digests:
+            for delivery in self.combine(digest.deliveries):
+                self.enqueue(delivery, 0)
+
+    @staticmethod
+    def parts(delivery):
+        """
+        the escalations a delivery was built from: those combined into it if
+        it's a digest, otherwise just itself
+        """
+        return getattr(delivery, "parts", None) or [delivery]
+
+    def combine(self, deliveries):
+        """
+        the deliveries to send for a digest: one summary if the escalation
+        type supports it, otherwise each escalation on its own. A digest
+        being combined again is replaced by the escalations it was built
+        from, so none of them are lost.
+        """
+        if len(deliveries) == 1:
+            return deliveries
+        parts = [p for d in deliveries for p in self.parts(d)]
+        escalations = [p.escalation for p in parts]
+        try:
+            escalation = type(escalations[0]).digest(
+                escalations, max_checks=self._digest_max_checks
+            )
+        except Exception as e:
+            logging.error(f"Failed to build a {deliveries[0].type} digest: {e}")
+            escalation = None
+        if not escalation:
+            return deliveries
+        # escalations already in a digest were counted when it was built
+        self.stats.digested += len([d for d in deliveries if len(self.parts(d)) == 1])
+        logging.info(
+            f"Combined {len(parts)} {deliveries[0].type} escalations into a digest"
+        )
+        return [
+            SimpleNamespace(
+                check=f"{parts[0].check} and {len(parts) - 1} more",
+                type=deliveries[0].type,
+                status=",".join(sorted({p.status for p in parts})),
+                attempt=0,
+                submitted=min(p.submitted for p in parts),
+                escalation=escalation,
+                destination=deliveries[0].destination,
+                throttled=any(d.throttled for d in deliveries),
+                parts=parts,
+            )
+        ]
+
+    def enqueue(self, delivery, delay):
+        with self._cond:
+            heapq.heappush(
+                self._queue, (monotonic() + delay, next(self._counter), delivery)
+            )
+            self._cond.notify()
+
+    def next_due(self):
+        """
+        take the first escalation which is due, whose type isn't at its
+        limit and which its rate limits allow; call with the lock held
+        """
+        now = monotonic()
+        skipped = []
+        # destination -> when it can next be sent to
+        throttled = {}
+        found = None
+        while self._queue and self._queue[0][0] <= now:
+            entry = heapq.heappop(self._queue)
+            delivery = entry[2]
+            if self._in_flight.get(delivery.type, 0) >= self.type_limit(delivery.type):
+                skipped += [entry]
+                continue
+            key = (delivery.type, delivery.destination)
+            if key not in throttled:
+                wait = self.throttle(delivery, now)
+                if not wait:
+                    found = delivery
+                    break
+                throttled[key] = now + wait
+            # try again once the limit allows it; everything waiting on the
+            # destination gets the same time so they stay in order
+            self.mark_throttled(delivery)
+            skipped += [(throttled[key], entry[1], delivery)]
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+        for key in throttled:
+            self.overflow(key)
+        if found:
+            self._in_flight[found.type] = self._in_flight.get(found.type, 0) + 1
+        return found
+
+    def bucket(self, key):
+        """
+        the token bucket for a destination; it starts full so the first
+        escalations to a destination go straight out
+        """
+        if not self._destination_rate or not key[1]:
+            return
+        if key not in self._buckets:
+            self._buckets[key] = TokenBucket(
+                self._destination_rate,
+                capacity=self._destination_burst,
+                tokens=self._destination_burst,
+            )
+        return self._buckets[key]
+
+    def throttle(self, delivery, now):
+        """
+        take a token for the delivery from its destination's and the global
+        buckets and return 0, or return how long until it can be sent
+        """
+        key = (delivery.type, delivery.destination)
+        buckets = [b for b in (self.bucket(key), self._global_bucket) if b]
+        wait = max([self._paused.get(key, 0) - now] + [b.wait_time() for b in buckets])
+        if wait <= 0:
+            for b in buckets:
+                b.try_acquire()
+            return 0
+        return wait
+
+    def mark_throttled(self, delivery):
+        """
+        count an escalation held back by a rate limit, once
+        """
+        if delivery.throttled:
+            return
+        delivery.throttled = True
+        self.stats.throttled += 1
+        self.count("mozalert_escalation_throttled", delivery)
+
+    def overflow(self, key):
+        """
+        apply the overflow policy to the escalations waiting on a rate
+        limited destination; call with the lock held
+        """
+        if self._overflow == "queue" or not key[1]:
+            return
+        waiting = sorted(
+            (e for e in self._queue if (e[2].type, e[2].destination) == key),
+            key=lambda e: e[2].submitted,
+        )
+        if len(waiting) <= self._max_queued:
+            return
+        if self._overflow == "summary" and self.registry.supports_batching(key[0]):
+            combined = self.combine([e[2] for e in waiting])
+            if len(combined) == 1:
+                due = max(e[0] for e in waiting)
+                self._queue = [e for e in self._queue if e not in waiting]
+                self._queue += [(due, next(self._counter), combined[0])]
+                heapq.heapify(self._queue)
+                return
+        dropped = waiting[: len(waiting) - self._max_queued]
+        self._queue = [e for e in self._queue if e not in dropped]
+        heapq.heapify(self._queue)
+        for _, _, delivery in dropped:
+            self.stats.dropped += 1
+            logging.warning(
+                f"Dropped {delivery.type} escalation for {delivery.check},"
+                " too many are waiting on its destination"
+            )
+            self.count("mozalert_escalation_dropped", delivery)
+
+    def count(self, key, delivery):
+        if self.metrics_queue:
+            self.metrics_queue.put_controller(key, labels={"type": delivery.type})
+
+    @staticmethod
+    def retry_after(e):
+        """
+        how long a provider asked us to wait (a 429 with a Retry-After), or
+        None if it didn't
+        """
+        if getattr(e, "retry_after", None) is not None:
+            return float(e.retry_after)
+        response = getattr(e, "response", None)
+        if response is None or getattr(response, "status_code", None) != 429:
+            return
+        try:
+            return max(float(response.headers.get("Retry-After", 1)), 0)
+        except (TypeError, ValueError):
+            # an HTTP date; not worth parsing
+            return 1
+
+    def deliver(self, delivery):
+        delivery.attempt += 1
+        try:
+            delivery.escalation.run()
+        except Exception as e:
+            self.failed(delivery, e)
+        else:
+            self.stats.delivered += 1
+            logging.info(f"Sent {delivery.type} escalation for {delivery.check}")
+            self.observe(delivery, "delivered")
+        finally:
+            with self._cond:
+                self._in_flight[delivery.type] -= 1
+                self._cond.notify()
+
+    def failed(self, delivery, e):
+        self.stats.failed += 1
+        self.count("mozalert_escalation_failures", delivery)
+        if delivery.attempt >= self._max_attempts or self._draining:
+            self.dead_letter(delivery, e)
+            return
+        delay = min(self._backoff * 2 ** (delivery.attempt - 1), self._backoff_max)
+        retry_after = self.retry_after(e)
+        if retry_after is not None:
+            # rate limited; hold back everything for this destination too
+            delay = retry_after
+            key = (delivery.type, delivery.destination)
+            with self._cond:
+                self._paused[key] = max(
+                    self._paused.get(key, 0), monotonic() + retry_after
+                )
+            self.stats.throttled += 1
+            self.count("mozalert_escalation_throttled", delivery)
+        logging.warning(
+            f"Failed to send {delivery.type} escalation for {delivery.check}"
+            f" (attempt {delivery.attempt}), retrying in {delay}s: {e}"
+        )
+        self.stats.retried += 1
+        self.enqueue(delivery, delay)
+
+    def dead_letter(self, delivery, e):
+        """
+        give up on an escalation
+        """
+        self.stats.dead += 1
+        letter = {
+            "time": time(),
+            "check": delivery.check,
+            "type": delivery.type,
+            "status": delivery.status,
+            "attempts": delivery.attempt,
+            "error": f"{e}",
+        }
+        if len(self.parts(delivery)) > 1:
+            letter["checks"] = [p.check for p in self.parts(delivery)]
+        self.dead_letters.append(letter)
+        logging.error(
+            f"Giving up on {delivery.type} escalation for {delivery.check}"
+            f" after {delivery.attempt} attempts: {e}"
+        )
+        self.observe(delivery, "dead")
+        self.count("mozalert_escalation_dead_letters", delivery)
+        if not self._dead_letter_path:
+            return
+        try:
+            with open(self._dead_letter_path, "a") as f:
+                f.write(json.dumps(letter) + "\n")
+        except OSError as e:
+            logging.error(f"Failed to write to {self._dead_letter_path}: {e}")
+
+    def observe(self, delivery, outcome):
+        """
+        record how long an escalation took from being submitted to being
+        sent (or given up on)
+        """
+        if not self.metrics_queue:
+            return
+        self.metrics_queue.put_controller(
+            "mozalert_escalation_latency",
+            labels={"type": delivery.type, "outcome": outcome},
+            value=monotonic() - delivery.submitted,
+        )
+
+    def drain(self):
+        """
+        on shutdown, keep sending what's waiting within the rate limits for
+        up to drain_timeout seconds, then dead-letter whatever is left
+        """
+        with self._cond:
+            self._closed = True
+        self.flush_digests(force=True)
+        end = monotonic() + self._drain_timeout
+        try:
+            self.dispatch(done=lambda: monotonic() >= end or self.idle())
+        except Exception as e:
+            logging.error(f"Failed to drain escalations: {e}")
+            logging.error(sys.exc_info()[0])
+        with self._cond:
+            # anything failing from here on is given up on, not retried
+            self._draining = True
+        self._pool.shutdown(wait=True)
+        with self._cond:
+            queued = [delivery for _, _, delivery in sorted(self._queue)]
+            self._queue = []
+        for delivery in queued:
+            self.dead_letter(delivery, "shutting down")
+
+    def run(self):
+        self._pool = ThreadPoolExecutor(
+            max_workers=self._max_workers, thread_name_prefix="escalation"
+        )
+        try:
+            self.dispatch()
+        except Exception as e:
+            # we'll be restarted, but what's queued here would be lost
+            logging.error(f"Escalation dispatcher failed, draining: {e}")
+            logging.error(sys.exc_info()[0])
+        self.drain()
+        logging.info("Escalation Dispatcher Shutdown")
+
+    def dispatch(self, done=None):
+        """
+        hand escalations to the pool as they come due, until shutdown (or
+        until done() when draining)
+        """
+        done = done or self.shutdown
+        while not done():
+            if self._digests:
+                self.flush_digests()
+            with self._cond:
+                delivery = self.next_due()
+                if not delivery:
+                    wait = 1
+                    if self._queue and self._queue[0][0] > monotonic():
+                        wait = min(self._queue[0][0] - monotonic(), 1)
+                    for digest in self._digests.values():
+                        wait = max(min(digest.due - monotonic(), wait), 0)
+                    # a delivery finishing or a new submission wakes us early
+                    self._cond.wait(wait)
+                    continue
+            try:
+                self._pool.submit(self.deliver, delivery)
+            except Exception as e:
+                logging.error(sys.exc_info()[0])
+                logging.error(e)
+                with self._cond:
+                    self._in_flight[delivery.type] -= 1
+                self.enqueue(delivery, self._backoff)
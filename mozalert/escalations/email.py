@@ -1,10 +1,14 @@
 from mozalert.escalations import BaseEscalation
 
 import os
+import copy
+from html import escape
 from mozalert.utils.sendgrid import SendGridTools
 
 
 class Escalation(BaseEscalation):
+    supports_batching = True
+
     def __init__(self, name, status, config, args):
         super().__init__(name, status, config, args)
         self.email = self.args.get("email")
@@ -41,6 +45,22 @@ class Escalation(BaseEscalation):
         self.message += "\n" + "</p>"
         self.subject = f"Mozalert {self.status.status.name}: {self.name}"
 
+    @property
+    def destination(self):
+        return self.email
+
+    @classmethod
+    def digest(cls, escalations, max_checks=50):
+        title, lines = cls.summary(escalations, max_checks)
+        digest = copy.copy(escalations[0])
+        digest.subject = f"Mozalert: {title}"
+        digest.message = (
+            f"<p><b>{title}</b><br>\n"
+            + "".join(f"{escape(line)}<br>\n" for line in lines)
+            + "</p>"
+        )
+        return digest
+
     def run(self):
         SendGridTools.send_message(
             api_key=self.api_key,
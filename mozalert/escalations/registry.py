@@ -0,0 +1,136 @@
+import sys
+import logging
+import threading
+import importlib
+
+try:
+    from importlib import metadata
+except ImportError:
+    # python < 3.8
+    try:
+        import importlib_metadata as metadata
+    except ImportError:
+        metadata = None
+
+# the escalation types which ship with mozalert
+BUILTINS = {
+    "email": "mozalert.escalations.email",
+    "slack": "mozalert.escalations.slack",
+}
+
+# other packages add escalation types with an entry point in this group,
+# naming either an Escalation class or a module with one, e.g. in setup.cfg:
+#
+#   [options.entry_points]
+#   mozalert.escalations =
+#       pagerduty = mozalert_pagerduty:Escalation
+ENTRY_POINT_GROUP = "mozalert.escalations"
+
+
+class UnknownEscalationType(KeyError):
+    pass
+
+
+class EscalationRegistry:
+    """
+    the EscalationRegistry maps escalation types to their Escalation
+    classes. The backends are found once, by discover(), so sending an
+    escalation is a dictionary lookup and a check with an escalation type
+    we don't have can be caught when it's added rather than when it fires.
+    """
+
+    def __init__(self):
+        self._backends = {}
+        self._discovered = False
+        self._lock = threading.Lock()
+
+    @property
+    def types(self):
+        return sorted(self._backends.keys())
+
+    def register(self, name, backend):
+        """
+        add an escalation type; backend is an Escalation class or a module
+        with one
+        """
+        backend = getattr(backend, "Escalation", backend)
+        if not callable(getattr(backend, "run", None)):
+            raise TypeError(f"{backend} is not an escalation")
+        with self._lock:
+            self._backends[name] = backend
+        logging.debug(f"Registered escalation type {name}")
+
+    def entry_points(self):
+        if not metadata:
+            # without the importlib_metadata backport, setuptools can find them
+            try:
+                import pkg_resources
+            except ImportError:
+                logging.warning("Can't look for escalation plugins")
+                return []
+            return list(pkg_resources.iter_entry_points(ENTRY_POINT_GROUP))
+        try:
+            return metadata.entry_points(group=ENTRY_POINT_GROUP)
+        except TypeError:
+            # python < 3.10
+            return metadata.entry_points().get(ENTRY_POINT_GROUP, [])
+
+    def discover(self):
+        """
+        load the built-in escalation types and any installed as plugins. A
+        plugin which fails to load is logged and skipped.
+        """
+        for name, module in BUILTINS.items():
+            self.register(name, importlib.import_module(module))
+        for entry_point in self.entry_points():
+            try:
+                self.register(entry_point.name, entry_point.load())
+            except Exception as e:
+                logging.error(f"Failed to load escalation type {entry_point.name}")
+                logging.error(sys.exc_info()[0])
+                logging.error(e)
+        self._discovered = True
+        logging.info(f"Escalation types: {', '.join(self.types)}")
+
+    def get(self, name):
+        if not self._discovered:
+            self.discover()
+        try:
+            return self._backends[name]
+        except KeyError:
+            raise UnknownEscalationType(name)
+
+    def supports_batching(self, name):
+        """
+        whether escalations of this type can be combined into a digest
+        """
+        return bool(getattr(self.get(name), "supports_batching", False))
+
+    def validate(self, escalations):
+        """
+        the escalation types in a check's escalations which we don't have
+        """
+        if not self._discovered:
+            self.discover()
+        unknown = set()
+        for esc in escalations or []:
+            escalation_type = esc.get("type", "email")
+            if escalation_type not in self._backends:
+                unknown.add(escalation_type)
+        return sorted(unknown)
+
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+
+def default_registry():
+    """
+    the registry used by the controller, discovered on first use
+    """
+    global _default_registry
+    with _default_lock:
+        if not _default_registry:
+            _default_registry = EscalationRegistry()
+            _default_registry.discover()
+        return _default_registry
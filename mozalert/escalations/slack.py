@@ -3,12 +3,15 @@ from mozalert.escalations import BaseEscalation
 from urllib.parse import urlencode, quote_plus
 
 import os
-
-import requests
+import copy
 import json
 
+from mozalert.utils import http
+
 
 class Escalation(BaseEscalation):
+    supports_batching = True
+
     def __init__(self, name, status, config, args):
         super().__init__(name, status, config, args)
         self.webhook_url = self.args.get("webhook_url")
@@ -85,9 +88,38 @@ class Escalation(BaseEscalation):
 
         self.slack_message = json.dumps(self.slack_message)
 
+    @property
+    def destination(self):
+        return f"{self.webhook_url}#{self.channel}"
+
+    @classmethod
+    def digest(cls, escalations, max_checks=50):
+        title, lines = cls.summary(escalations, max_checks)
+        failing = any(e.status_name != "OK" for e in escalations)
+        digest = copy.copy(escalations[0])
+        digest.slack_message = json.dumps(
+            {
+                "channel": digest.channel,
+                "username": "Mozalert",
+                "icon_emoji": ":scream_cat:",
+                "attachments": [
+                    {
+                        "mrkdwn_in": ["text"],
+                        "color": "#ff0000" if failing else "#36a64f",
+                        "title": title,
+                        "text": "\n".join(lines),
+                    }
+                ],
+            }
+        )
+        return digest
+
     def run(self):
-        resp = requests.post(
+        resp = http.post(
+            "slack",
             self.webhook_url,
             data=self.slack_message,
             headers={"Content-Type": "application/json"},
         )
+        # raise so the dispatcher retries
+        resp.raise_for_status()
@@ -5,6 +5,16 @@ import logging
 import sys
 
 from mozalert.checks.config import CheckConfig
+from mozalert.utils.lru import LRUCache
+
+TIME_REGEX = re.compile(
+    r"((?P<hours>\d+?)h)?((?P<minutes>\d+?)m)?((?P<seconds>\d+?)s)?"
+)
+
+# decoded CheckConfigs by (uid, generation). The same spec comes through
+# many times (status patches, re-lists, restarts) so we only decode it once.
+# CheckConfigs are never modified after they're built so they can be shared.
+config_cache = LRUCache(maxsize=4096)
 
 
 class EventType(Enum):
@@ -38,9 +48,16 @@ class Event:
         self._metadata = self._obj.get("metadata", {})
 
         self._resource_version = self._metadata.get("resourceVersion")
+        self._uid = self._metadata.get("uid")
+        self._generation = self._metadata.get("generation")
         self._image = self._check_spec.get("image", None)
 
-        self.config = CheckConfig(
+        # the config is only parsed when something asks for it, so events
+        # we end up ignoring (e.g. status changes) never pay for it
+        self._config = None
+
+    def parse_config(self):
+        config = CheckConfig(
             name=self._metadata.get("name"),
             namespace=self._metadata.get("namespace"),
             check_interval=self.parse_time(
@@ -61,8 +78,10 @@ class Event:
             labels=self._metadata.get("labels", {}),
         )
 
-        if not self.config.pod_spec:
-            self.config.build_pod_spec(**self._check_spec)
+        if not config.pod_spec:
+            config.build_pod_spec(**self._check_spec)
+
+        return config
 
     @property
     def obj(self):
@@ -84,6 +103,22 @@ class Event:
         """
         return self._resource_version
 
+    @property
+    def uid(self):
+        return self._uid
+
+    @property
+    def generation(self):
+        """
+        metadata.generation only changes when the spec changes, so we can use
+        it to tell config changes from status changes without parsing anything
+        """
+        return self._generation
+
+    @property
+    def labels(self):
+        return self._metadata.get("labels", {})
+
     @property
     def status(self):
         return self._status
@@ -108,8 +143,27 @@ class Event:
     def BADEVENT(self):
         return self.type == EventType.BADEVENT
 
+    @property
+    def config_key(self):
+        """
+        the key this event's config is cached under, or None if the
+        object is missing its uid or generation
+        """
+        if self.uid is None or self.generation is None:
+            return
+        return (self.uid, self.generation)
+
     @property
     def config(self):
+        if not self._config:
+            key = self.config_key
+            config = config_cache.get(key) if key else None
+            # label changes don't bump the generation
+            if not config or config.labels != self.labels:
+                config = self.parse_config()
+                if key:
+                    config_cache.put(key, config)
+            self._config = config
         return self._config
 
     @config.setter
@@ -117,10 +171,10 @@ class Event:
         self._config = config
 
     def __repr__(self):
-        return f"{self.config.namespace}/{self.config.name}"
+        return f"{self._metadata.get('namespace')}/{self._metadata.get('name')}"
 
     def __str__(self):
-        return f"{self.config.namespace}/{self.config.name}"
+        return f"{self._metadata.get('namespace')}/{self._metadata.get('name')}"
 
     @property
     def image(self):
@@ -139,11 +193,8 @@ class Event:
         except:
             # didn't pass a number, move on to parse the string
             pass
-        regex = re.compile(
-            r"((?P<hours>\d+?)h)?((?P<minutes>\d+?)m)?((?P<seconds>\d+?)s)?"
-        )
         try:
-            parts = regex.match(time_str)
+            parts = TIME_REGEX.match(time_str)
         except Exception as e:
             logging.error(e)
             logging.error(sys.exc_info()[0])
@@ -1,42 +1,198 @@
 import threading
 import logging
 import sys
+from time import sleep
 
 from mozalert import kubeclient
+from mozalert.metrics import instrument
 import queue
 
 
 class EventHandler(threading.Thread):
+    """
+    the EventHandler keeps a long-lived watch open on the Check objects and
+    feeds the events into the event queue.
+
+    The watch asks for bookmarks and always resumes from the last
+    resourceVersion we saw, so reconnecting is cheap. When there is no
+    resourceVersion to resume from (at startup, after our shard changed, or
+    after a 410 Gone because ours expired) we do a paginated list instead
+    and diff it against the checks we already know about, so only real
+    changes become events.
+    """
+
+    # we may be blocked reading the watch, so don't hold up shutdown for it
+    shutdown_timeout = 5
+
     def __init__(self, **kwargs):
         super().__init__()
-        self.kube = kwargs.get("kube", kubeclient.KubeClient())
+        self.daemon = True
+        self.kube = kwargs.get("kube") or kubeclient.KubeClient()
         self.shutdown = kwargs.get("shutdown", lambda: False)
-        self._stream_watch_timeout = kwargs.get("stream_watch_timeout", 5)
+        self.metrics_queue = kwargs.get("metrics_queue", None)
+        self._stream_watch_timeout = kwargs.get("stream_watch_timeout", 300)
+        # with sharding the watch is reopened at least this often, so a
+        # rebalance is noticed even when no events are coming in
+        self._shard_watch_timeout = kwargs.get("shard_watch_timeout", 10)
+        self._list_page_size = kwargs.get("list_page_size", 500)
+        self._retry_backoff_max = kwargs.get("retry_backoff_max", 30)
+
+        # with a ShardManager we only watch the checks in our own buckets
+        self.shard = kwargs.get("shard", None)
 
         self.event_queue = kwargs.get("q", queue.Queue())
 
+        # the resourceVersion of every check we know about, by namespace/name
+        self._known = {}
+
+    def kube_call(self, verb, resource):
+        return instrument.kube_call(self.metrics_queue, verb, resource)
+
+    @staticmethod
+    def key(obj):
+        metadata = obj.get("metadata", {})
+        return f"{metadata.get('namespace')}/{metadata.get('name')}"
+
+    def relist(self, **list_args):
+        """
+        list every check a page at a time and queue events for whatever changed
+        since we last saw it. Returns the resourceVersion to start watching from.
+        """
+        listed = {}
+        resource_version = ""
+        _continue = None
+        while True:
+            page_args = dict(list_args)
+            if _continue:
+                page_args["_continue"] = _continue
+            with self.kube_call("list", "checks"):
+                res = self.kube.CustomObjectsApi.list_cluster_custom_object(
+                    self.kube.domain,
+                    self.kube.version,
+                    self.kube.plural,
+                    limit=self._list_page_size,
+                    **page_args,
+                )
+            if not res:
+                return ""
+            for obj in res.get("items", []):
+                key = self.key(obj)
+                rv = obj.get("metadata", {}).get("resourceVersion", "")
+                listed[key] = rv
+                if key not in self._known:
+                    self.event_queue.put(type="ADDED", object=obj)
+                elif self._known[key] != rv:
+                    self.event_queue.put(type="MODIFIED", object=obj)
+            resource_version = res.get("metadata", {}).get("resourceVersion", "")
+            _continue = res.get("metadata", {}).get("continue")
+            if not _continue:
+                break
+
+        for key in self._known.keys() - listed.keys():
+            namespace, name = key.split("/", 1)
+            self.event_queue.put(
+                type="DELETED",
+                object={"metadata": {"namespace": namespace, "name": name}},
+            )
+
+        logging.info(
+            f"Listed {len(listed)} checks at resourceVersion {resource_version}"
+        )
+        self._known = listed
+        return resource_version
+
+    def handle_event(self, crd_event):
+        """
+        track the event's resourceVersion and add it to the event queue.
+        Returns the resourceVersion of the event.
+        """
+        obj = crd_event.get("object", {})
+        resource_version = obj.get("metadata", {}).get("resourceVersion", "")
+        if crd_event.get("type") == "BOOKMARK":
+            # bookmarks only move our resourceVersion forward
+            return resource_version
+
+        key = self.key(obj)
+        if crd_event.get("type") == "DELETED":
+            self._known.pop(key, None)
+        else:
+            self._known[key] = resource_version
+
+        self.event_queue.put(**crd_event)
+        return resource_version
+
     def run(self):
         resource_version = ""
+        shard_generation = None
+        backoff = 1
         logging.info("Waiting for events...")
         while not self.shutdown():
-            stream = self.kube.Watch().stream(
-                self.kube.CustomObjectsApi.list_cluster_custom_object,
-                self.kube.domain,
-                self.kube.version,
-                self.kube.plural,
-                resource_version=resource_version,
-                timeout_seconds=self._stream_watch_timeout,
-            )
-            for crd_event in stream:
-                # add events to the event queue
-                try:
-                    resource_version = (
-                        crd_event.get("object", {})
-                        .get("metadata", {})
-                        .get("resourceVersion", "")
-                    )
-                    self.event_queue.put(**crd_event)
-                except Exception as e:
-                    logging.error(e)
-                    logging.error(sys.exc_info()[0])
+            watch_args = {}
+            timeout = self._stream_watch_timeout
+            if self.shard:
+                timeout = min(timeout, self._shard_watch_timeout)
+                if self.shard.generation != shard_generation:
+                    # our buckets changed; re-list so we pick up the checks
+                    # now in our shard and drop the ones that left
+                    shard_generation = self.shard.generation
+                    resource_version = ""
+                if not self.shard.label_selector:
+                    sleep(1)
+                    continue
+                watch_args["label_selector"] = self.shard.label_selector
+
+            try:
+                if not resource_version:
+                    resource_version = self.relist(**watch_args)
+
+                w = self.kube.Watch()
+                stream = w.stream(
+                    self.kube.CustomObjectsApi.list_cluster_custom_object,
+                    self.kube.domain,
+                    self.kube.version,
+                    self.kube.plural,
+                    resource_version=resource_version,
+                    timeout_seconds=timeout,
+                    allow_watch_bookmarks=True,
+                    **watch_args,
+                )
+                for crd_event in stream:
+                    if (
+                        crd_event.get("type") == "ERROR"
+                        and crd_event.get("object", {}).get("code") == 410
+                    ):
+                        # older clients hand us the 410 as an event
+                        logging.info("Our resourceVersion expired, re-listing checks")
+                        resource_version = ""
+                        break
+                    try:
+                        resource_version = (
+                            self.handle_event(crd_event) or resource_version
+                        )
+                    except Exception as e:
+                        logging.error(e)
+                        logging.error(sys.exc_info()[0])
+                    if self.shutdown():
+                        break
+                    if self.shard and self.shard.generation != shard_generation:
+                        # our buckets changed; stop watching the old ones
+                        # and re-list
+                        w.stop()
+                        break
+                backoff = 1
+            except kubeclient.ApiException as e:
+                if e.status == 410:
+                    logging.info("Our resourceVersion expired, re-listing checks")
+                    resource_version = ""
+                    continue
+                logging.error(f"Check watch failed, retrying in {backoff}s: {e}")
+                instrument.kube_error(self.metrics_queue, "watch", "checks")
+                sleep(backoff)
+                backoff = min(backoff * 2, self._retry_backoff_max)
+            except Exception as e:
+                logging.error(f"Check watch failed, retrying in {backoff}s: {e}")
+                logging.error(sys.exc_info()[0])
+                instrument.kube_error(self.metrics_queue, "watch", "checks")
+                sleep(backoff)
+                backoff = min(backoff * 2, self._retry_backoff_max)
         logging.info("Event Handler Shutdown")
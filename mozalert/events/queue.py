@@ -1,35 +1,95 @@
 import logging
-import queue
+import threading
+from collections import deque
+from itertools import count
+from time import monotonic
 from types import SimpleNamespace
 from mozalert.events.event import Event
 import sys
 
 
 class EventQueue:
+    """
+    a keyed work queue in the style of controller-runtime's workqueue.
+
+    Events are keyed by namespace/name. While an event for a check is
+    waiting to be handled, a newer event for the same check replaces it,
+    so a burst of MODIFIED events is handled once with the latest object.
+    A DELETED supersedes everything queued before it; anything arriving
+    after a pending DELETED is kept behind it so a delete followed by a
+    re-create is still seen as both.
+
+    ERROR and unexpected events are never coalesced.
+    """
+
     def __init__(self):
-        self.q = queue.Queue()
+        self._cond = threading.Condition()
+        self._order = deque()
+        self._pending = {}
+        self._unique = count()
+
+        self.stats = SimpleNamespace(put=0, coalesced=0)
+
+    @property
+    def depth(self):
+        """
+        the number of events waiting to be handled
+        """
+        with self._cond:
+            return sum([len(p) for p in self._pending.values()])
+
+    @property
+    def coalesced(self):
+        """
+        the number of events which were dropped in favor of a newer one
+        """
+        return self.stats.coalesced
 
     def put(self, **kwargs):
         try:
             evt = Event(**kwargs)
-            self.q.put(evt)
         except Exception as e:
             logging.error(e)
             logging.error(sys.exc_info()[0])
-
-    def get(self, timeout=3):
-        try:
-            evt = self.q.get(timeout=timeout)
-        except queue.Empty:
             return
 
-        self.q.task_done()
-        return evt
+        if evt.ERROR or evt.BADEVENT:
+            key = f"{evt.type.name}#{next(self._unique)}"
+        else:
+            key = str(evt)
 
-    @property
-    def q(self):
-        return self._q
+        with self._cond:
+            self.stats.put += 1
+            pending = self._pending.get(key)
+            if not pending:
+                self._pending[key] = [evt]
+                self._order.append(key)
+                self._cond.notify()
+            elif evt.DELETED:
+                self.stats.coalesced += len(pending)
+                self._pending[key] = [evt]
+            elif pending[0].DELETED:
+                self.stats.coalesced += len(pending) - 1
+                self._pending[key] = [pending[0], evt]
+            else:
+                self.stats.coalesced += 1
+                self._pending[key] = [evt]
+
+    def get(self, timeout=3):
+        deadline = monotonic() + timeout
+        with self._cond:
+            while not self._order:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return
+                self._cond.wait(remaining)
 
-    @q.setter
-    def q(self, q):
-        self._q = q
+            key = self._order.popleft()
+            pending = self._pending[key]
+            evt = pending.pop(0)
+            if pending:
+                # the event queued behind a DELETED goes next
+                self._order.appendleft(key)
+            else:
+                del self._pending[key]
+            return evt
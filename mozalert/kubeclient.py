@@ -4,6 +4,19 @@ from kubernetes import client, config, watch
 
 from kubernetes.client.rest import ApiException
 
+try:
+    # the async client is optional; without it checks use the threaded job path
+    from kubernetes_asyncio import client as async_client, config as async_config
+    from kubernetes_asyncio.client.rest import ApiException as AsyncApiException
+except ImportError:
+    async_client = None
+    async_config = None
+    AsyncApiException = ApiException
+
+# every job mozalert creates carries this label so we can watch just our own
+JOB_LABELS = {"app.kubernetes.io/managed-by": "mozalert"}
+JOB_LABEL_SELECTOR = ",".join([f"{k}={v}" for k, v in JOB_LABELS.items()])
+
 
 class KubeClient:
     """
@@ -26,6 +39,7 @@ class KubeClient:
 
         self._BatchV1Api = client.BatchV1Api()
         self._CoreV1Api = client.CoreV1Api()
+        self._CoordinationV1Api = client.CoordinationV1Api()
         self._CustomObjectsApi = client.CustomObjectsApi(self._api_client)
 
         self._domain = domain
@@ -40,6 +54,10 @@ class KubeClient:
     def CoreV1Api(self):
         return self._CoreV1Api
 
+    @property
+    def CoordinationV1Api(self):
+        return self._CoordinationV1Api
+
     @property
     def CustomObjectsApi(self):
         return self._CustomObjectsApi
@@ -72,7 +90,7 @@ class KubeClient:
         job = client.V1Job(
             api_version="batch/v1",
             kind="Job",
-            metadata=client.V1ObjectMeta(name=name),
+            metadata=client.V1ObjectMeta(name=name, labels={"app": name, **JOB_LABELS}),
             spec=job_spec,
         )
         return job
@@ -80,3 +98,60 @@ class KubeClient:
     @staticmethod
     def Watch(*args, **kwargs):
         return watch.Watch(*args, **kwargs)
+
+
+class AsyncKubeClient:
+    """
+    the asyncio counterpart of KubeClient, used by the AsyncJobEngine.
+    It has to be loaded from inside the event loop which will use it.
+    """
+
+    def __init__(self, domain="", version="", plural=""):
+        if not async_client:
+            raise ImportError("kubernetes_asyncio is required for AsyncKubeClient")
+
+        self._domain = domain
+        self._version = version
+        self._plural = plural
+
+        self._api_client = None
+
+    async def load(self):
+        if "KUBERNETES_PORT" in os.environ:
+            async_config.load_incluster_config()
+        else:
+            await async_config.load_kube_config()
+
+        self._api_client = async_client.ApiClient()
+
+        self._BatchV1Api = async_client.BatchV1Api(self._api_client)
+        self._CoreV1Api = async_client.CoreV1Api(self._api_client)
+        self._CustomObjectsApi = async_client.CustomObjectsApi(self._api_client)
+
+    async def close(self):
+        if self._api_client:
+            await self._api_client.close()
+
+    @property
+    def BatchV1Api(self):
+        return self._BatchV1Api
+
+    @property
+    def CoreV1Api(self):
+        return self._CoreV1Api
+
+    @property
+    def CustomObjectsApi(self):
+        return self._CustomObjectsApi
+
+    @property
+    def domain(self):
+        return self._domain
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def plural(self):
+        return self._plural
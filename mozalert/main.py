@@ -14,6 +14,48 @@ logging.basicConfig(
 domain = os.environ.get("DOMAIN", "crd.k8s.afrank.local")
 version = os.environ.get("VERSION", "v1")
 plural = os.environ.get("PLURAL", "checks")
+check_workers = int(os.environ.get("CHECK_WORKERS", 50))
+async_jobs = os.environ.get("ASYNC_JOBS", "false").lower() == "true"
+job_watch = os.environ.get("JOB_WATCH", "true").lower() == "true"
+status_write_window = float(os.environ.get("STATUS_WRITE_WINDOW", 2))
+startup_window = float(os.environ.get("STARTUP_WINDOW", 60))
+job_create_rate = float(os.environ.get("JOB_CREATE_RATE", 10))
+sharding = os.environ.get("SHARDING", None)
+shard_count = int(os.environ.get("SHARD_COUNT", 1))
+shard_namespace = os.environ.get("POD_NAMESPACE", "default")
+log_max_bytes = int(os.environ.get("LOG_MAX_BYTES", 32768))
+history_depth = int(os.environ.get("HISTORY_DEPTH", 1000))
+log_store_path = os.environ.get("LOG_STORE_PATH", None)
+state_path = os.environ.get("STATE_PATH", None)
+state_retention = float(os.environ.get("STATE_RETENTION", 7 * 86400))
+metrics_flush_interval = float(os.environ.get("METRICS_FLUSH_INTERVAL", 15))
+metrics_batch_size = int(os.environ.get("METRICS_BATCH_SIZE", 500))
+metrics_port = int(os.environ.get("METRICS_PORT", 0))
+debug_port = int(os.environ.get("DEBUG_PORT", 0))
+escalation_workers = int(os.environ.get("ESCALATION_WORKERS", 10))
+# per-type limits on concurrent escalations, e.g. "slack=2,email=5"
+escalation_type_limits = dict(
+    limit.split("=", 1)
+    for limit in os.environ.get("ESCALATION_TYPE_LIMITS", "").split(",")
+    if "=" in limit
+)
+escalation_max_attempts = int(os.environ.get("ESCALATION_MAX_ATTEMPTS", 5))
+escalation_dead_letter_path = os.environ.get("ESCALATION_DEAD_LETTER_PATH", None)
+escalation_connect_timeout = float(os.environ.get("ESCALATION_CONNECT_TIMEOUT", 5))
+escalation_read_timeout = float(os.environ.get("ESCALATION_READ_TIMEOUT", 10))
+escalation_pool_size = int(os.environ.get("ESCALATION_POOL_SIZE", 10))
+# rate limits are given in escalations per minute
+escalation_destination_rate = (
+    float(os.environ.get("ESCALATION_DESTINATION_PER_MINUTE", 0)) / 60
+)
+escalation_destination_burst = float(os.environ.get("ESCALATION_DESTINATION_BURST", 1))
+escalation_global_rate = float(os.environ.get("ESCALATION_GLOBAL_PER_MINUTE", 0)) / 60
+escalation_global_burst = float(os.environ.get("ESCALATION_GLOBAL_BURST", 1))
+escalation_overflow = os.environ.get("ESCALATION_OVERFLOW", "queue")
+escalation_max_queued = int(os.environ.get("ESCALATION_MAX_QUEUED", 20))
+escalation_drain_timeout = float(os.environ.get("ESCALATION_DRAIN_TIMEOUT", 10))
+digest_window = float(os.environ.get("DIGEST_WINDOW", 0))
+digest_max_checks = int(os.environ.get("DIGEST_MAX_CHECKS", 50))
 
 
 class MainThread:
@@ -27,6 +69,40 @@ class MainThread:
             domain=domain,
             version=version,
             plural=plural,
+            check_workers=check_workers,
+            async_jobs=async_jobs,
+            job_watch=job_watch,
+            status_write_window=status_write_window,
+            startup_window=startup_window,
+            job_create_rate=job_create_rate,
+            sharding=sharding,
+            shard_count=shard_count,
+            shard_namespace=shard_namespace,
+            log_max_bytes=log_max_bytes,
+            history_depth=history_depth,
+            log_store_path=log_store_path,
+            state_path=state_path,
+            state_retention=state_retention,
+            metrics_flush_interval=metrics_flush_interval,
+            metrics_batch_size=metrics_batch_size,
+            metrics_port=metrics_port,
+            debug_port=debug_port,
+            escalation_workers=escalation_workers,
+            escalation_type_limits=escalation_type_limits,
+            escalation_max_attempts=escalation_max_attempts,
+            escalation_dead_letter_path=escalation_dead_letter_path,
+            escalation_connect_timeout=escalation_connect_timeout,
+            escalation_read_timeout=escalation_read_timeout,
+            escalation_pool_size=escalation_pool_size,
+            escalation_destination_rate=escalation_destination_rate,
+            escalation_destination_burst=escalation_destination_burst,
+            escalation_global_rate=escalation_global_rate,
+            escalation_global_burst=escalation_global_burst,
+            escalation_overflow=escalation_overflow,
+            escalation_max_queued=escalation_max_queued,
+            escalation_drain_timeout=escalation_drain_timeout,
+            digest_window=digest_window,
+            digest_max_checks=digest_max_checks,
             shutdown=lambda: self.shutdown,
         )
         self.controller.start()
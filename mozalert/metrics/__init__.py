@@ -1 +1,9 @@
-from mozalert.metrics import thread, queue, mixin, config
+from mozalert.metrics import (
+    thread,
+    queue,
+    telemetry,
+    exporter,
+    instrument,
+    mixin,
+    config,
+)
@@ -1,23 +1,50 @@
+# type is one of Counter, Gauge, Histogram or Summary. A Gauge is set to
+# the latest value; a Histogram or Summary has every value observed into
+# it, so percentiles can be worked out across runs. buckets are the upper
+# bounds of a Histogram's buckets.
+RUNTIME_BUCKETS = [1, 2, 5, 10, 15, 30, 60, 120, 300, 600]
+# telemetry times are reported in ms
+TELEMETRY_BUCKETS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+# the labels a check may add to its telemetry; a series with any other label
+# is skipped, and a series without one has it empty. Keep these few, every
+# value makes another series.
+TELEMETRY_LABELS = ["region", "target"]
+DRIFT_BUCKETS = [0.1, 0.5, 1, 2, 5, 10, 30, 60, 300]
+API_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+ESCALATION_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900]
+
+# the mozalert_controller_*, mozalert_kube_* and mozalert_escalation_* metrics
+# describe the controller itself; their name and namespace are those of the controller replica.
+
 MetricsConfig = {
     "mozalert_check_get_time": {
-        "type": "Gauge",
+        "type": "Histogram",
         "labels": ["status", "escalated"],
+        "telemetry_labels": TELEMETRY_LABELS,
+        "buckets": TELEMETRY_BUCKETS,
     },
     "mozalert_check_node_time": {
-        "type": "Gauge",
+        "type": "Histogram",
         "labels": ["status", "escalated"],
+        "telemetry_labels": TELEMETRY_LABELS,
+        "buckets": TELEMETRY_BUCKETS,
     },
     "mozalert_check_runtime": {
-        "type": "Gauge",
+        "type": "Histogram",
         "labels": ["status", "escalated"],
+        "buckets": RUNTIME_BUCKETS,
     },
     "mozalert_check_total_time": {
-        "type": "Gauge",
+        "type": "Histogram",
         "labels": ["status", "escalated"],
+        "telemetry_labels": TELEMETRY_LABELS,
+        "buckets": TELEMETRY_BUCKETS,
     },
     "mozalert_check_latency": {
-        "type": "Gauge",
+        "type": "Histogram",
         "labels": ["status", "escalated"],
+        "telemetry_labels": TELEMETRY_LABELS,
+        "buckets": TELEMETRY_BUCKETS,
     },
     "mozalert_check_escalations": {
         "type": "Gauge",
@@ -27,4 +54,51 @@ MetricsConfig = {
         "type": "Gauge",
         "labels": [],
     },
+    "mozalert_check_schedule_drift": {
+        "type": "Histogram",
+        "labels": [],
+        "buckets": DRIFT_BUCKETS,
+    },
+    "mozalert_controller_queue_depth": {
+        "type": "Gauge",
+        "labels": ["queue"],
+    },
+    "mozalert_controller_threads": {
+        "type": "Gauge",
+        "labels": [],
+    },
+    "mozalert_controller_jobs_in_flight": {
+        "type": "Gauge",
+        "labels": [],
+    },
+    "mozalert_kube_api_latency": {
+        "type": "Histogram",
+        "labels": ["verb", "resource"],
+        "buckets": API_BUCKETS,
+    },
+    "mozalert_kube_api_errors": {
+        "type": "Counter",
+        "labels": ["verb", "resource"],
+    },
+    "mozalert_escalation_latency": {
+        "type": "Histogram",
+        "labels": ["type", "outcome"],
+        "buckets": ESCALATION_BUCKETS,
+    },
+    "mozalert_escalation_failures": {
+        "type": "Counter",
+        "labels": ["type"],
+    },
+    "mozalert_escalation_dead_letters": {
+        "type": "Counter",
+        "labels": ["type"],
+    },
+    "mozalert_escalation_throttled": {
+        "type": "Counter",
+        "labels": ["type"],
+    },
+    "mozalert_escalation_dropped": {
+        "type": "Counter",
+        "labels": ["type"],
+    },
 }
@@ -0,0 +1,55 @@
+import logging
+
+from prometheus_client import start_http_server
+
+
+class MetricsExporter:
+    """
+    the MetricsExporter serves /metrics for prometheus to scrape.
+
+    It is started once by the controller and serves whichever registry the
+    metrics thread is currently recording into, so the metrics thread can be
+    restarted without the port changing hands. Scrapes are answered on the
+    exporter's own threads and only take the per-metric locks long enough to
+    read the values, so they never hold up the metrics consumer or the checks.
+    """
+
+    def __init__(self, port, addr="0.0.0.0"):
+        self._port = int(port)
+        self._addr = addr
+        self._registry = None
+        self._server = None
+
+    @property
+    def port(self):
+        return self._port
+
+    def serve(self, registry):
+        """
+        start serving registry in place of whatever we were serving before
+        """
+        self._registry = registry
+
+    def collect(self):
+        registry = self._registry
+        if not registry:
+            return
+        yield from registry.collect()
+
+    def restricted_registry(self, names):
+        return self._registry.restricted_registry(names)
+
+    def start(self):
+        server = start_http_server(self.port, self._addr, registry=self)
+        # prometheus_client >= 0.17 hands back the server and its thread so
+        # it can be stopped; older versions return nothing, and the server
+        # just goes away with the process
+        if isinstance(server, tuple):
+            self._server = server[0]
+        logging.info(f"Serving metrics on {self._addr}:{self.port}/metrics")
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
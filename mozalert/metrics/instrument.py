@@ -0,0 +1,40 @@
+from time import monotonic
+from contextlib import contextmanager
+
+
+def kube_error(metrics_queue, verb, resource):
+    """
+    count a failed kube API call
+    """
+    if metrics_queue:
+        metrics_queue.put_controller(
+            "mozalert_kube_api_errors", labels={"verb": verb, "resource": resource}
+        )
+
+
+@contextmanager
+def kube_call(metrics_queue, verb, resource, ok_reasons=()):
+    """
+    time a call to the kube API and count it as an error if it raises,
+    unless it's an ApiException whose reason is one we expect:
+
+        with kube_call(metrics_queue, "create", "jobs", ok_reasons=("Conflict",)):
+            kube.BatchV1Api.create_namespaced_job(...)
+
+    this works around an await just the same
+    """
+    if not metrics_queue:
+        yield
+        return
+    labels = {"verb": verb, "resource": resource}
+    start = monotonic()
+    try:
+        yield
+    except BaseException as e:
+        if getattr(e, "reason", None) not in ok_reasons:
+            kube_error(metrics_queue, verb, resource)
+        raise
+    finally:
+        metrics_queue.put_controller(
+            "mozalert_kube_api_latency", labels=labels, value=monotonic() - start
+        )
@@ -1,5 +1,7 @@
 import logging
-import re
+
+from mozalert.metrics import telemetry, instrument
+from mozalert.metrics.config import MetricsConfig
 
 
 class MetricsMixin:
@@ -27,11 +29,44 @@ class MetricsMixin:
             "mozalert_check_failures": int(self.status.CRITICAL),
             "mozalert_check_escalations": int(self.escalated),
         }
+        if getattr(self, "_schedule_drift", None) is not None:
+            v["mozalert_check_schedule_drift"] = self._schedule_drift
         for t in self.status.telemetry.keys():
-            v[f"mozalert_check_{t}"] = float(self.status.telemetry[t])
+            key, labels = telemetry.split_series(t)
+            if not labels:
+                v[f"mozalert_check_{key}"] = float(self.status.telemetry[t])
+
+        return v
 
+    @property
+    def labeled_metric_values(self):
+        """
+        telemetry reported with labels, as a list of (key, labels, value).
+        A series with a label not declared for its metric is skipped rather
+        than merged into the unlabeled one.
+        """
+        v = []
+        for t in self.status.telemetry.keys():
+            key, labels = telemetry.split_series(t)
+            if not labels:
+                continue
+            key = f"mozalert_check_{key}"
+            allowed = MetricsConfig.get(key, {}).get("telemetry_labels", [])
+            unknown = [label for label in labels if label not in allowed]
+            if unknown:
+                logging.debug(f"Skipping {t}: {key} has no label {', '.join(unknown)}")
+                continue
+            v += [(key, labels, float(self.status.telemetry[t]))]
         return v
 
+    def kube_call(self, verb, resource, ok_reasons=()):
+        """
+        time a kube API call into the controller's metrics
+        """
+        return instrument.kube_call(
+            self.metrics_queue, verb, resource, ok_reasons=ok_reasons
+        )
+
     @staticmethod
     def extract_telemetry_from_logs(logs):
         """
@@ -39,17 +74,4 @@ class MetricsMixin:
         this allows one to pass telemetry back to the controller
         without needing to implement additional clients.
         """
-        _logs = ""
-        _telemetry = {}
-        for line in logs.split("\n"):
-            pattern = re.compile(r"TELEMETRY:\s*(?P<key>\w+)\s*(?P<val>\d+)[^0-9]?")
-            match = pattern.match(line)
-            if not match:
-                _logs += line + "\n"
-                continue
-            m = match.groupdict()
-            key = m.get("key")
-            val = m.get("val")
-            _telemetry[key] = val
-
-        return _logs, _telemetry
+        return telemetry.parse_logs(logs)
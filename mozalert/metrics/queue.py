@@ -1,3 +1,4 @@
+import socket
 import logging
 import queue
 from types import SimpleNamespace
@@ -8,9 +9,18 @@ QueueItem = namedtuple("QueueItem", ["key", "name", "namespace", "labels", "valu
 
 
 class MetricsQueue:
-    def __init__(self):
+    def __init__(self, name=None, namespace=None):
         self.q = queue.Queue()
 
+        # metrics about the controller itself are labeled with the
+        # name and namespace of this replica
+        self.name = name or socket.gethostname()
+        self.namespace = namespace or "default"
+
+    @property
+    def depth(self):
+        return self.q.qsize()
+
     def put(self, key, name, namespace, **kwargs):
         _labels = kwargs.get("labels", {})
         value = kwargs.get("value", None)
@@ -23,14 +33,24 @@ class MetricsQueue:
             "namespace": namespace,
         }
 
+        config = MetricsConfig.get(key)
+        allowed = config.get("labels") + config.get("telemetry_labels", [])
         for label in _labels.keys():
-            if label in MetricsConfig.get(key).get("labels"):
+            if label in allowed:
                 labels[label] = _labels[label]
             else:
                 logging.debug(f"Discarding unused label {label} from {key}")
+        for label in config.get("telemetry_labels", []):
+            labels.setdefault(label, "")
 
         self.q.put(QueueItem(key, name, namespace, labels, value))
 
+    def put_controller(self, key, **kwargs):
+        """
+        put a metric about the controller itself
+        """
+        self.put(key, self.name, self.namespace, **kwargs)
+
     def put_many(self, name, namespace, labels, metrics={}):
         """
         metrics are in the form { "key": "val" }
@@ -0,0 +1,126 @@
+import re
+import json
+
+# checks report telemetry by printing lines of the form:
+#
+#   TELEMETRY: total_time 1.25
+#   TELEMETRY: latency{region="us-west1"} 0.031
+#
+# or, for checks which already log json, one record per line:
+#
+#   {"telemetry": "latency", "value": 0.031, "labels": {"region": "us-west1"}}
+#   {"telemetry": {"total_time": 1.25, "get_time": 0.4}}
+#
+TELEMETRY_PATTERN = re.compile(
+    r"TELEMETRY:\s*(?P<key>\w+)\s*(?:\{(?P<labels>[^}]*)\})?\s*"
+    r"(?P<val>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+)
+LABEL_PATTERN = re.compile(
+    r'\s*(?P<name>\w+)\s*=\s*(?:"(?P<quoted>[^"]*)"|(?P<bare>[^,]*))'
+)
+SERIES_PATTERN = re.compile(r"(?P<key>\w+)(?:\{(?P<labels>.*)\})?$")
+
+# finds the lines which might be telemetry so the rest of the log is
+# skipped over without ever being split into lines
+CANDIDATE_PATTERN = re.compile(r'^(?:TELEMETRY:|\{.*"telemetry").*\n?', re.M)
+
+
+def parse_labels(labels):
+    """
+    parse label=value pairs (values optionally quoted) into a dict
+    """
+    if not labels:
+        return {}
+    return {
+        m.group("name"): (
+            m.group("quoted") if m.group("quoted") is not None else m.group("bare")
+        ).strip()
+        for m in LABEL_PATTERN.finditer(labels)
+    }
+
+
+def series(key, labels=None):
+    """
+    the name we store a telemetry value under in the check status,
+    e.g. latency{region="us-west1"}
+    """
+    if not labels:
+        return key
+    labels = ",".join([f'{k}="{labels[k]}"' for k in sorted(labels)])
+    return f"{key}{{{labels}}}"
+
+
+def split_series(name):
+    """
+    the inverse of series: returns the key and a dict of labels
+    """
+    match = SERIES_PATTERN.match(name)
+    if not match:
+        return name, {}
+    return match.group("key"), parse_labels(match.group("labels"))
+
+
+def parse_json(line):
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return
+    if not isinstance(record, dict):
+        return
+    telemetry = record.get("telemetry")
+    labels = record.get("labels") or {}
+    try:
+        if isinstance(telemetry, dict):
+            return [(series(k, labels), float(v)) for k, v in telemetry.items()]
+        if isinstance(telemetry, str) and "value" in record:
+            return [(series(telemetry, labels), float(record["value"]))]
+    except (TypeError, ValueError):
+        return
+
+
+def parse_line(line):
+    """
+    return a list of (series, value) for a telemetry line, or None if the
+    line isn't telemetry
+    """
+    if line.startswith("TELEMETRY:"):
+        match = TELEMETRY_PATTERN.match(line)
+        if not match:
+            return
+        key = match.group("key")
+        labels = parse_labels(match.group("labels"))
+        return [(series(key, labels), float(match.group("val")))]
+    if line.startswith("{") and '"telemetry"' in line:
+        return parse_json(line)
+
+
+def extract(text):
+    """
+    remove the telemetry lines from a block of log in a single pass. Returns
+    the rest of the log, line endings and all, and a dict of the telemetry.
+    """
+    kept = []
+    found = {}
+    last = 0
+    for match in CANDIDATE_PATTERN.finditer(text):
+        parsed = parse_line(match.group().rstrip("\n"))
+        if not parsed:
+            continue
+        found.update(parsed)
+        kept += [text[last : match.start()]]
+        last = match.end()
+    if not found:
+        return text, found
+    kept += [text[last:]]
+    return "".join(kept), found
+
+
+def parse_logs(logs):
+    """
+    split the telemetry out of a whole log. Returns the log with the
+    telemetry lines removed and a dict of the telemetry.
+    """
+    logs, found = extract(logs)
+    if logs and not logs.endswith("\n"):
+        logs += "\n"
+    return logs, found
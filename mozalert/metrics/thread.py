@@ -2,74 +2,202 @@ import os
 import logging
 
 import threading
-import queue
-
-from prometheus_client import CollectorRegistry, Gauge, push_to_gateway, Counter
+from time import monotonic
+from types import SimpleNamespace
+
+from prometheus_client import (
+    CollectorRegistry,
+    Gauge,
+    push_to_gateway,
+    Counter,
+    Histogram,
+    Summary,
+)
 
 from mozalert.metrics.config import MetricsConfig
 
-SupportedMetricTypes = ["Counter", "Gauge"]
+SupportedMetricTypes = {
+    "Counter": Counter,
+    "Gauge": Gauge,
+    "Histogram": Histogram,
+    "Summary": Summary,
+}
 
 
 class MetricsThread(threading.Thread):
-    def __init__(self, q, shutdown=lambda: False, prometheus_gateway=None):
+    """
+    the MetricsThread consumes the metrics queue into a prometheus registry.
+
+    If there is a push gateway the registry is pushed to it in batches: at
+    most once every flush_interval seconds, or sooner once batch_size data
+    points are waiting. A failed push is retried with exponential backoff;
+    nothing is lost in the meantime since the registry keeps the latest
+    values.
+
+    If there is a MetricsExporter the registry is also served for scraping,
+    in which case the push gateway is optional.
+    """
+
+    def __init__(
+        self,
+        q,
+        shutdown=lambda: False,
+        prometheus_gateway=None,
+        flush_interval=15,
+        batch_size=500,
+        retry_backoff_max=60,
+        exporter=None,
+    ):
         super().__init__()
         # metrics_queue object
         self.q = q
         self.prometheus_gateway = prometheus_gateway
         self.shutdown = shutdown
+        self._flush_interval = float(flush_interval)
+        self._batch_size = int(batch_size)
+        self._retry_backoff_max = float(retry_backoff_max)
+        self.exporter = exporter
 
         if not self.prometheus_gateway:
             self.prometheus_gateway = os.environ.get("PROMETHEUS_GATEWAY", None)
 
+        self.registry = CollectorRegistry()
+        self.metrics = {}
+        self.pending = 0
+        self._backoff = 0
+        self._next_push = monotonic() + self._flush_interval
+
+        self.stats = SimpleNamespace(recorded=0, pushes=0, failures=0)
+
     def terminate(self):
         return self.join()
 
-    def run(self):
+    def setup_registry(self):
         """
-        Start the metrics queue subscriber which sends metrics to prometheus
+        read the metrics config into a dictionary and set up the registry
+        for recording metrics from the queue. When metrics come in from
+        the queue they are added to these metrics, and the registry is
+        pushed to prometheus every flush.
         """
-
-        registry = CollectorRegistry()
-        metrics = {}
-        # read the metrics config into a dictionary and set up the registry
-        # for recording metrics from the queue. When metrics come in from
-        # the queue they are added to these metrics and submitted to
-        # prometheus each time a new data point is added.
         for m in MetricsConfig.keys():
             c = MetricsConfig[m]
             # add name/namespace to any user-defined labels
-            l = tuple(set(c.get("labels", []) + ["name", "namespace"]))
+            l = tuple(
+                set(
+                    c.get("labels", [])
+                    + c.get("telemetry_labels", [])
+                    + ["name", "namespace"]
+                )
+            )
             t = c.get("type", "")
             if t not in SupportedMetricTypes:
                 logging.error(f"Discarding unsupported metric type {t}")
-            func = eval(t)
-            metrics[m] = func(m, m, l, registry=registry)
-
-        while not self.shutdown():
-
-            metric = self.q.get()
-            if not metric:
                 continue
+            args = {}
+            if t == "Histogram" and c.get("buckets"):
+                args["buckets"] = c.get("buckets")
+            func = SupportedMetricTypes[t]
+            self.metrics[m] = func(m, m, l, registry=self.registry, **args)
+
+        # how the pushes themselves are doing
+        self.push_seconds = Gauge(
+            "mozalert_metrics_push_seconds",
+            "time taken by the last push to the push gateway",
+            registry=self.registry,
+        )
+        self.push_batch_size = Gauge(
+            "mozalert_metrics_push_batch_size",
+            "data points recorded since the previous push",
+            registry=self.registry,
+        )
+        self.push_failures = Counter(
+            "mozalert_metrics_push_failures",
+            "pushes to the push gateway which failed",
+            registry=self.registry,
+        )
+
+        if self.exporter:
+            self.exporter.serve(self.registry)
+
+    def record(self, metric):
+        prom = self.metrics[metric.key]
+
+        logging.debug(
+            f"Recording metric for {metric.key} value {metric.value} labels {metric.labels}"
+        )
+
+        if metric.value is not None and type(prom) == Gauge:
+            prom.labels(**metric.labels).set(metric.value)
+        elif metric.value is not None and type(prom) in (Histogram, Summary):
+            prom.labels(**metric.labels).observe(metric.value)
+        else:
+            prom.labels(**metric.labels).inc()
+
+        self.pending += 1
+        self.stats.recorded += 1
+
+    @property
+    def push_due(self):
+        if not self.pending:
+            return False
+        if monotonic() >= self._next_push:
+            return True
+        # a full batch goes out early, unless we're backing off
+        return self.pending >= self._batch_size and not self._backoff
+
+    def push(self):
+        """
+        push the registry to the gateway; returns True if it was sent
+        """
+        if not self.prometheus_gateway:
+            self.pending = 0
+            self._next_push = monotonic() + self._flush_interval
+            return True
+
+        logging.debug(f"pushing {self.pending} metrics to prometheus")
+        self.push_batch_size.set(self.pending)
+        start = monotonic()
+        try:
+            push_to_gateway(
+                self.prometheus_gateway,
+                job="mozalert.metrics",
+                registry=self.registry,
+            )
+        except Exception as e:
+            self.push_failures.inc()
+            self.stats.failures += 1
+            self._backoff = min((self._backoff * 2) or 1, self._retry_backoff_max)
+            self._next_push = monotonic() + self._backoff
+            logging.info(f"Metrics push failed, retrying in {self._backoff}s: {e}")
+            return False
+
+        self.push_seconds.set(monotonic() - start)
+        self.stats.pushes += 1
+        self.pending = 0
+        self._backoff = 0
+        self._next_push = monotonic() + self._flush_interval
+        return True
 
-            try:
-                prom = metrics[metric.key]
-
-                logging.debug(
-                    f"Recording metric for {metric.key} value {metric.value} labels {metric.labels}"
-                )
+    def run(self):
+        """
+        Start the metrics queue subscriber which sends metrics to prometheus
+        """
+        self.setup_registry()
+        if not self.prometheus_gateway and not self.exporter:
+            logging.warning("No push gateway or metrics port, metrics won't be sent")
 
-                if metric.value is not None and type(prom) == Gauge:
-                    prom.labels(**metric.labels).set(metric.value)
-                else:
-                    prom.labels(**metric.labels).inc()
-
-                if self.prometheus_gateway:
-                    logging.debug("pushing metric to prometheus")
-                    push_to_gateway(
-                        self.prometheus_gateway,
-                        job="mozalert.metrics",
-                        registry=registry,
-                    )
-            except Exception as e:
-                logging.info(e)
+        while not self.shutdown():
+            metric = self.q.get(timeout=1)
+            if metric:
+                try:
+                    self.record(metric)
+                except Exception as e:
+                    logging.info(e)
+
+            if self.push_due:
+                self.push()
+
+        # send whatever is left before we go
+        if self.pending:
+            self.push()
+        logging.info("Metrics Thread Shutdown")
@@ -0,0 +1,376 @@
+import sys
+import bisect
+import socket
+import hashlib
+import logging
+import threading
+import datetime
+from time import sleep, monotonic
+
+from mozalert import kubeclient
+from mozalert.utils.dt import now
+
+# every check is put in one of a fixed number of buckets by hashing its
+# namespace/name, and the bucket is written to the check as a label so each
+# replica can ask the apiserver for just the buckets it owns.
+SHARD_LABEL = "mozalert.io/shard"
+LEASE_LABEL = "mozalert.io/shard-member"
+DEFAULT_BUCKETS = 256
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+def bucket(namespace, name, buckets=DEFAULT_BUCKETS):
+    return _hash(f"{namespace}/{name}") % buckets
+
+
+class HashRing:
+    """
+    a consistent hash ring with virtual nodes. When a member joins or leaves
+    only the keys next to its points on the ring move.
+    """
+
+    def __init__(self, members=(), vnodes=100):
+        ring = sorted(
+            (_hash(f"{member}#{i}"), member)
+            for member in members
+            for i in range(vnodes)
+        )
+        self._points = [p for p, _ in ring]
+        self._owners = [m for _, m in ring]
+        self._members = sorted(set(members))
+
+    @property
+    def members(self):
+        return self._members
+
+    def owner(self, key):
+        if not self._points:
+            return
+        i = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[i]
+
+
+class ShardManager(threading.Thread):
+    """
+    the ShardManager decides which checks this replica is responsible for.
+
+    Buckets are spread over the live replicas with a HashRing. Membership
+    is either:
+
+    ordinal: a fixed shard_count, with our ordinal taken from the StatefulSet
+             pod name (mozalert-controller-2 -> 2).
+    lease:   each replica renews a coordination.k8s.io Lease and the members
+             are the replicas whose lease hasn't expired, so shards rebalance
+             as replicas come and go.
+
+    Whenever the buckets we own change the generation is bumped; the event
+    and check handlers compare it on each loop and re-sync.
+
+    Buckets we lose are given up right away, but buckets we gain are only
+    taken on after the handoff, by which time every other replica has seen
+    the new membership and given them up, so no check runs in two places.
+    In lease mode we give up every bucket as soon as a renewal fails, well
+    before our lease expires and the others take them over.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        self.kube = kwargs.get("kube")
+        self.shutdown = kwargs.get("shutdown", lambda: False)
+
+        self._mode = kwargs.get("mode", "lease")
+        self._identity = kwargs.get("identity", None) or socket.gethostname()
+        self._namespace = kwargs.get("namespace", "default")
+        self._shard_count = int(kwargs.get("shard_count", 1))
+        self._buckets = int(kwargs.get("buckets", DEFAULT_BUCKETS))
+        self._lease_duration = int(kwargs.get("lease_duration", 30))
+        self._renew_interval = float(kwargs.get("renew_interval", 10))
+        # lease calls give up after this long, so a hung renewal fails (and
+        # we let go of our buckets) before the lease can expire
+        self._request_timeout = float(
+            kwargs.get("request_timeout", self._renew_interval / 2)
+        )
+        # how long to wait before taking on new buckets; in ordinal mode the
+        # members are fixed, so there is nothing to wait for
+        self._handoff = float(
+            kwargs.get(
+                "handoff", 2 * self._renew_interval if self._mode == "lease" else 0
+            )
+        )
+
+        self._lock = threading.Lock()
+        self._ring = HashRing()
+        self._owned = frozenset()
+        # the buckets we'll own once the handoff is over, and when that is
+        self._pending = None
+        self._generation = 0
+
+    @property
+    def identity(self):
+        return self._identity
+
+    @property
+    def generation(self):
+        return self._generation
+
+    @property
+    def members(self):
+        return self._ring.members
+
+    @property
+    def owned(self):
+        return self._owned
+
+    @property
+    def label_selector(self):
+        """
+        a set-based label selector matching only the checks in our buckets,
+        or None if we don't own any buckets (yet)
+        """
+        if not self.owned:
+            return
+        owned = ",".join([str(b) for b in sorted(self.owned)])
+        return f"{SHARD_LABEL} in ({owned})"
+
+    def bucket(self, namespace, name):
+        return bucket(namespace, name, self._buckets)
+
+    def owns(self, namespace, name):
+        return self.bucket(namespace, name) in self.owned
+
+    def ordinal_members(self):
+        """
+        StatefulSet pods are named <statefulset>-<ordinal>
+        """
+        prefix = self.identity.rsplit("-", 1)[0]
+        return [f"{prefix}-{i}" for i in range(self._shard_count)]
+
+    def lease_members(self):
+        """
+        renew our own lease and return the holders of all unexpired leases
+        """
+        lease_name = f"mozalert-shard-{self.identity}"
+        ts = now()
+        body = {
+            "apiVersion": "coordination.k8s.io/v1",
+            "kind": "Lease",
+            "metadata": {
+                "name": lease_name,
+                "labels": {LEASE_LABEL: "true"},
+            },
+            "spec": {
+                "holderIdentity": self.identity,
+                "leaseDurationSeconds": self._lease_duration,
+                "renewTime": ts.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            },
+        }
+        timeout = self._request_timeout
+        try:
+            self.kube.CoordinationV1Api.patch_namespaced_lease(
+                lease_name, self._namespace, body, _request_timeout=timeout
+            )
+        except kubeclient.ApiException as e:
+            if e.status != 404:
+                raise
+            self.kube.CoordinationV1Api.create_namespaced_lease(
+                self._namespace, body, _request_timeout=timeout
+            )
+
+        leases = self.kube.CoordinationV1Api.list_namespaced_lease(
+            self._namespace,
+            label_selector=f"{LEASE_LABEL}=true",
+            _request_timeout=timeout,
+        )
+        members = []
+        for lease in leases.items:
+            spec = lease.spec
+            if not spec.renew_time or not spec.holder_identity:
+                continue
+            expires = spec.renew_time + datetime.timedelta(
+                seconds=spec.lease_duration_seconds or self._lease_duration
+            )
+            if expires > ts:
+                members += [spec.holder_identity]
+        if self.identity not in members:
+            members += [self.identity]
+        return members
+
+    def release(self):
+        """
+        drop our lease on shutdown so the others pick up our shard right away
+        """
+        if self._mode != "lease":
+            return
+        try:
+            self.kube.CoordinationV1Api.delete_namespaced_lease(
+                f"mozalert-shard-{self.identity}", self._namespace
+            )
+        except Exception as e:
+            logging.debug(e)
+
+    def refresh(self):
+        """
+        recompute membership and the buckets we own
+        """
+        try:
+            if self._mode == "ordinal":
+                members = self.ordinal_members()
+            else:
+                members = self.lease_members()
+        except Exception as e:
+            logging.error(f"Failed to refresh shard membership: {e}")
+            logging.error(sys.exc_info()[0])
+            if self._mode == "lease":
+                # our lease may run out before we renew it, so stop running
+                # checks now rather than alongside whoever picks them up
+                self.assign(HashRing(), frozenset())
+            return
+
+        if sorted(members) == self.members:
+            return
+
+        ring = HashRing(members)
+        owned = frozenset(
+            [b for b in range(self._buckets) if ring.owner(str(b)) == self.identity]
+        )
+        self.assign(ring, owned)
+        logging.info(
+            f"Shard membership is now {ring.members}, {self.identity} will own {len(owned)}/{self._buckets} buckets"
+        )
+
+    def assign(self, ring, owned):
+        """
+        give up the buckets we no longer own right away, and take on new ones
+        once the handoff is over
+        """
+        keep = self._owned & owned
+        with self._lock:
+            self._ring = ring
+            self._pending = None
+            if keep != self._owned:
+                self._owned = keep
+                self._generation += 1
+            if owned != keep:
+                self._pending = (owned, monotonic() + self._handoff)
+        self.take_pending()
+
+    def take_pending(self):
+        """
+        take on the buckets we were waiting for, once the handoff is over
+        """
+        with self._lock:
+            if not self._pending or monotonic() < self._pending[1]:
+                return
+            self._owned = self._pending[0]
+            self._pending = None
+            self._generation += 1
+        logging.info(f"{self.identity} now owns {len(self._owned)} buckets")
+
+    def run(self):
+        while not self.shutdown():
+            self.refresh()
+            tsleep = 0
+            while tsleep < self._renew_interval and not self.shutdown():
+                sleep(1)
+                tsleep += 1
+                self.take_pending()
+        self.release()
+        logging.info("Shard Manager Shutdown")
+
+
+class ShardLabeler(threading.Thread):
+    """
+    the ShardLabeler adds the bucket label to new checks, since a check
+    without one won't match any replica's watch. It keeps a watch open on
+    just the unlabeled checks and labels the ones in our shard as they are
+    added; the watch starts with a list, which is done again whenever our
+    buckets change, so checks created while no one was watching are
+    labeled too.
+    """
+
+    # we may be blocked reading the watch, so don't hold up shutdown for it
+    shutdown_timeout = 5
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        self.daemon = True
+        self.kube = kwargs.get("kube")
+        self.shard = kwargs.get("shard")
+        self.shutdown = kwargs.get("shutdown", lambda: False)
+        self._stream_watch_timeout = kwargs.get("stream_watch_timeout", 60)
+        self._retry_backoff_max = kwargs.get("retry_backoff_max", 30)
+
+    def label(self, obj):
+        """
+        add the bucket label to a check, if it's in our shard
+        """
+        metadata = obj.get("metadata", {})
+        namespace = metadata.get("namespace")
+        name = metadata.get("name")
+        b = self.shard.bucket(namespace, name)
+        if b not in self.shard.owned:
+            return
+        logging.info(f"Labeling {namespace}/{name} with shard bucket {b}")
+        try:
+            self.kube.CustomObjectsApi.patch_namespaced_custom_object(
+                self.kube.domain,
+                self.kube.version,
+                namespace,
+                self.kube.plural,
+                name,
+                body={"metadata": {"labels": {SHARD_LABEL: str(b)}}},
+            )
+        except Exception as e:
+            logging.error(f"Failed to label {namespace}/{name}: {e}")
+
+    def run(self):
+        resource_version = ""
+        generation = None
+        backoff = 1
+        while not self.shutdown():
+            if self.shard.generation != generation:
+                # we may have picked up buckets with unlabeled checks in them
+                generation = self.shard.generation
+                resource_version = ""
+            if not self.shard.owned:
+                sleep(1)
+                continue
+            try:
+                stream = self.kube.Watch().stream(
+                    self.kube.CustomObjectsApi.list_cluster_custom_object,
+                    self.kube.domain,
+                    self.kube.version,
+                    self.kube.plural,
+                    label_selector=f"!{SHARD_LABEL}",
+                    resource_version=resource_version,
+                    timeout_seconds=self._stream_watch_timeout,
+                    allow_watch_bookmarks=True,
+                )
+                for evt in stream:
+                    if evt.get("type") == "ERROR":
+                        # most likely our resource_version is too old,
+                        # start over with a fresh list
+                        resource_version = ""
+                        break
+                    obj = evt.get("object", {})
+                    if evt.get("type") == "ADDED":
+                        self.label(obj)
+                    resource_version = (
+                        obj.get("metadata", {}).get("resourceVersion")
+                        or resource_version
+                    )
+                    if self.shutdown() or self.shard.generation != generation:
+                        break
+                backoff = 1
+            except Exception as e:
+                logging.error(
+                    f"Unlabeled check watch failed, retrying in {backoff}s: {e}"
+                )
+                logging.error(sys.exc_info()[0])
+                resource_version = ""
+                sleep(backoff)
+                backoff = min(backoff * 2, self._retry_backoff_max)
+        logging.info("Shard Labeler Shutdown")
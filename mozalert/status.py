@@ -41,8 +41,13 @@ class Status:
         self.next_check = kwargs.get("next_check", None)
         self.attempt = kwargs.get("attempt", 0)
         self.logs = kwargs.get("logs", "")
+        # with a LogStore, logs is only an excerpt and the full logs are
+        # found by logs_ref
+        self.logs_ref = kwargs.get("logs_ref", None)
+        self.logs_size = kwargs.get("logs_size", None)
         self.message = kwargs.get("message", "")
         self.telemetry = kwargs.get("telemetry", {})
+        self.observed_generation = kwargs.get("observedGeneration", None)
 
     @property
     def status(self):
@@ -127,6 +132,19 @@ class Status:
     def logs(self, logs):
         self._logs = logs
 
+    @property
+    def observed_generation(self):
+        """
+        the metadata.generation of the spec the controller is running
+        """
+        return self._observed_generation
+
+    @observed_generation.setter
+    def observed_generation(self, observed_generation):
+        if observed_generation is not None:
+            observed_generation = int(observed_generation)
+        self._observed_generation = observed_generation
+
     @property
     def message(self):
         return self._message
@@ -144,8 +162,11 @@ class Status:
                 ("next_check", self.next_check),
                 ("attempt", self.attempt),
                 ("logs", self.logs),
+                ("logs_ref", self.logs_ref),
+                ("logs_size", self.logs_size),
                 ("telemetry", self.telemetry),
                 ("message", self.message),
+                ("observed_generation", self.observed_generation),
             ]
         )
 
@@ -184,8 +205,11 @@ class Status:
                 "last_check": str(self.last_check).split(".")[0],
                 "next_check": str(self.next_check).split(".")[0],
                 "logs": self.logs,
+                "logs_ref": self.logs_ref,
+                "logs_size": self.logs_size,
                 "telemetry": self.telemetry,
                 "message": self.message,
+                "observedGeneration": self.observed_generation,
             }
         }
 
@@ -206,8 +230,13 @@ class Status:
         self.next_check = kwargs.get("next_check", self.next_check)
         self.attempt = kwargs.get("attempt", self.attempt)
         self.logs = kwargs.get("logs", self.logs)
+        self.logs_ref = kwargs.get("logs_ref", self.logs_ref)
+        self.logs_size = kwargs.get("logs_size", self.logs_size)
         self.telemetry = kwargs.get("telemetry", self.telemetry)
         self.message = kwargs.get("message", self.message)
+        self.observed_generation = kwargs.get(
+            "observedGeneration", self.observed_generation
+        )
         if self.RUNNING and self.attempt:
             # pre_status was running with an attempt >0 so decrement the attempt
             # since we will retry anyhow
@@ -0,0 +1,64 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# seconds to wait for a connection, and then for a response
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 10
+# connections kept open to each host, per backend
+POOL_SIZE = 10
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+def configure(connect_timeout=None, read_timeout=None, pool_size=None):
+    """
+    set the timeouts and pool size for the escalation backends; sessions
+    which already exist keep their pool size
+    """
+    global CONNECT_TIMEOUT, READ_TIMEOUT, POOL_SIZE
+    if connect_timeout is not None:
+        CONNECT_TIMEOUT = float(connect_timeout)
+    if read_timeout is not None:
+        READ_TIMEOUT = float(read_timeout)
+    if pool_size is not None:
+        POOL_SIZE = int(pool_size)
+
+
+def session(backend):
+    """
+    the shared session for an escalation backend (e.g. "slack"). Each
+    keeps a pool of keep-alive connections, so a burst of escalations pays
+    for the TCP and TLS handshakes once rather than for every message. The
+    sessions are shared by every check and every dispatcher worker; they
+    carry no cookies or auth of their own, so that's safe.
+    """
+    with _lock:
+        s = _sessions.get(backend)
+        if not s:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _sessions[backend] = s
+        return s
+
+
+def post(backend, url, **kwargs):
+    """
+    requests.post over the backend's session, with our timeouts
+    """
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+    return session(backend).post(url, **kwargs)
+
+
+def close():
+    """
+    close every session and its connections
+    """
+    with _lock:
+        for s in _sessions.values():
+            s.close()
+        _sessions.clear()
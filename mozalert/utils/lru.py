@@ -0,0 +1,49 @@
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+
+
+class LRUCache:
+    """
+    a small thread-safe least-recently-used cache. Once maxsize entries
+    are stored, adding another evicts the one used longest ago.
+    """
+
+    def __init__(self, maxsize=1024):
+        self._maxsize = int(maxsize)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.stats = SimpleNamespace(hits=0, misses=0, evictions=0)
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                self.stats.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self._maxsize:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
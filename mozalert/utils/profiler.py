@@ -0,0 +1,272 @@
+import os
+import sys
+import logging
+import threading
+import traceback
+import tracemalloc
+from collections import Counter
+from time import monotonic, sleep
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# the profiles /debug/profile can take; see sample()
+PROFILE_MODES = ("cpu", "wall")
+# functions a thread sits in while it's blocked rather than running
+BLOCKING_FRAMES = {
+    "wait",
+    "_wait_for_tstate_lock",
+    "sleep",
+    "select",
+    "poll",
+    "acquire",
+    "accept",
+    "readinto",
+    "recv_into",
+    "_recv_into",
+}
+IDLE_MARKER = "[idle]"
+
+
+def thread_names():
+    return {t.ident: t.name for t in threading.enumerate()}
+
+
+def native_ids():
+    return {t.ident: getattr(t, "native_id", None) for t in threading.enumerate()}
+
+
+def cpu_profiling():
+    """
+    whether we can tell which threads are using CPU: it needs the kernel's
+    per-thread stats (Linux) and native thread ids (Python 3.8+)
+    """
+    return os.path.isdir("/proc/self/task") and hasattr(threading, "get_native_id")
+
+
+def cpu_times():
+    """
+    the CPU time (user + system, in clock ticks) of every thread in the
+    process by native thread id
+    """
+    times = {}
+    for tid in os.listdir("/proc/self/task"):
+        try:
+            with open(f"/proc/self/task/{tid}/stat") as f:
+                stat = f.read()
+        except OSError:
+            # the thread exited
+            continue
+        # the thread name may hold spaces, so count fields after it
+        fields = stat[stat.rfind(")") + 2 :].split()
+        times[int(tid)] = int(fields[11]) + int(fields[12])
+    return times
+
+
+def profile_mode(mode):
+    """
+    the profile we can actually take for mode
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"mode must be one of {', '.join(PROFILE_MODES)}")
+    if mode == "cpu" and not cpu_profiling():
+        logging.warning("Can't see per-thread CPU time here, taking a wall profile")
+        return "wall"
+    return mode
+
+
+def collapse(frame):
+    """
+    a stack as root;...;leaf with each frame as function (file:line)
+    """
+    stack = []
+    while frame:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+def sample(seconds=10, interval=0.005, shutdown=lambda: False, mode="cpu"):
+    """
+    sample the stacks of the other threads every interval seconds for
+    seconds, and return them in collapsed-stack format, one stack per line
+    followed by the number of samples it was seen in, ready for
+    flamegraph.pl or speedscope. Each stack starts with the thread's name.
+
+    cpu:  only threads whose CPU time moved since the previous sample (at
+          the kernel's clock tick, usually 10ms) are sampled, so idle
+          threads are left out and the profile shows what is using the CPU
+          or holding the GIL. Where per-thread CPU time can't be seen this
+          falls back to wall.
+    wall: every thread is sampled whether it's running or not; stacks
+          which end in a blocking wait (see BLOCKING_FRAMES) end in [idle]
+    """
+    mode = profile_mode(mode)
+    me = threading.get_ident()
+    counts = Counter()
+    names = thread_names()
+    natives = native_ids()
+    times = cpu_times() if mode == "cpu" else {}
+    end = monotonic() + seconds
+    while monotonic() < end and not shutdown():
+        last, times = times, cpu_times() if mode == "cpu" else {}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            if ident not in names:
+                # a thread started since we last looked
+                names = thread_names()
+                natives = native_ids()
+            if mode == "cpu":
+                native = natives.get(ident)
+                if times.get(native, 0) == last.get(native, 0):
+                    continue
+            stack = f"{names.get(ident, ident)};{collapse(frame)}"
+            if mode == "wall" and frame.f_code.co_name in BLOCKING_FRAMES:
+                stack += f";{IDLE_MARKER}"
+            counts[stack] += 1
+        sleep(interval)
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+def thread_dump():
+    """
+    the current stack of every thread
+    """
+    names = thread_names()
+    dump = []
+    for ident, frame in sys._current_frames().items():
+        dump.append(f'Thread "{names.get(ident, ident)}" ({ident}):\n')
+        dump.extend(traceback.format_stack(frame))
+        dump.append("\n")
+    return "".join(dump)
+
+
+def memory_snapshot(seconds=0, limit=50, frames=1):
+    """
+    the top limit allocation sites by size. Tracing is only switched on
+    while this runs unless it was already on, so only allocations made in
+    the next seconds are seen.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(frames)
+    try:
+        sleep(seconds)
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        if started:
+            tracemalloc.stop()
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    stats = snapshot.statistics("traceback" if frames > 1 else "lineno")
+    total = sum(stat.size for stat in stats)
+    lines = [f"{total} bytes in {len(stats)} allocation sites\n"]
+    for stat in stats[:limit]:
+        lines.append(f"{stat.size} bytes in {stat.count} blocks\n")
+        lines.extend(f"    {line}\n" for line in stat.traceback.format())
+    return "".join(lines)
+
+
+class DebugHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logging.debug(f"debug server: {format % args}")
+
+    def reply(self, code, text, headers=None):
+        body = text.encode()
+        self.send_response(code)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        args = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        server = self.server.debug_server
+        try:
+            seconds = min(float(args.get("seconds", 10)), server.max_seconds)
+            if url.path == "/debug/threads":
+                return self.reply(200, thread_dump())
+            if url.path not in ("/debug/profile", "/debug/memory"):
+                return self.reply(404, "not found\n")
+            if not server.busy.acquire(blocking=False):
+                return self.reply(409, "a profile is already being taken\n")
+            headers = {}
+            try:
+                if url.path == "/debug/profile":
+                    mode = profile_mode(args.get("mode", "cpu"))
+                    headers["X-Profile-Mode"] = mode
+                    text = sample(
+                        seconds,
+                        interval=max(float(args.get("interval", 0.005)), 0.001),
+                        shutdown=lambda: server.stopped,
+                        mode=mode,
+                    )
+                else:
+                    text = memory_snapshot(
+                        seconds,
+                        limit=int(args.get("limit", 50)),
+                        frames=int(args.get("frames", 1)),
+                    )
+            finally:
+                server.busy.release()
+            self.reply(200, text, headers)
+        except ValueError as e:
+            self.reply(400, f"{e}\n")
+        except Exception as e:
+            logging.error(f"Debug request {self.path} failed: {e}")
+            self.reply(500, f"{e}\n")
+
+
+class DebugServer:
+    """
+    the DebugServer answers on-demand profiling requests against the
+    running process:
+
+        /debug/profile?seconds=10&interval=0.005&mode=cpu
+            a sampling profile in collapsed-stack format, of the threads
+            using the CPU (mode=cpu) or of every thread (mode=wall); the
+            X-Profile-Mode header says which was taken
+        /debug/threads
+            the current stack of every thread
+        /debug/memory?seconds=10&limit=50&frames=1
+            the biggest allocation sites, traced over seconds
+
+    Nothing is sampled or traced unless a request is being answered, and only
+    one profile is taken at a time. It listens on localhost by default; use
+    port forwarding to reach it.
+    """
+
+    def __init__(self, port, addr="127.0.0.1", max_seconds=60):
+        self._port = int(port)
+        self._addr = addr
+        self.max_seconds = max_seconds
+        self.busy = threading.Lock()
+        self.stopped = False
+        self._server = None
+
+    @property
+    def port(self):
+        if self._server:
+            return self._server.server_address[1]
+        return self._port
+
+    def start(self):
+        self.stopped = False
+        self._server = ThreadingHTTPServer((self._addr, self._port), DebugHandler)
+        self._server.daemon_threads = True
+        self._server.debug_server = self
+        thread = threading.Thread(
+            target=self._server.serve_forever, name="debug-server", daemon=True
+        )
+        thread.start()
+        logging.info(f"Serving debug endpoints on {self._addr}:{self.port}/debug")
+
+    def stop(self):
+        self.stopped = True
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
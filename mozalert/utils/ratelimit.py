@@ -0,0 +1,71 @@
+import threading
+from time import monotonic, sleep
+
+
+class TokenBucket:
+    """
+    a thread-safe token bucket. Tokens refill at rate per second up to
+    capacity; each acquire takes one. The bucket starts with `tokens`
+    tokens (default empty) so a burst right after startup is held to the
+    refill rate rather than the full capacity.
+    """
+
+    def __init__(self, rate, capacity=None, tokens=0):
+        self._rate = float(rate)
+        self._capacity = float(capacity or rate)
+        self._tokens = min(float(tokens), self._capacity)
+        self._last = monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def _refill(self):
+        ts = monotonic()
+        self._tokens = min(
+            self._capacity, self._tokens + (ts - self._last) * self._rate
+        )
+        self._last = ts
+
+    def wait_time(self, n=1):
+        """
+        the number of seconds until n tokens are available, without
+        taking them
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= n:
+                return 0
+            return (n - self._tokens) / self._rate
+
+    def try_acquire(self, n=1):
+        """
+        take n tokens if they're available and return 0, otherwise return
+        the number of seconds until they will be
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= n:
+                self._tokens -= n
+                return 0
+            return (n - self._tokens) / self._rate
+
+    def acquire(self, n=1, timeout=None):
+        """
+        block until n tokens are taken; returns False if timeout
+        seconds pass first
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            wait = self.try_acquire(n)
+            if not wait:
+                return True
+            if deadline is not None:
+                if monotonic() + wait > deadline:
+                    return False
+            sleep(wait)
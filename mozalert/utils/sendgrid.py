@@ -1,17 +1,26 @@
 import logging
 
-from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 
+from mozalert.utils import http
+
+SENDGRID_URL = "https://api.sendgrid.com/v3/mail/send"
+
 
 class SendGridTools:
     @staticmethod
     def send_message(**kwargs):
+        """
+        send an email through the SendGrid API. The request goes over the
+        shared "sendgrid" session rather than a new SendGridAPIClient, so
+        connections to the API are kept open between emails.
+        """
         api_key = kwargs.get("api_key", "")
         to_emails = kwargs.get("to_emails", [])
         from_email = kwargs.get("from_email", "afrank+sendgrid_default@mozilla.com")
         message = kwargs.get("message", "")
         subject = kwargs.get("subject", "Error Alert")
+        url = kwargs.get("url", SENDGRID_URL)
         message = Mail(
             from_email=from_email,
             to_emails=to_emails,
@@ -19,8 +28,13 @@ class SendGridTools:
             html_content=message,
         )
         try:
-            sg = SendGridAPIClient(api_key)
-            response = sg.send(message)
-            # logging.info(response)
+            response = http.post(
+                "sendgrid",
+                url,
+                json=message.get(),
+                headers={"Authorization": f"Bearer {api_key}"},
+            )
+            response.raise_for_status()
         except Exception as e:
-            logging.warning(e.message)
+            logging.warning(e)
+            raise
@@ -26,6 +26,7 @@ class FakeClient:
         create_namespaced_job=fakecallable,
         read_namespaced_job_status=fake_job_status,
         delete_namespaced_job=fakecallable,
+        list_job_for_all_namespaces=fakecallable,
     )
     CoreV1Api = SimpleNamespace(
         list_namespaced_pod=fake_pod_list, read_namespaced_pod_log=fakecallable
@@ -51,3 +52,34 @@ class FakeClient:
     @property
     def plural(self):
         return "checks"
+
+
+async def fakecoroutine(*args, **kwargs):
+    pass
+
+
+async def fake_job_status_async(*args, **kwargs):
+    return fake_job_status()
+
+
+async def fake_pod_list_async(*args, **kwargs):
+    return fake_pod_list()
+
+
+class FakeAsyncClient:
+    CustomObjectsApi = SimpleNamespace(
+        patch_namespaced_custom_object_status=fakecoroutine,
+    )
+    BatchV1Api = SimpleNamespace(
+        create_namespaced_job=fakecoroutine,
+        read_namespaced_job_status=fake_job_status_async,
+        delete_namespaced_job=fakecoroutine,
+    )
+    CoreV1Api = SimpleNamespace(
+        list_namespaced_pod=fake_pod_list_async,
+        read_namespaced_pod_log=fakecoroutine,
+    )
+
+    domain = "crd.k8s.afrank.local"
+    version = "v1"
+    plural = "checks"
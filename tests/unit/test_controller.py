@@ -1,3 +1,4 @@
+import copy
 import unittest
 import unittest.mock as mock
 import logging
@@ -29,6 +30,22 @@ def fake_stream(*args, **kwargs):
     return []
 
 
+def fake_label_stream(*args, **kwargs):
+    added = copy.deepcopy(events.add_event)
+    added["object"]["metadata"]["generation"] = 1
+    if not kwargs.get("resource_version", ""):
+        return [added]
+    if kwargs.get("resource_version") != "1":
+        return []
+    # only the labels change, which doesn't bump the generation; sent once
+    # the check is running so it isn't coalesced with the ADDED
+    sleep(2)
+    added["type"] = "MODIFIED"
+    added["object"]["metadata"]["resourceVersion"] = "2"
+    added["object"]["metadata"]["labels"] = {"team": "sre"}
+    return [added]
+
+
 class TestController(unittest.TestCase):
     @mock.patch.object(mozalert.kubeclient, "KubeClient")
     def test_controller_create_check(self, FakeKube):
@@ -80,3 +97,67 @@ class TestController(unittest.TestCase):
         shutdown = True
         c.terminate()
         c.join()
+
+    @mock.patch.object(mozalert.kubeclient, "KubeClient")
+    def test_checks_follow_restarted_job_watcher(self, FakeKube):
+        fake.FakeClient.FakeStream = fake_stream
+        FakeKube.return_value = fake.FakeClient
+
+        shutdown = False
+        c = Controller(shutdown=lambda: shutdown)
+        c.start()
+
+        sleep(5)
+
+        check = c.checks["default/test-add-event"]
+        old = c.job_watcher
+        assert check.job_watcher is old
+        c.restart_thread("job-watcher")
+        assert c.job_watcher is not old
+        assert check.job_watcher is c.job_watcher, "check kept the old watcher"
+
+        shutdown = True
+        c.terminate()
+        c.join()
+
+    @mock.patch.object(mozalert.kubeclient, "KubeClient")
+    def test_checks_follow_restarted_dispatcher(self, FakeKube):
+        fake.FakeClient.FakeStream = fake_stream
+        FakeKube.return_value = fake.FakeClient
+
+        shutdown = False
+        c = Controller(shutdown=lambda: shutdown)
+        c.start()
+
+        sleep(5)
+
+        check = c.checks["default/test-add-event"]
+        old = c.escalation_dispatcher
+        assert check.escalation_dispatcher is old
+        c.restart_thread("escalation-dispatcher")
+        assert c.escalation_dispatcher is not old
+        assert check.escalation_dispatcher is c.escalation_dispatcher
+        assert check.escalation_dispatcher.is_alive()
+
+        shutdown = True
+        c.terminate()
+        c.join()
+
+    @mock.patch.object(mozalert.kubeclient, "KubeClient")
+    def test_label_change_reaches_the_check(self, FakeKube):
+        fake.FakeClient.FakeStream = fake_label_stream
+        FakeKube.return_value = fake.FakeClient
+
+        shutdown = False
+        c = Controller(shutdown=lambda: shutdown)
+        c.start()
+
+        sleep(5)
+
+        check = c.checks["default/test-add-event"]
+        assert check.config.labels == {"team": "sre"}, "labels are stale"
+        assert check.generation == 1
+
+        shutdown = True
+        c.terminate()
+        c.join()
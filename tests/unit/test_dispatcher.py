@@ -0,0 +1,293 @@
+import os
+import json
+import tempfile
+import threading
+import unittest
+from time import sleep, monotonic
+from types import SimpleNamespace
+
+from mozalert.escalations import dispatcher
+from mozalert.escalations.registry import EscalationRegistry
+from mozalert.status import Status
+
+
+class FakeEscalation:
+    """
+    fails the first `failures` sends, tracking how many are sent at once
+    """
+
+    supports_batching = True
+    failures = 0
+    retry_after = None
+    delay = 0
+    lock = threading.Lock()
+    running = 0
+    most_running = 0
+    sent = []
+    attempts = {}
+    calls = 0
+
+    def __init__(self, name, args, config, status):
+        self.name = name
+        self.destination = args.get("destination")
+
+    @classmethod
+    def digest(cls, escalations, max_checks=50):
+        digest = cls(f"{len(escalations)} checks", {}, None, None)
+        digest.name = ",".join(e.name for e in escalations[:max_checks])
+        return digest
+
+    def run(self):
+        cls = FakeEscalation
+        with cls.lock:
+            cls.running += 1
+            cls.most_running = max(cls.most_running, cls.running)
+            cls.attempts[self.name] = cls.attempts.get(self.name, 0) + 1
+            cls.calls += 1
+            calls = cls.calls
+        sleep(cls.delay)
+        with cls.lock:
+            cls.running -= 1
+        if calls <= cls.failures:
+            e = Exception("provider unavailable")
+            if cls.retry_after:
+                e.response = SimpleNamespace(
+                    status_code=429, headers={"Retry-After": cls.retry_after}
+                )
+            raise e
+        with cls.lock:
+            cls.sent += [(self.name, monotonic())]
+
+
+class TestDispatcher(unittest.TestCase):
+    def setUp(self):
+        FakeEscalation.failures = 0
+        FakeEscalation.retry_after = None
+        FakeEscalation.delay = 0
+        FakeEscalation.most_running = 0
+        FakeEscalation.sent = []
+        FakeEscalation.attempts = {}
+        FakeEscalation.calls = 0
+        self.stop = False
+        self.registry = EscalationRegistry()
+        self.registry.register("fake", FakeEscalation)
+
+    def tearDown(self):
+        self.stop = True
+        self.dispatcher.join()
+
+    def start(self, **kwargs):
+        kwargs.setdefault("drain_timeout", 0.5)
+        self.dispatcher = dispatcher.EscalationDispatcher(
+            shutdown=lambda: self.stop, registry=self.registry, backoff=0.05, **kwargs
+        )
+        self.dispatcher.start()
+        return self.dispatcher
+
+    def submit(self, check, destination=None):
+        return self.dispatcher.submit(
+            check, "fake", {"destination": destination}, config=None, status=Status()
+        )
+
+    def sent(self):
+        return [name for name, _ in FakeEscalation.sent]
+
+    def wait_for(self, condition, timeout=5):
+        end = monotonic() + timeout
+        while not condition() and monotonic() < end:
+            sleep(0.01)
+        return condition()
+
+    def test_retries_with_backoff(self):
+        FakeEscalation.failures = 2
+        d = self.start(max_attempts=3)
+        self.submit("default/check")
+        assert self.wait_for(lambda: self.sent() == ["default/check"])
+        assert d.stats.retried == 2 and d.stats.dead == 0
+
+    def test_dead_letter(self):
+        FakeEscalation.failures = 5
+        with tempfile.TemporaryDirectory() as path:
+            path = os.path.join(path, "dead-letters.jsonl")
+            d = self.start(max_attempts=2, dead_letter_path=path)
+            self.submit("default/check")
+            assert self.wait_for(lambda: d.stats.dead == 1)
+            with open(path) as f:
+                letter = json.loads(f.readline())
+        assert letter["check"] == "default/check" and letter["attempts"] == 2
+        assert self.sent() == []
+
+    def test_type_limit(self):
+        FakeEscalation.delay = 0.05
+        d = self.start(max_workers=10, type_limits={"fake": 2})
+        start = monotonic()
+        for i in range(8):
+            self.submit(f"default/check-{i}")
+        # submitting never waits on the provider
+        assert monotonic() - start < 0.05
+        assert self.wait_for(lambda: len(FakeEscalation.sent) == 8)
+        assert FakeEscalation.most_running == 2
+        assert d.depth == 0
+
+    def test_digest(self):
+        d = self.start(digest_window=0.2, digest_max_checks=2)
+        for i in range(3):
+            self.submit(f"default/check-{i}", destination="#alerts")
+        self.submit("default/other", destination="#other")
+        sleep(0.1)
+        assert self.sent() == [], "sent before the window closed"
+        assert self.wait_for(lambda: len(FakeEscalation.sent) == 2)
+        assert sorted(self.sent()) == [
+            "default/check-0,default/check-1",
+            "default/other",
+        ]
+        assert d.stats.digested == 3
+
+    def test_destination_rate(self):
+        self.start(destination_rate=20)
+        for i in range(4):
+            self.submit(f"default/check-{i}", destination="#alerts")
+        self.submit("default/other", destination="#other")
+        assert self.wait_for(lambda: len(FakeEscalation.sent) == 5)
+        times = dict(FakeEscalation.sent)
+        first = min(times.values())
+        # one burst token, then one every 50ms
+        assert times["default/check-3"] - first >= 0.14
+        assert times["default/other"] - first < 0.05
+        assert self.dispatcher.stats.throttled == 3
+
+    def test_overflow_drop_oldest(self):
+        d = self.start(destination_rate=0.01, overflow="drop-oldest", max_queued=2)
+        for i in range(5):
+            self.submit(f"default/check-{i}", destination="#alerts")
+        assert self.wait_for(lambda: d.stats.dropped == 2)
+        assert self.sent() == ["default/check-0"]
+        assert d.depth == 2
+
+    def test_overflow_summary(self):
+        d = self.start(
+            destination_rate=0.01, overflow="summary", max_queued=2, digest_max_checks=5
+        )
+        for i in range(5):
+            self.submit(f"default/check-{i}", destination="#alerts")
+        assert self.wait_for(lambda: d.stats.digested == 4)
+        assert d.depth == 1 and d.stats.dropped == 0
+        self.stop = True
+        d.join()
+        # still over the destination's limit on the way out
+        assert self.sent() == ["default/check-0"]
+        assert d.dead_letters[-1]["checks"] == [
+            f"default/check-{i}" for i in range(1, 5)
+        ]
+
+    def test_overflow_summary_twice(self):
+        d = self.start(destination_rate=0.01, overflow="summary", max_queued=2)
+        with d._cond:
+            for i in range(8):
+                self.submit(f"default/check-{i}", destination="#alerts")
+        assert self.wait_for(lambda: d.stats.digested == 7)
+        # more arrive while the summary is still waiting
+        with d._cond:
+            for i in range(8, 12):
+                self.submit(f"default/check-{i}", destination="#alerts")
+        assert self.wait_for(lambda: d.stats.digested == 11)
+        assert d.depth == 1 and d.stats.dropped == 0
+        with d._cond:
+            summary = d._queue[0][2]
+        assert summary.check == "default/check-1 and 10 more"
+        self.stop = True
+        d.join()
+        assert d.dead_letters[-1]["checks"] == [
+            f"default/check-{i}" for i in range(1, 12)
+        ]
+
+    def test_retry_after(self):
+        FakeEscalation.failures = 1
+        FakeEscalation.retry_after = "0.3"
+        self.start()
+        start = monotonic()
+        self.submit("default/check", destination="#alerts")
+        sleep(0.05)
+        self.submit("default/other", destination="#alerts")
+        self.submit("default/elsewhere", destination="#other")
+        assert self.wait_for(lambda: len(FakeEscalation.sent) == 3)
+        times = dict(FakeEscalation.sent)
+        assert times["default/elsewhere"] - start < 0.2
+        # both waited out the Retry-After of their destination
+        assert times["default/check"] - start >= 0.3
+        assert times["default/other"] - start >= 0.3
+        assert FakeEscalation.attempts["default/other"] == 1
+
+    def test_drain_keeps_to_the_limits(self):
+        d = self.start(destination_rate=10, drain_timeout=2)
+        for i in range(3):
+            self.submit(f"default/check-{i}", destination="#alerts")
+        self.stop = True
+        d.join()
+        assert sorted(self.sent()) == [f"default/check-{i}" for i in range(3)]
+        times = sorted(t for _, t in FakeEscalation.sent)
+        # one burst token, then one every 100ms
+        assert times[-1] - times[0] >= 0.19
+        assert d.stats.dead == 0
+
+    def test_drain_dead_letters_paused(self):
+        FakeEscalation.failures = 1
+        FakeEscalation.retry_after = "60"
+        d = self.start(drain_timeout=0.2)
+        self.submit("default/check", destination="#alerts")
+        assert self.wait_for(lambda: d.stats.retried == 1)
+        self.submit("default/other", destination="#alerts")
+        start = monotonic()
+        self.stop = True
+        d.join()
+        # the destination asked us to back off, so we don't send on the way out
+        assert monotonic() - start < 2
+        assert self.sent() == []
+        assert sorted(letter["check"] for letter in d.dead_letters) == [
+            "default/check",
+            "default/other",
+        ]
+
+    def test_crash_drains_the_queue(self):
+        d = self.start(destination_rate=0.01)
+        for i in range(3):
+            self.submit(f"default/check-{i}", destination="#alerts")
+        assert self.wait_for(lambda: self.sent() == ["default/check-0"])
+
+        def crash():
+            raise RuntimeError("bug")
+
+        d.next_due = crash
+        with d._cond:
+            d._cond.notify()
+        d.join(5)
+        assert not d.is_alive()
+        # what was still queued was dead-lettered rather than lost
+        assert self.sent() == ["default/check-0"]
+        assert [letter["check"] for letter in d.dead_letters] == [
+            "default/check-1",
+            "default/check-2",
+        ]
+        assert d.depth == 0
+
+    def test_submit_while_draining(self):
+        FakeEscalation.delay = 0.3
+        d = self.start(destination_rate=0.01)
+        self.submit("default/check-0", destination="#alerts")
+        self.submit("default/check-1", destination="#alerts")
+        assert self.wait_for(lambda: FakeEscalation.running == 1)
+
+        def crash():
+            raise RuntimeError("bug")
+
+        d.next_due = crash
+        with d._cond:
+            d._cond.notify()
+        # still waiting on the slow send when this comes in
+        assert self.wait_for(lambda: d._closed)
+        assert d.is_alive()
+        assert not self.submit("default/check-2", destination="#alerts")
+        d.join(5)
+        assert not d.is_alive()
+        assert d.depth == 0, "an escalation was left in the queue"
+        assert "default/check-2" not in self.sent()
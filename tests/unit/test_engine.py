@@ -0,0 +1,50 @@
+import unittest
+
+from time import sleep
+
+from mozalert.checks.check import Check
+from mozalert.checks.config import CheckConfig
+from mozalert.checks.engine import AsyncJobEngine
+from mozalert.checks.scheduler import Scheduler
+
+from tests import fake
+
+
+class TestAsyncJobEngine(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler(max_workers=2)
+        self.scheduler.start()
+        self.engine = AsyncJobEngine(kube=fake.FakeAsyncClient())
+        self.engine.start()
+
+    def tearDown(self):
+        self.engine.stop()
+        self.scheduler.stop()
+
+    def test_check_runs_on_engine(self):
+        config = CheckConfig(
+            name="test-engine", namespace="default", check_interval=600
+        )
+        check = Check(
+            kube=fake.FakeClient,
+            config=config,
+            scheduler=self.scheduler,
+            engine=self.engine,
+            job_poll_interval=0.1,
+        )
+
+        check.check()
+
+        assert check.job, "job was not handed to the engine"
+        check.job.result(timeout=5)
+        # finishing the check happens on a scheduler worker
+        for _ in range(20):
+            if check.status.attempt == 0:
+                break
+            sleep(0.1)
+
+        assert check.status.OK, f"unexpected status {check.status.status.name}"
+        assert check.status.IDLE
+        assert check.status.attempt == 0, "check was not finished"
+
+        check.terminate(join=True)
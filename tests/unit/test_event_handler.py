@@ -0,0 +1,116 @@
+import unittest
+import copy
+import threading
+from time import sleep
+
+from types import SimpleNamespace
+
+from mozalert.events.handler import EventHandler
+from mozalert.events.queue import EventQueue
+
+from tests import events
+
+
+def check(name, rv):
+    obj = copy.deepcopy(events.add_event["object"])
+    obj["metadata"]["name"] = name
+    obj["metadata"]["resourceVersion"] = rv
+    return obj
+
+
+class PagedClient:
+    """
+    serves a list of checks two at a time
+    """
+
+    domain = "crd.k8s.afrank.local"
+    version = "v1"
+    plural = "checks"
+
+    def __init__(self, items):
+        self.items = items
+        self.calls = 0
+        self.CustomObjectsApi = SimpleNamespace(list_cluster_custom_object=self.list)
+
+    def list(self, *args, **kwargs):
+        self.calls += 1
+        start = int(kwargs.get("_continue") or 0)
+        end = start + kwargs.get("limit")
+        metadata = {"resourceVersion": "100"}
+        if end < len(self.items):
+            metadata["continue"] = str(end)
+        return {"items": self.items[start:end], "metadata": metadata}
+
+
+class TestEventHandler(unittest.TestCase):
+    def drain(self, q):
+        evts = []
+        evt = q.get(timeout=0)
+        while evt:
+            evts += [(evt.type.name, evt.config.name)]
+            evt = q.get(timeout=0)
+        return evts
+
+    def test_relist_diff(self):
+        q = EventQueue()
+        kube = PagedClient([check("a", "1"), check("b", "1"), check("c", "1")])
+        handler = EventHandler(kube=kube, q=q, list_page_size=2)
+
+        assert handler.relist() == "100"
+        assert kube.calls == 2, "list was not paginated"
+        assert self.drain(q) == [("ADDED", "a"), ("ADDED", "b"), ("ADDED", "c")]
+
+        # b changed and c went away while we weren't watching
+        kube.items = [check("a", "1"), check("b", "2")]
+        handler.relist()
+        assert self.drain(q) == [("MODIFIED", "b"), ("DELETED", "c")]
+
+    def test_bookmark_is_not_queued(self):
+        q = EventQueue()
+        handler = EventHandler(kube=PagedClient([]), q=q)
+        rv = handler.handle_event(
+            {"type": "BOOKMARK", "object": {"metadata": {"resourceVersion": "42"}}}
+        )
+        assert rv == "42"
+        assert q.depth == 0
+
+    def test_rebalance_stops_the_watch(self):
+        q = EventQueue()
+        kube = PagedClient([check("a", "1")])
+        watches = []
+
+        class Watch:
+            def __init__(self):
+                self.stopped = False
+                watches.append(self)
+
+            def stream(self, *args, **kwargs):
+                self.selector = kwargs.get("label_selector")
+                self.timeout = kwargs.get("timeout_seconds")
+                # bookmarks keep coming, so the watch never times out by itself
+                while not self.stopped:
+                    yield {
+                        "type": "BOOKMARK",
+                        "object": {"metadata": {"resourceVersion": "101"}},
+                    }
+                    sleep(0.01)
+
+            def stop(self):
+                self.stopped = True
+
+        kube.Watch = Watch
+        shard = SimpleNamespace(generation=1, label_selector="mozalert.io/shard in (1)")
+        stop = threading.Event()
+        handler = EventHandler(kube=kube, q=q, shard=shard, shutdown=stop.is_set)
+        handler.start()
+        sleep(0.1)
+        shard.generation = 2
+        shard.label_selector = "mozalert.io/shard in (2)"
+        sleep(0.1)
+        stop.set()
+        handler.join()
+
+        assert len(watches) == 2 and watches[0].stopped
+        assert watches[1].selector == "mozalert.io/shard in (2)"
+        assert watches[0].timeout == 10
+        assert kube.calls == 2, "did not re-list after the rebalance"
@@ -0,0 +1,75 @@
+import unittest
+import copy
+
+from mozalert.events.queue import EventQueue
+from mozalert.events.event import Event
+
+from tests import events
+
+
+def event(evt_type, name="test-add-event", interval="1m"):
+    evt = copy.deepcopy(events.add_event)
+    evt["type"] = evt_type
+    evt["object"]["metadata"]["name"] = name
+    evt["object"]["spec"]["check_interval"] = interval
+    return evt
+
+
+class TestEventQueue(unittest.TestCase):
+    def setUp(self):
+        self.q = EventQueue()
+
+    def test_modified_events_collapse(self):
+        self.q.put(**event("ADDED"))
+        for interval in ["2m", "3m", "4m"]:
+            self.q.put(**event("MODIFIED", interval=interval))
+        self.q.put(**event("ADDED", name="other"))
+
+        assert self.q.depth == 2
+        assert self.q.coalesced == 3
+
+        evt = self.q.get(timeout=0)
+        assert evt.MODIFIED and evt.config.check_interval == 240
+        assert str(self.q.get(timeout=0)) == "default/other"
+        assert self.q.get(timeout=0) is None
+
+    def test_deleted_supersedes(self):
+        self.q.put(**event("MODIFIED"))
+        self.q.put(**event("DELETED"))
+        self.q.put(**event("ADDED", interval="5m"))
+
+        assert self.q.get(timeout=0).DELETED
+        evt = self.q.get(timeout=0)
+        assert evt.ADDED and evt.config.check_interval == 300
+        assert self.q.depth == 0
+
+    def test_errors_are_not_coalesced(self):
+        self.q.put(type="ERROR", object={})
+        self.q.put(type="ERROR", object={})
+        assert self.q.depth == 2
+
+    def test_config_is_parsed_lazily(self):
+        evt = event("MODIFIED")
+        evt["object"]["metadata"]["generation"] = 3
+        self.q.put(**evt)
+
+        evt = self.q.get(timeout=0)
+        assert evt.generation == 3
+        assert str(evt) == "default/test-add-event"
+        assert evt._config is None
+        assert evt.config.check_interval == 60
+
+    def test_config_is_cached_by_uid_and_generation(self):
+        evt = event("MODIFIED", name="cached", interval="2m")
+        evt["object"]["metadata"]["uid"] = "1234"
+        evt["object"]["metadata"]["generation"] = 1
+        first = Event(**evt)
+        assert first.config.check_interval == 120
+
+        # the spec changed without the generation changing, so this shows
+        # the second decode came from the cache
+        evt["object"]["spec"]["check_interval"] = "3m"
+        assert Event(**evt).config is first.config
+
+        evt["object"]["metadata"]["generation"] = 2
+        assert Event(**evt).config.check_interval == 180
@@ -0,0 +1,102 @@
+import sys
+import unittest
+import datetime
+
+from mozalert.checks.history import ResultHistory
+from mozalert.status import EnumStatus
+from mozalert.utils.dt import now
+
+
+class TestResultHistory(unittest.TestCase):
+    def setUp(self):
+        self.start = now()
+
+    def fill(self, history, statuses, telemetry=None):
+        for i, status in enumerate(statuses):
+            history.record(
+                self.start + datetime.timedelta(minutes=i),
+                status,
+                runtime=i,
+                telemetry=telemetry(i) if telemetry else None,
+            )
+
+    def test_ring_buffer_wraps(self):
+        history = ResultHistory(depth=5)
+        self.fill(history, [EnumStatus.OK] * 8)
+        results = history.results()
+        assert len(history) == 5
+        assert [r.runtime for r in results] == [3, 4, 5, 6, 7]
+        assert results[-1].timestamp == (
+            self.start + datetime.timedelta(minutes=7)
+        ).replace(microsecond=0)
+
+        since = self.start + datetime.timedelta(minutes=6)
+        assert history.values(since=since) == [6, 7]
+
+    def test_availability_and_flapping(self):
+        history = ResultHistory()
+        ok, crit = EnumStatus.OK, EnumStatus.CRITICAL
+        self.fill(history, [ok, ok, ok, ok, ok, ok, ok, crit])
+        assert history.availability() == 0.875
+        assert not history.flapping()
+
+        self.fill(history, [ok, crit] * 5)
+        assert history.flapping(window=10)
+
+    def test_telemetry_percentiles(self):
+        history = ResultHistory()
+        self.fill(
+            history,
+            [EnumStatus.OK] * 101,
+            telemetry=lambda i: {"latency": i} if i % 2 == 0 else {},
+        )
+        assert history.percentile(50) == 50
+        assert history.percentile(95) == 95
+        assert history.percentile(50, key="latency") == 50
+        assert len(history.values("latency")) == 51
+        assert history.results()[1].telemetry == {}
+        assert history.percentile(50, key="missing") is None
+
+    def test_compact(self):
+        history = ResultHistory(depth=1000)
+        self.fill(history, [EnumStatus.OK] * 1000, telemetry=lambda i: {"latency": i})
+        size = sum(
+            [
+                sys.getsizeof(a)
+                for a in [history._gaps, history._statuses, history._runtimes]
+                + list(history._telemetry.values())
+            ]
+        )
+        assert size < 10 * 1000
+        # single precision keeps about 7 significant digits, whatever the range
+        assert history.values("latency")[-1] == 999
+        for value in [12345.678, 98765.4321, 0.00123]:
+            history.record(now(), EnumStatus.OK, 1, telemetry={"latency": value})
+            assert abs(history.values("latency")[-1] - value) < value * 1e-6
+
+    def test_timestamps_survive_gaps(self):
+        history = ResultHistory(depth=4)
+        offsets = [0, 60, 120, 86400 * 3, 86400 * 3 + 60, 30, 90]
+        for offset in offsets:
+            history.record(
+                self.start + datetime.timedelta(seconds=offset), EnumStatus.OK, 1
+            )
+        expected = [
+            (self.start + datetime.timedelta(seconds=offset)).replace(microsecond=0)
+            for offset in offsets[-4:]
+        ]
+        assert [r.timestamp for r in history.results()] == expected
+
+    def test_series_are_bounded(self):
+        history = ResultHistory(depth=10, max_series=3)
+        # a label which changes every run
+        self.fill(
+            history,
+            [EnumStatus.OK] * 30,
+            telemetry=lambda i: {"latency": i, f'latency{{run="{i}"}}': i},
+        )
+        assert len(history.series) <= 3 and "latency" in history.series
+
+        # series not reported in the last depth results are dropped
+        self.fill(history, [EnumStatus.OK] * 10, telemetry=lambda i: {"latency": i})
+        assert history.series == ["latency"]
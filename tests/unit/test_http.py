@@ -0,0 +1,62 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mozalert.utils import http
+from mozalert.utils.sendgrid import SendGridTools
+
+
+class Webhook(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    requests = []
+
+    def setup(self):
+        super().setup()
+        Webhook.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        Webhook.requests += [(dict(self.headers), json.loads(body))]
+        self.send_response(202)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class TestHTTP(unittest.TestCase):
+    def setUp(self):
+        Webhook.connections = 0
+        Webhook.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Webhook)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def tearDown(self):
+        http.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        for _ in range(5):
+            http.post("slack", self.url, json={"text": "hi"}).raise_for_status()
+        assert http.session("slack") is http.session("slack")
+        assert Webhook.connections == 1
+        assert len(Webhook.requests) == 5
+
+    def test_sendgrid(self):
+        SendGridTools.send_message(
+            api_key="key",
+            to_emails=["someone@example.com"],
+            subject="Mozalert CRITICAL: default/check",
+            message="<p>down</p>",
+            url=self.url,
+        )
+        headers, body = Webhook.requests[0]
+        assert headers["Authorization"] == "Bearer key"
+        assert body["subject"] == "Mozalert CRITICAL: default/check"
+        assert body["personalizations"][0]["to"] == [{"email": "someone@example.com"}]
@@ -0,0 +1,49 @@
+import unittest
+
+from mozalert.metrics.queue import MetricsQueue
+from mozalert.metrics import instrument
+
+
+class TestInstrument(unittest.TestCase):
+    def setUp(self):
+        self.q = MetricsQueue(name="mozalert-controller-0", namespace="mozalert")
+
+    def drain(self):
+        metrics = []
+        while True:
+            metric = self.q.get(timeout=0)
+            if not metric:
+                return metrics
+            metrics += [metric]
+
+    def test_kube_call(self):
+        with instrument.kube_call(self.q, "create", "jobs"):
+            pass
+        (metric,) = self.drain()
+        assert metric.key == "mozalert_kube_api_latency"
+        assert metric.name == "mozalert-controller-0"
+        assert metric.labels["verb"] == "create"
+        assert metric.labels["resource"] == "jobs"
+        assert metric.value >= 0
+
+    def test_kube_call_error(self):
+        with self.assertRaises(ValueError):
+            with instrument.kube_call(self.q, "delete", "jobs"):
+                raise ValueError("Not Found")
+        keys = sorted([m.key for m in self.drain()])
+        assert keys == ["mozalert_kube_api_errors", "mozalert_kube_api_latency"]
+
+    def test_kube_call_expected_error(self):
+        conflict = ValueError("already exists")
+        conflict.reason = "Conflict"
+        with self.assertRaises(ValueError):
+            with instrument.kube_call(
+                self.q, "create", "jobs", ok_reasons=("Conflict",)
+            ):
+                raise conflict
+        keys = [m.key for m in self.drain()]
+        assert keys == ["mozalert_kube_api_latency"]
+
+    def test_without_a_queue(self):
+        with instrument.kube_call(None, "get", "jobs/status"):
+            pass
@@ -0,0 +1,75 @@
+import unittest
+import threading
+
+from time import sleep, monotonic
+from types import SimpleNamespace
+
+from mozalert.checks.jobwatch import JobWatcher
+
+
+def job_event(name, uid, succeeded=None, evt_type="MODIFIED"):
+    return {
+        "type": evt_type,
+        "object": SimpleNamespace(
+            metadata=SimpleNamespace(
+                name=name, namespace="default", uid=uid, resource_version="1"
+            ),
+            status=SimpleNamespace(
+                active=None if succeeded else 1,
+                succeeded=succeeded,
+                failed=None,
+                start_time=None,
+            ),
+        ),
+    }
+
+
+class BlockingStream:
+    """
+    a watch stream which yields nothing until the watcher shuts down
+    """
+
+    def __init__(self, shutdown):
+        self.shutdown = shutdown
+
+    def stream(self, *args, **kwargs):
+        while not self.shutdown.is_set():
+            sleep(0.05)
+        return
+        yield
+
+
+class TestJobWatcher(unittest.TestCase):
+    def setUp(self):
+        self.stop = threading.Event()
+        kube = SimpleNamespace(
+            Watch=lambda: BlockingStream(self.stop),
+            BatchV1Api=SimpleNamespace(list_job_for_all_namespaces=None),
+        )
+        self.watcher = JobWatcher(kube=kube, shutdown=self.stop.is_set)
+        self.watcher.start()
+        sleep(0.1)
+
+    def tearDown(self):
+        self.stop.set()
+        self.watcher.join()
+
+    def test_wait_wakes_on_completion(self):
+        self.watcher.handle_event(job_event("job", "uid-1", evt_type="ADDED"))
+        threading.Timer(
+            0.2, self.watcher.handle_event, args=[job_event("job", "uid-1", 1)]
+        ).start()
+
+        start = monotonic()
+        st = self.watcher.wait("default/job", uid="uid-1", timeout=5)
+        assert monotonic() - start < 2, "waiter was not woken by the watch"
+        assert st.succeeded
+
+    def test_ignores_old_job(self):
+        self.watcher.handle_event(job_event("job", "uid-old", 1))
+        st = self.watcher.wait("default/job", uid="uid-new", timeout=0.1)
+        assert not st.succeeded, "status from an old job was used"
+
+    def test_unhealthy_returns_none(self):
+        self.watcher.healthy = False
+        assert self.watcher.wait("default/job", timeout=0.1) is None
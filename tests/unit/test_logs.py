@@ -0,0 +1,108 @@
+import unittest
+from types import SimpleNamespace
+
+from mozalert.checks.check import Check
+from mozalert.checks.config import CheckConfig
+from mozalert.checks.logs import LogCapture
+from mozalert.checks.scheduler import Scheduler
+
+from tests import fake
+
+
+class BrokenStream:
+    """
+    a pod log which fails part way through being read
+    """
+
+    released = False
+
+    def stream(self, chunk_size):
+        yield b"starting\n"
+        raise ConnectionError("connection reset")
+
+    def release_conn(self):
+        self.released = True
+
+
+class TestLogCapture(unittest.TestCase):
+    def capture(self, **kwargs):
+        return LogCapture(**kwargs)
+
+    def test_short_logs_are_kept(self):
+        capture = self.capture()
+        capture.feed(b"starting\nTELEMETRY: total_time 42\ndone")
+        capture.flush()
+        assert capture.logs == "starting\ndone\n"
+        assert capture.telemetry == {"total_time": 42.0}
+        assert not capture.truncated
+
+    def test_lines_split_across_chunks(self):
+        capture = self.capture()
+        for chunk in [b"TELE", b"METRY: load", b"_time 7\nok\n"]:
+            capture.feed(chunk)
+        capture.flush()
+        assert capture.telemetry == {"load_time": 7.0}
+        assert capture.logs == "ok\n"
+
+    def test_head_and_tail_are_kept(self):
+        capture = self.capture(max_bytes=1000)
+        for i in range(10000):
+            capture.feed(f"line {i:05d}\n".encode())
+            assert capture.size <= 1000
+        capture.feed(b"TELEMETRY: total_time 9\n")
+        capture.flush()
+
+        logs = capture.logs
+        assert logs.startswith("line 00000\n")
+        assert logs.endswith("line 09999\n")
+        assert "bytes truncated" in logs
+        assert capture.telemetry == {"total_time": 9.0}
+        assert len(logs) < 1100
+
+    def test_one_huge_line(self):
+        capture = self.capture(max_bytes=100)
+        for _ in range(100):
+            capture.feed(b"x" * 100)
+            assert capture.size <= 200
+        capture.flush()
+        assert len(capture.logs) < 200
+        assert capture.truncated
+
+    def test_limit_is_in_bytes(self):
+        capture = self.capture(max_bytes=1000)
+        for i in range(1000):
+            capture.feed(f"ligne {i:04d} déjà vu ✓\n".encode())
+            assert capture.size <= 1000
+        capture.flush()
+        logs = capture.logs
+        assert len(logs.encode()) < 1100
+        assert logs.endswith("ligne 0999 déjà vu ✓\n")
+
+    def test_huge_line_of_wide_characters(self):
+        capture = self.capture(max_bytes=100)
+        capture.feed("✓" * 1000)
+        capture.flush()
+        # cut at a byte limit without leaving half a character behind
+        assert len(capture.logs.encode()) < 200
+        assert set(capture.logs) <= set("✓\n.0123456789 bytesruncad")
+
+    def test_stream_is_released_on_error(self):
+        stream = BrokenStream()
+        pod = SimpleNamespace(metadata=SimpleNamespace(name="pod"))
+        kube = SimpleNamespace(
+            CoreV1Api=SimpleNamespace(
+                list_namespaced_pod=lambda **kwargs: SimpleNamespace(items=[pod]),
+                read_namespaced_pod_log=lambda *args, **kwargs: stream,
+            ),
+            CustomObjectsApi=fake.FakeClient.CustomObjectsApi,
+        )
+        scheduler = Scheduler(max_workers=1)
+        check = Check(
+            kube=kube,
+            config=CheckConfig(name="check", namespace="default", check_interval=600),
+            scheduler=scheduler,
+        )
+        check.get_job_logs()
+        assert stream.released, "the connection was not handed back"
+        assert check.status.logs == "starting\n"
+        check.terminate()
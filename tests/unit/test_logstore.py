@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+import unittest.mock as mock
+
+import mozalert.kubeclient
+
+from mozalert.checks.logstore import LogStore
+from mozalert.controller import Controller
+
+
+class TestLogStore(unittest.TestCase):
+    def test_memory_store(self):
+        store = LogStore(keep=2)
+        ref = store.put("default/check", "all good\n" * 100)
+        assert ref.startswith("sha256:")
+        assert store.get(ref) == "all good\n" * 100
+        # compressed, and the same logs are only stored once
+        assert store.size < 100
+        assert store.put("default/other", "all good\n" * 100) == ref
+        assert len(store._blobs) == 1
+
+        store.put("default/check", "run 2")
+        store.put("default/check", "run 3")
+        # still used by default/other
+        assert store.get(ref)
+
+        store.forget("default/other")
+        assert store.get(ref) is None
+        assert len(store._blobs) == 2
+
+    def test_memory_limit(self):
+        store = LogStore(keep=100, max_bytes=200)
+        refs = [store.put("default/check", os.urandom(64).hex()) for _ in range(10)]
+        assert store.size <= 200
+        assert store.get(refs[0]) is None
+        assert store.get(refs[-1])
+
+    def test_file_store(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = LogStore(path=path, keep=1)
+            ref = store.put("default/check", "failed: timeout\n")
+            assert LogStore(path=path).get(ref) == "failed: timeout\n"
+
+            store.put("default/check", "ok\n")
+            assert store.get(ref) is None
+            assert store.get("sha256:missing") is None
+
+    @mock.patch.object(mozalert.kubeclient, "KubeClient")
+    def test_controller_only_stores_with_a_path(self, FakeKube):
+        # without a path the logs stay in the check status
+        assert Controller().log_store is None
+        with tempfile.TemporaryDirectory() as path:
+            assert Controller(log_store_path=path).log_store.path == path
@@ -0,0 +1,133 @@
+import unittest
+import unittest.mock as mock
+import urllib.request
+from types import SimpleNamespace
+
+import mozalert.metrics.thread
+import mozalert.metrics.exporter
+
+from mozalert.metrics.queue import MetricsQueue
+from mozalert.metrics.thread import MetricsThread
+from mozalert.metrics.exporter import MetricsExporter
+from mozalert.metrics.mixin import MetricsMixin
+
+
+class TestMetricsThread(unittest.TestCase):
+    def setUp(self):
+        self.q = MetricsQueue()
+        self.thread = MetricsThread(
+            self.q, prometheus_gateway="localhost:9091", flush_interval=60, batch_size=5
+        )
+        self.thread.setup_registry()
+
+    def record(self, n):
+        for i in range(n):
+            self.q.put(
+                "mozalert_check_runtime",
+                f"check-{i}",
+                "default",
+                labels={"status": "OK", "escalated": False},
+                value=i,
+            )
+            self.thread.record(self.q.get(timeout=0))
+
+    @mock.patch.object(mozalert.metrics.thread, "push_to_gateway")
+    def test_push_once_per_batch(self, push):
+        self.record(4)
+        assert not self.thread.push_due
+
+        self.record(1)
+        assert self.thread.push_due
+        assert self.thread.push()
+        assert push.call_count == 1
+        assert self.thread.pending == 0
+        assert self.thread.push_batch_size._value.get() == 5
+        assert not self.thread.push_due
+
+    def test_runtime_histogram(self):
+        self.record(5)
+        samples = {
+            (sample.name, sample.labels.get("le")): sample.value
+            for metric in self.thread.registry.collect()
+            for sample in metric.samples
+            if sample.labels.get("name") == "check-3"
+        }
+        assert samples[("mozalert_check_runtime_count", None)] == 1
+        assert samples[("mozalert_check_runtime_sum", None)] == 3
+        assert samples[("mozalert_check_runtime_bucket", "2.0")] == 0
+        assert samples[("mozalert_check_runtime_bucket", "5.0")] == 1
+
+    @mock.patch.object(mozalert.metrics.thread, "push_to_gateway")
+    def test_failed_push_backs_off(self, push):
+        push.side_effect = OSError("connection refused")
+        self.record(5)
+        assert not self.thread.push()
+        assert not self.thread.push()
+        assert self.thread.stats.failures == 2
+        assert self.thread._backoff == 2
+
+        # a full batch doesn't go out early while we're backing off
+        self.record(5)
+        assert not self.thread.push_due
+
+        push.side_effect = None
+        assert self.thread.push()
+        assert self.thread._backoff == 0
+        assert self.thread.pending == 0
+
+    def test_labeled_telemetry(self):
+        check = MetricsMixin()
+        check.status = SimpleNamespace(
+            telemetry={
+                "latency": 12,
+                'latency{region="us"}': 30,
+                'latency{run="1234"}': 99,
+            }
+        )
+        labeled = check.labeled_metric_values
+        assert labeled == [("mozalert_check_latency", {"region": "us"}, 30.0)]
+
+        labels = {"status": "OK", "escalated": False}
+        self.q.put(
+            "mozalert_check_latency", "check", "default", labels=labels, value=12
+        )
+        for key, extra, value in labeled:
+            self.q.put(key, "check", "default", labels={**labels, **extra}, value=value)
+        self.thread.record(self.q.get(timeout=0))
+        self.thread.record(self.q.get(timeout=0))
+        sums = {
+            sample.labels["region"]: sample.value
+            for metric in self.thread.registry.collect()
+            for sample in metric.samples
+            if sample.name == "mozalert_check_latency_sum"
+        }
+        assert sums == {"": 12, "us": 30}
+
+
+class TestMetricsExporter(unittest.TestCase):
+    def test_scrape(self):
+        exporter = MetricsExporter(0, addr="127.0.0.1")
+        exporter.start()
+        port = exporter._server.server_port
+        try:
+            thread = MetricsThread(MetricsQueue(), exporter=exporter)
+            thread.setup_registry()
+            thread.metrics["mozalert_check_runtime"].labels(
+                name="check", namespace="default", status="OK", escalated="False"
+            ).observe(12)
+
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as res:
+                body = res.read().decode()
+            assert 'mozalert_check_runtime_bucket{escalated="False"' in body
+            assert "mozalert_metrics_push_seconds" in body
+        finally:
+            exporter.stop()
+
+    @mock.patch.object(mozalert.metrics.exporter, "start_http_server")
+    def test_old_prometheus_client(self, start_http_server):
+        # before 0.17 start_http_server returned nothing
+        start_http_server.return_value = None
+        exporter = MetricsExporter(0, addr="127.0.0.1")
+        exporter.start()
+        exporter.stop()
+        assert start_http_server.call_count == 1
@@ -0,0 +1,69 @@
+import threading
+import unittest
+import urllib.request
+import urllib.error
+
+from mozalert.utils import profiler
+
+
+def spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=spin, args=(self.stop,), name="spinner")
+        self.thread.start()
+        self.sleeper = threading.Thread(target=self.stop.wait, name="sleeper")
+        self.sleeper.start()
+
+    def tearDown(self):
+        self.stop.set()
+        self.thread.join()
+        self.sleeper.join()
+
+    def test_sample_collapses_stacks(self):
+        lines = profiler.sample(seconds=0.2, interval=0.001).splitlines()
+        spinner = [line for line in lines if line.startswith("spinner;")]
+        assert spinner, "the spinning thread wasn't sampled"
+        stack, count = spinner[0].rsplit(" ", 1)
+        assert stack.split(";")[-1].startswith("spin ")
+        assert int(count) > 0
+
+    @unittest.skipUnless(profiler.cpu_profiling(), "no per-thread CPU time")
+    def test_cpu_profile_leaves_out_idle_threads(self):
+        stacks = profiler.sample(seconds=0.3, interval=0.001, mode="cpu")
+        assert "spinner;" in stacks
+        assert "sleeper;" not in stacks
+
+    def test_wall_profile_marks_idle_threads(self):
+        lines = profiler.sample(seconds=0.1, interval=0.001, mode="wall").splitlines()
+        sleeper = [line for line in lines if line.startswith("sleeper;")]
+        assert sleeper and all(
+            line.rsplit(" ", 1)[0].endswith(";[idle]") for line in sleeper
+        )
+        spinner = [line for line in lines if line.startswith("spinner;")]
+        assert not any("[idle]" in line for line in spinner)
+
+    def test_thread_dump(self):
+        assert 'Thread "spinner"' in profiler.thread_dump()
+
+    def test_server(self):
+        server = profiler.DebugServer(0)
+        server.start()
+        url = f"http://127.0.0.1:{server.port}"
+        try:
+            with urllib.request.urlopen(f"{url}/debug/profile?seconds=0.1") as r:
+                assert r.headers["X-Profile-Mode"] in profiler.PROFILE_MODES
+                assert "spinner;" in r.read().decode()
+            with self.assertRaises(urllib.error.HTTPError) as e:
+                urllib.request.urlopen(f"{url}/debug/profile?mode=nope")
+            assert e.exception.code == 400
+            with urllib.request.urlopen(f"{url}/debug/memory?seconds=0&limit=5") as r:
+                assert "allocation sites" in r.read().decode()
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(f"{url}/debug/nothing")
+        finally:
+            server.stop()
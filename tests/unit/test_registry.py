@@ -0,0 +1,75 @@
+import sys
+import importlib.util
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+from mozalert.checks.handler import CheckHandler
+from mozalert.escalations import BaseEscalation, email, slack, registry
+from mozalert.escalations.registry import EscalationRegistry, UnknownEscalationType
+
+
+class PagerEscalation(BaseEscalation):
+    pass
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        plugin = MagicMock()
+        plugin.name = "pager"
+        plugin.load.return_value = PagerEscalation
+        broken = MagicMock()
+        broken.name = "broken"
+        broken.load.side_effect = ImportError("no such module")
+        self.registry = EscalationRegistry()
+        with patch.object(self.registry, "entry_points", lambda: [plugin, broken]):
+            self.registry.discover()
+
+    def test_discover(self):
+        assert self.registry.types == ["email", "pager", "slack"]
+        assert self.registry.get("email") is email.Escalation
+        assert self.registry.get("slack") is slack.Escalation
+        assert self.registry.get("pager") is PagerEscalation
+        with self.assertRaises(UnknownEscalationType):
+            self.registry.get("broken")
+
+    def test_batching(self):
+        assert self.registry.supports_batching("slack")
+        assert not self.registry.supports_batching("pager")
+
+    def test_validate_on_add(self):
+        handler = CheckHandler(
+            q=None, kube=None, metrics_queue=None, escalation_registry=self.registry
+        )
+        check = SimpleNamespace(
+            config=SimpleNamespace(
+                escalations=[{"type": "slack"}, {"type": "pigeon"}, {}]
+            ),
+            status=SimpleNamespace(message=""),
+            set_crd_status=MagicMock(),
+        )
+        handler.validate(check)
+        assert check.status.message == "Unknown escalation types: pigeon"
+        check.set_crd_status.assert_called_once()
+
+        # fixed by a config change
+        check.config.escalations = [{"type": "slack"}]
+        handler.validate(check)
+        assert check.status.message == ""
+
+    def test_without_importlib_metadata(self):
+        # python 3.7 has neither importlib.metadata nor, unless it's
+        # installed, the importlib_metadata backport
+        hidden = {"importlib.metadata": None, "importlib_metadata": None}
+        with patch.dict(sys.modules, hidden), patch.dict(importlib.__dict__):
+            importlib.__dict__.pop("metadata", None)
+            spec = importlib.util.spec_from_file_location(
+                "registry_py37", registry.__file__
+            )
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        assert module.metadata is None
+        plugins = module.EscalationRegistry()
+        assert isinstance(plugins.entry_points(), list)
+        plugins.discover()
+        assert plugins.types == ["email", "slack"]
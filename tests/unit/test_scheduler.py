@@ -0,0 +1,55 @@
+import unittest
+import threading
+
+from time import sleep
+
+from mozalert.checks.scheduler import Scheduler
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler(max_workers=4)
+        self.scheduler.start()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_runs_in_due_order(self):
+        ran = []
+        for delay, name in [(0.3, "c"), (0.1, "a"), (0.2, "b")]:
+            self.scheduler.schedule(delay, lambda n=name: ran.append(n), name=name)
+        sleep(0.6)
+        assert ran == ["a", "b", "c"], f"runs fired out of order: {ran}"
+
+    def test_cancel(self):
+        ran = []
+        run = self.scheduler.schedule(0.2, lambda: ran.append(1), name="cancelled")
+        assert run.is_alive(), "pending run should be alive"
+        self.scheduler.cancel(run)
+        assert not run.is_alive(), "cancelled run should not be alive"
+        sleep(0.4)
+        assert not ran, "cancelled run was executed"
+
+    def test_thread_count_is_flat(self):
+        before = threading.active_count()
+        runs = [
+            self.scheduler.schedule(60, lambda: None, name=f"check-{i}")
+            for i in range(1000)
+        ]
+        assert self.scheduler.pending == 1000
+        assert threading.active_count() == before, "scheduling started new threads"
+        for run in runs:
+            self.scheduler.cancel(run)
+        assert self.scheduler.pending == 0
+
+    def test_join_waits_for_run(self):
+        ran = []
+
+        def slow(value):
+            sleep(0.2)
+            ran.append(value)
+
+        run = self.scheduler.schedule(0, slow, name="slow", kwargs={"value": 1})
+        assert run.join(timeout=2), "run never finished"
+        assert not run.is_alive()
+        assert ran == [1]
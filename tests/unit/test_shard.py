@@ -0,0 +1,151 @@
+import unittest
+import threading
+from time import sleep
+from types import SimpleNamespace
+
+from mozalert.shard import (
+    HashRing,
+    ShardManager,
+    ShardLabeler,
+    DEFAULT_BUCKETS,
+    SHARD_LABEL,
+)
+from mozalert.utils.dt import now
+
+
+class FakeLeases:
+    """
+    a CoordinationV1Api holding the leases of the other replicas
+    """
+
+    def __init__(self, others=()):
+        self.others = list(others)
+        self.fail = False
+
+    def patch_namespaced_lease(self, name, namespace, body, **kwargs):
+        if self.fail:
+            raise Exception("apiserver unavailable")
+
+    def list_namespaced_lease(self, namespace, **kwargs):
+        spec = lambda holder: SimpleNamespace(
+            holder_identity=holder, renew_time=now(), lease_duration_seconds=30
+        )
+        return SimpleNamespace(
+            items=[SimpleNamespace(spec=spec(holder)) for holder in self.others]
+        )
+
+
+class TestShard(unittest.TestCase):
+    def test_ring_moves_few_keys(self):
+        keys = [str(b) for b in range(DEFAULT_BUCKETS)]
+        before = HashRing(["c-0", "c-1", "c-2"])
+        after = HashRing(["c-0", "c-1", "c-2", "c-3"])
+        moved = [k for k in keys if before.owner(k) != after.owner(k)]
+        # only keys picked up by the new member should move
+        assert all(after.owner(k) == "c-3" for k in moved)
+        assert len(moved) < DEFAULT_BUCKETS / 2
+
+    def test_ordinal_shards_cover_every_bucket_once(self):
+        owned = []
+        for i in range(3):
+            shard = ShardManager(
+                mode="ordinal", identity=f"mozalert-{i}", shard_count=3
+            )
+            shard.refresh()
+            assert shard.owned, f"mozalert-{i} owns no buckets"
+            owned += list(shard.owned)
+        assert sorted(owned) == list(range(DEFAULT_BUCKETS))
+
+    def test_label_selector(self):
+        shard = ShardManager(mode="ordinal", identity="mozalert-0", shard_count=1)
+        assert shard.label_selector is None
+        shard.refresh()
+        assert shard.owns("default", "check-test-1")
+        assert shard.label_selector.startswith("mozalert.io/shard in (0,1,")
+
+    def test_lease_handoff(self):
+        leases = FakeLeases(["mozalert-b"])
+        kube = SimpleNamespace(CoordinationV1Api=leases)
+        shard = ShardManager(kube=kube, identity="mozalert-a", handoff=0.2)
+        shard.refresh()
+        assert not shard.owned, "took on buckets before the handoff"
+        sleep(0.2)
+        shard.take_pending()
+        owned = shard.owned
+        assert owned and shard.generation == 1
+
+        # a replica joins: what we lose goes now, nothing new is gained
+        leases.others += ["mozalert-c"]
+        shard.refresh()
+        assert shard.owned < owned and shard.generation == 2
+
+        # a failed renewal gives up everything
+        leases.fail = True
+        shard.refresh()
+        assert not shard.owned and shard.generation == 3
+        leases.fail = False
+        shard.refresh()
+        sleep(0.2)
+        shard.take_pending()
+        assert shard.owned and shard.generation == 4
+
+
+class FakeChecks:
+    """
+    a check watch replaying unlabeled checks, recording the labels patched in
+    """
+
+    domain = "crd.k8s.afrank.local"
+    version = "v1"
+    plural = "checks"
+
+    def __init__(self, names):
+        self.names = names
+        self.labels = {}
+        self.selectors = []
+        self.CustomObjectsApi = SimpleNamespace(
+            list_cluster_custom_object=None,
+            patch_namespaced_custom_object=self.patch,
+        )
+
+    def patch(self, domain, version, namespace, plural, name, body):
+        self.labels[name] = body["metadata"]["labels"][SHARD_LABEL]
+
+    def Watch(self):
+        return self
+
+    def stream(self, *args, **kwargs):
+        self.selectors += [kwargs.get("label_selector")]
+        for name in self.names:
+            yield {
+                "type": "ADDED",
+                "object": {
+                    "metadata": {
+                        "namespace": "default",
+                        "name": name,
+                        "resourceVersion": "1",
+                    }
+                },
+            }
+        self.names = []
+        sleep(0.05)
+
+
+class TestShardLabeler(unittest.TestCase):
+    def test_labels_added_checks_in_our_shard(self):
+        names = [f"check-{i}" for i in range(20)]
+        kube = FakeChecks(names)
+        shard = ShardManager(mode="ordinal", identity="mozalert-0", shard_count=2)
+        shard.refresh()
+        stop = threading.Event()
+        labeler = ShardLabeler(kube=kube, shard=shard, shutdown=stop.is_set)
+        labeler.start()
+        sleep(0.2)
+        stop.set()
+        labeler.join()
+
+        ours = [n for n in names if shard.owns("default", n)]
+        assert ours and len(ours) < len(names)
+        assert sorted(kube.labels) == sorted(ours)
+        assert kube.labels[ours[0]] == str(shard.bucket("default", ours[0]))
+        assert set(kube.selectors) == {f"!{SHARD_LABEL}"}
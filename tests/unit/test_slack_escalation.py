@@ -81,3 +81,12 @@ class TestEscalations(unittest.TestCase):
         )[0]["value"]
         source_string = "\n<fake_source_url|view source>"
         self.assertIn(source_string, more_details)
+
+    def test_digest(self):
+        digest = Escalation.digest(
+            [self.gcp_project_escalation, self.check_source_escalation], max_checks=1
+        )
+        attachment = json.loads(digest.slack_message)["attachments"][0]
+        self.assertEqual(attachment["title"], "2 checks escalated, 0 failing")
+        self.assertEqual(attachment["text"], "test-escalation: OK\n... and 1 more")
+        self.assertEqual(digest.destination, "test_webhook#test_channel")
@@ -0,0 +1,59 @@
+import unittest
+import datetime
+
+from time import monotonic
+
+from mozalert.checks.base import BaseCheck
+from mozalert.checks.config import CheckConfig
+from mozalert.checks.scheduler import Scheduler
+from mozalert.metrics.mixin import MetricsMixin
+from mozalert.utils.ratelimit import TokenBucket
+
+
+class IdleCheck(BaseCheck, MetricsMixin):
+    def set_crd_status(self):
+        pass
+
+
+class TestStartup(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler(max_workers=1)
+
+    def overdue_check(self, name):
+        overdue = datetime.datetime.utcnow() - datetime.timedelta(minutes=5)
+        return IdleCheck(
+            config=CheckConfig(name=name, namespace="default", check_interval=600),
+            scheduler=self.scheduler,
+            startup_window=60,
+            pre_status={"next_check": str(overdue).split(".")[0]},
+        )
+
+    def test_overdue_checks_are_spread(self):
+        intervals = [self.overdue_check(f"check-{i}").next_interval for i in range(50)]
+        assert all(0 <= i < 60 for i in intervals), "jitter outside the window"
+        assert len(set(int(i) for i in intervals)) > 10, "checks were not spread"
+
+    def test_jitter_is_deterministic(self):
+        a = self.overdue_check("same-check").next_interval
+        b = self.overdue_check("same-check").next_interval
+        assert a == b
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_starts_empty(self):
+        bucket = TokenBucket(rate=20)
+        assert bucket.try_acquire() > 0, "a new bucket should start empty"
+
+    def test_wait_time_takes_nothing(self):
+        bucket = TokenBucket(rate=10, capacity=1, tokens=1)
+        assert bucket.wait_time() == 0
+        assert bucket.try_acquire() == 0
+        assert 0 < bucket.wait_time() <= 0.1
+
+    def test_rate(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        start = monotonic()
+        for _ in range(5):
+            assert bucket.acquire(timeout=1)
+        elapsed = monotonic() - start
+        assert 0.2 <= elapsed < 1, f"5 tokens at 20/s took {elapsed}s"
@@ -0,0 +1,116 @@
+import os
+import datetime
+import tempfile
+import unittest
+
+from mozalert.checks.base import BaseCheck
+from mozalert.checks.config import CheckConfig
+from mozalert.checks.scheduler import Scheduler
+from mozalert.checks.statestore import StateStore
+from mozalert.metrics.mixin import MetricsMixin
+from mozalert.metrics.queue import MetricsQueue
+from mozalert.status import EnumStatus
+from mozalert.utils.dt import now
+
+
+class IdleCheck(BaseCheck, MetricsMixin):
+    def set_crd_status(self):
+        pass
+
+
+class TestStateStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "state", "mozalert.db")
+        self.scheduler = Scheduler(max_workers=1)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def check(
+        self, store=None, saved_state=None, generation=1, pre_status=None, uid="uid-1"
+    ):
+        return IdleCheck(
+            config=CheckConfig(name="check", namespace="default", check_interval=600),
+            scheduler=self.scheduler,
+            metrics_queue=MetricsQueue(),
+            state_store=store,
+            saved_state=saved_state,
+            uid=uid,
+            generation=generation,
+            pre_status=pre_status or {},
+        )
+
+    def test_load_after_reopen(self):
+        store = StateStore(self.path, depth=3)
+        for i in range(5):
+            store.record("default/a", now(), EnumStatus.OK, i, {"x": i})
+        store.save("default/a", 2, {"status": "OK", "attempt": "0"}, True)
+        store.record("default/gone", now(), EnumStatus.OK, 1)
+        store.close()
+
+        states = StateStore(self.path, depth=3).load()
+        assert list(states) == ["default/a"]
+        saved = states["default/a"]
+        assert saved.generation == 2 and saved.escalated
+        assert saved.status["status"] == "OK"
+        assert [r.runtime for r in saved.results] == [2, 3, 4]
+        assert saved.results[-1].telemetry == {"x": 4}
+
+    def test_prune_and_forget(self):
+        store = StateStore(self.path, retention=3600, depth=2)
+        old = now() - datetime.timedelta(hours=2)
+        store.save("default/a", 1, {}, False)
+        store.record("default/a", old, EnumStatus.OK, 1)
+        for i in range(3):
+            store.record("default/a", now(), EnumStatus.OK, i)
+        store.prune()
+        assert [r.runtime for r in store.load()["default/a"].results] == [1, 2]
+
+        store.forget("default/a")
+        assert store.load() == {}
+
+    def test_check_restores_state(self):
+        store = StateStore(self.path)
+        first = self.check(store)
+        first._runtime = datetime.timedelta(seconds=4)
+        first.status.status = "CRITICAL"
+        first.status.last_check = now()
+        first.escalated = True
+        first.finish_check(shutdown=lambda: True)
+        first.terminate()
+
+        # the object's status is older than what we saved
+        stale = {"status": "OK", "last_check": "2020-01-01 00:00:00"}
+        restored = self.check(store, store.load()["default/check"], pre_status=stale)
+        assert restored.escalated
+        assert restored.status.status == EnumStatus.CRITICAL
+        assert [r.runtime for r in restored.history.results()] == [4]
+        restored.terminate()
+
+        # the spec changed since it was saved, so the object's status wins
+        # and a recovery isn't sent for an escalation of the old spec
+        changed = self.check(
+            store, store.load()["default/check"], generation=2, pre_status=stale
+        )
+        assert changed.status.status == EnumStatus.OK
+        assert not changed.escalated
+        assert len(changed.history) == 1
+        changed.terminate()
+
+    def test_recreated_check_starts_afresh(self):
+        store = StateStore(self.path)
+        first = self.check(store)
+        first.status.status = "CRITICAL"
+        first.status.last_check = now()
+        first.escalated = True
+        first.finish_check(shutdown=lambda: True)
+        first.terminate()
+
+        # deleted and created again while the controller was down
+        recreated = self.check(store, store.load()["default/check"], uid="uid-2")
+        assert not recreated.escalated
+        assert recreated.status.status != EnumStatus.CRITICAL
+        assert len(recreated.history) == 0
+        assert store.load() == {}, "the old object's state was kept"
+        recreated.terminate()
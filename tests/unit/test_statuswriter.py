@@ -0,0 +1,60 @@
+import unittest
+
+from types import SimpleNamespace
+
+from mozalert.checks.statuswriter import StatusWriter, diff_status
+
+
+class RecordingClient:
+    domain = "crd.k8s.afrank.local"
+    version = "v1"
+    plural = "checks"
+
+    def __init__(self):
+        self.patches = []
+        self.CustomObjectsApi = SimpleNamespace(
+            patch_namespaced_custom_object_status=self.patch
+        )
+
+    def patch(self, *args, **kwargs):
+        self.patches += [kwargs.get("body")]
+
+
+def crd_status(**kwargs):
+    st = {"status": "OK", "state": "IDLE", "attempt": "0", "telemetry": {}}
+    st.update(kwargs)
+    return {"status": st}
+
+
+class TestStatusWriter(unittest.TestCase):
+    def setUp(self):
+        self.kube = RecordingClient()
+        self.writer = StatusWriter(kube=self.kube, window=60)
+
+    def test_coalesce(self):
+        self.writer.write("default", "check", crd_status(state="RUNNING"))
+        self.writer.write("default", "check", crd_status(state="IDLE"))
+        self.writer.flush()
+        assert len(self.kube.patches) == 1, "writes were not coalesced"
+        assert self.kube.patches[0]["status"]["state"] == "IDLE"
+
+    def test_only_changes_are_sent(self):
+        self.writer.write("default", "check", crd_status())
+        self.writer.flush()
+        self.writer.write("default", "check", crd_status(attempt="1"))
+        self.writer.flush()
+        assert self.kube.patches[1] == {"status": {"attempt": "1"}}
+
+    def test_unchanged_is_skipped(self):
+        self.writer.seed("default/check", crd_status()["status"])
+        self.writer.write("default", "check", crd_status())
+        self.writer.flush()
+        assert not self.kube.patches, "unchanged status was patched"
+        assert self.writer.stats.skipped == 1
+
+    def test_diff_removes_nested_keys(self):
+        patch = diff_status(
+            {"telemetry": {"latency": "1", "total_time": "2"}},
+            {"telemetry": {"latency": "3"}},
+        )
+        assert patch == {"telemetry": {"latency": "3", "total_time": None}}
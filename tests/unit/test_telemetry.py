@@ -0,0 +1,44 @@
+import unittest
+
+from mozalert.metrics import telemetry
+
+
+class TestTelemetry(unittest.TestCase):
+    def test_plain_lines(self):
+        assert telemetry.parse_line("TELEMETRY: total_time 42") == [
+            ("total_time", 42.0)
+        ]
+        assert telemetry.parse_line("TELEMETRY: latency 0.031s") == [("latency", 0.031)]
+        assert telemetry.parse_line("TELEMETRY: latency 1.5e-3") == [
+            ("latency", 0.0015)
+        ]
+        assert telemetry.parse_line("TELEMETRY: latency") is None
+        assert telemetry.parse_line("GET / 200 0.031") is None
+
+    def test_labels(self):
+        found = telemetry.parse_line('TELEMETRY: latency{region="us", zone=b} 12.5')
+        assert found == [('latency{region="us",zone="b"}', 12.5)]
+        assert telemetry.split_series(found[0][0]) == (
+            "latency",
+            {"region": "us", "zone": "b"},
+        )
+        assert telemetry.split_series("total_time") == ("total_time", {})
+
+    def test_json_lines(self):
+        assert telemetry.parse_line(
+            '{"telemetry": "latency", "value": 0.5, "labels": {"region": "us"}}'
+        ) == [('latency{region="us"}', 0.5)]
+        assert sorted(
+            telemetry.parse_line('{"telemetry": {"get_time": 1, "total_time": 2.5}}')
+        ) == [("get_time", 1.0), ("total_time", 2.5)]
+        assert telemetry.parse_line('{"telemetry": "latency"}') is None
+        assert telemetry.parse_line('{"telemetry": "latency", "value": "x"}') is None
+        assert telemetry.parse_line('{"msg": "telemetry"}') is None
+
+    def test_parse_logs(self):
+        logs, found = telemetry.parse_logs(
+            "starting\nTELEMETRY: total_time 1.25\n"
+            '{"telemetry": {"get_time": 0.5}}\ndone'
+        )
+        assert logs == "starting\ndone\n"
+        assert found == {"total_time": 1.25, "get_time": 0.5}